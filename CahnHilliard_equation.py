@@ -1,44 +1,198 @@
 import numpy as np
-from chemical_potential_free_energy import chemical_potential
-from concentration_laplacian import concentration_laplacian
+from functools import lru_cache
+from chemical_potential_free_energy import chemical_potential, parameter_as_dtype
+from concentration_laplacian import concentration_laplacian, grid_spacings, check_boundary
+from cosine_transform import dctn, idctn
+from stencil_workspace import Cahn_Hilliard_inplace_integration
 
 
-def Cahn_Hilliard_equation_integration(c, A, k, dx, dy, M, dt):
+def Cahn_Hilliard_equation_integration(c, A, k, dx, dy, M, dt, chem_potential=None, dz=None, boundary='periodic'):
     """This function performs time integration of the Cahn-Hilliard equation. 
     For a description of Cahn-Hilliard equation check the README.md
     
     Parameters: 
-    c: N-by-N 2D array of floats
+    c: N-by-N 2D array of floats, or array of shape (B, N, N) for a batch of B microstructures
+       (N-by-N-by-N, or (B, N, N, N), for a 3D microstructure)
        input configuration
-    A: float, not <0.
+    A: float, not <0. (or array of shape (B, 1, 1) with a value per microstructure)
        multiplicative constant of chemical potential
-    k: float, not <0.
+    k: float, not <0. (or array of shape (B, 1, 1) with a value per microstructure)
        gradient coefficient
     dx, dy: floats, not <0. nor = 0.
            dimensions in x and y direction of a concentration subcell
-    M: float, not <0.
+    M: float, not <0. (or array of shape (B, 1, 1) with a value per microstructure)
        mobility of the concentration's particles
     dt: float, not <0.
         time step for time integration
+    chem_potential: array of same shape of c, or None
+        chemical potential of c, if already computed (e.g. by fused_diagnostics()), to avoid computing it again
+    dz: float or None
+        dimension in z direction of a concentration subcell, None (default) for a 2D microstructure
+    boundary: str
+        boundary conditions, 'periodic' (default) or 'neumann' (no flux through the edges of the microstructure)
 
     Returns: 
-    c_updated: N-by-N 2D array
+    c_updated: array of same shape of c
               concentration values updated according to Cahn-Hilliard equation"""
 
     #Check M and dt are valid input parameters (all the others are checked in the called functions)
-    if M<0. or dt<0.:
+    if np.any(np.asarray(M)<0.) or np.any(np.asarray(dt)<0.):
          raise ValueError('M and dt parameters cannot be negative, check again the config.txt file description')
 
-     #Compute chemical potential of current concentration configuration
-    chem_potential = chemical_potential(c, A)   
+    #keep the floating point type of the grid (e.g. float32) in all the operations
+    c = np.asarray(c)
+    k, M, dt = parameter_as_dtype(k, c.dtype), parameter_as_dtype(M, c.dtype), parameter_as_dtype(dt, c.dtype)
+
+     #Compute chemical potential of current concentration configuration, unless already given
+    if chem_potential is None:
+        chem_potential = chemical_potential(c, A)   
 
     #Compute current gradient term of Cahn-Hilliard eq. : -2k*lap(c)
-    gradient_term = 2*k*concentration_laplacian(c, dx, dy)
+    gradient_term = 2*k*concentration_laplacian(c, dx, dy, dz, boundary)
 
     #Compute concentration grid after time dt
-    c_updated = c + dt*M*concentration_laplacian((chem_potential-gradient_term), dx, dy)
+    c_updated = c + dt*M*concentration_laplacian((chem_potential-gradient_term), dx, dy, dz, boundary)
 
     #make sure output configuration is physical: reassign values lower than 0. to 0. and higher than 1. to 1.
     np.clip(c_updated, 0, 1, out=c_updated)
                 
-    return c_updated
\ No newline at end of file
+    return c_updated
+
+
+@lru_cache(maxsize=8)
+def laplacian_symbol(shape, dx, dy, dz=None, boundary='periodic'):
+    """This function returns the Fourier symbol of the discrete laplacian computed by concentration_laplacian(),
+    i.e. the eigenvalues of the symmetric finite difference operator with periodic boundary conditions:
+    -(2-2cos(kx*dx))/(dx*dx) - (2-2cos(ky*dy))/(dy*dy) (- (2-2cos(kz*dz))/(dz*dz) in 3D).
+    With neumann boundary conditions the eigenvectors are the cosines of the type II DCT (see cosine_transform.py),
+    and kx*dx = pi*m/Nx, m = 0, ..., Nx-1 (the same along y and z).
+    Using the symbol of the discrete operator (and not -|k|^2) makes the spectral integrator solve the same
+    discretized equation as the explicit one. The result is cached, since it only depends on the grid.
+
+    Parameters:
+    shape: tuple of two ints (Ny, Nx), or three ints (Nz, Ny, Nx) in 3D
+           shape of the concentration grid
+    dx, dy: floats, >0.
+           dimensions in x and y direction of a concentration subcell
+    dz: float or None
+           dimension in z direction of a concentration subcell, None (default) for a 2D grid
+    boundary: str
+           boundary conditions, 'periodic' (default) or 'neumann'
+
+    Returns:
+    symbol: Ny-by-(Nx//2+1) array of floats (Nz-by-Ny-by-(Nx//2+1) in 3D)
+            laplacian eigenvalues, ordered as the output of np.fft.rfftn on an array of the given shape
+            (array of the given shape, ordered as the output of dctn(), for neumann boundary conditions)"""
+
+    Ny, Nx = shape[-2:]
+    if boundary == 'neumann':
+        kx = np.pi*np.arange(Nx)/Nx
+        ky = np.pi*np.arange(Ny)/Ny
+    else:
+        kx = 2*np.pi*np.fft.rfftfreq(Nx)
+        ky = 2*np.pi*np.fft.fftfreq(Ny)
+    symbol = -(2-2*np.cos(ky)).reshape((Ny,1))/(dy*dy) - (2-2*np.cos(kx))/(dx*dx)
+    if dz is not None:
+        Nz = shape[-3]
+        kz = np.pi*np.arange(Nz)/Nz if boundary == 'neumann' else 2*np.pi*np.fft.fftfreq(Nz)
+        symbol = symbol - (2-2*np.cos(kz)).reshape((Nz,1,1))/(dz*dz)
+    return symbol
+
+
+def Cahn_Hilliard_spectral_integration(c, A, k, dx, dy, M, dt, chem_potential=None, dz=None, boundary='periodic'):
+    """This function performs time integration of the Cahn-Hilliard equation with a semi-implicit 
+    Fourier-spectral scheme: the stiff -2k*lap^2(c) term is treated implicitly, the chemical potential explicitly.
+    In Fourier space, with L the laplacian symbol:
+    c_hat(t+dt) = (c_hat(t) + dt*M*L*mu_hat(t)) / (1 + 2*k*dt*M*L^2)
+    The periodic boundary conditions assumed by concentration_laplacian() make the Fourier basis exact;
+    with neumann boundary conditions the same scheme is applied to the cosine transform of the grid,
+    which is the exact basis of the laplacian with mirrored edges.
+    The scheme is stable for time steps much larger than the explicit Euler limit (which scales as dx^4).
+    
+    Parameters: 
+    c: N-by-N 2D array of floats, or array of shape (B, N, N) for a batch of B microstructures
+       (N-by-N-by-N, or (B, N, N, N), for a 3D microstructure)
+       input configuration
+    A: float, not <0. (or array of shape (B, 1, 1) with a value per microstructure)
+       multiplicative constant of chemical potential
+    k: float, not <0. (or array of shape (B, 1, 1) with a value per microstructure)
+       gradient coefficient
+    dx, dy: floats, not <0. nor = 0.
+           dimensions in x and y direction of a concentration subcell
+    M: float, not <0. (or array of shape (B, 1, 1) with a value per microstructure)
+       mobility of the concentration's particles
+    dt: float, not <0.
+        time step for time integration
+    chem_potential: array of same shape of c, or None
+        chemical potential of c, if already computed (e.g. by fused_diagnostics()), to avoid computing it again
+    dz: float or None
+        dimension in z direction of a concentration subcell, None (default) for a 2D microstructure
+    boundary: str
+        boundary conditions, 'periodic' (default) or 'neumann' (no flux through the edges of the microstructure)
+
+    Returns: 
+    c_updated: array of same shape of c
+              concentration values updated according to Cahn-Hilliard equation"""
+
+    #Check validity of input parameters (A is checked in chemical_potential())
+    if np.any(np.asarray(M)<0.) or np.any(np.asarray(dt)<0.):
+         raise ValueError('M and dt parameters cannot be negative, check again the config.txt file description')
+    spacings = grid_spacings(dx, dy, dz)
+    if any(d <= 0. for d in spacings) or np.any(np.asarray(k)<0.):
+        raise ValueError('dx, dy, dz, k parameters cannot be negative, check again the config.txt file description')
+    check_boundary(boundary)
+
+    #retrieve grid shape from the last axes of c (leading axes, if any, index different microstructures)
+    c = np.asarray(c)
+    grid_axes = tuple(range(-len(spacings), 0))
+    grid_shape = np.shape(c)[-len(spacings):]
+    symbol = laplacian_symbol(grid_shape, *(float(d) for d in spacings), boundary=boundary)
+    #keep the floating point type of the grid (e.g. float32) in all the operations
+    if np.issubdtype(c.dtype, np.floating):
+        symbol = symbol.astype(c.dtype, copy=False)
+    k, M, dt = parameter_as_dtype(k, c.dtype), parameter_as_dtype(M, c.dtype), parameter_as_dtype(dt, c.dtype)
+
+    #Compute chemical potential of current concentration configuration and move to Fourier space
+    #(to the cosine basis for neumann boundary conditions)
+    if boundary == 'neumann':
+        transform, inverse_transform = dctn, lambda a_hat: idctn(a_hat, axes=grid_axes)
+    else:
+        transform, inverse_transform = np.fft.rfftn, lambda a_hat: np.fft.irfftn(a_hat, s=grid_shape, axes=grid_axes)
+    c_hat = transform(c, axes=grid_axes)
+    if chem_potential is None:
+        chem_potential = chemical_potential(c, A)
+    chem_potential_hat = transform(chem_potential, axes=grid_axes)
+
+    #Explicit chemical potential term, implicit biharmonic term
+    c_hat = (c_hat + dt*M*symbol*chem_potential_hat)/(1 + 2*k*dt*M*symbol*symbol)
+    c_updated = inverse_transform(c_hat)
+    #older numpy versions compute single precision FFTs in double precision
+    if np.issubdtype(c.dtype, np.floating) and c_updated.dtype != c.dtype:
+        c_updated = c_updated.astype(c.dtype)
+
+    #make sure output configuration is physical: reassign values lower than 0. to 0. and higher than 1. to 1.
+    np.clip(c_updated, 0, 1, out=c_updated)
+
+    return c_updated
+
+
+#Available integration schemes, selected with the integrator key of the configuration file
+INTEGRATORS = {'explicit': Cahn_Hilliard_equation_integration,
+               'explicit_inplace': Cahn_Hilliard_inplace_integration,
+               'spectral': Cahn_Hilliard_spectral_integration}
+
+
+def select_integrator(name):
+    """This function returns the time integration function associated to the name given in the configuration file
+    
+    Parameters:
+    name: str
+          name of the integration scheme, one of the keys of INTEGRATORS
+    
+    Returns:
+    integrator: function
+                function with the same signature as Cahn_Hilliard_equation_integration()"""
+    
+    if name not in INTEGRATORS:
+        raise ValueError('Unknown integrator '+repr(name)+', valid options are: '+', '.join(INTEGRATORS))
+    return INTEGRATORS[name]
@@ -0,0 +1,156 @@
+import numpy as np
+import itertools
+from CahnHilliard_equation import Cahn_Hilliard_equation_integration
+from concentration_laplacian import grid_spacings, check_boundary, boundary_indices
+
+#number of subcells around a tile needed to update it: the explicit step applies two laplacians (5-point stencils)
+HALO = 2
+
+
+class ActiveSetStepper:
+    """This class performs explicit time integration steps of the Cahn-Hilliard equation updating only the regions
+    of the grid that are still evolving. The grid is divided in tiles of tile_size subcells per side; a tile is
+    active if the maximum change of its concentration in its last update was larger than tolerance, or if the
+    concentration changed by more than tolerance within 2 subcells from its edge in a neighbouring tile (the
+    stencils reach 2 subcells away, so that such changes move the concentration of the tile). At each step
+    the active tiles are gathered, with a 2-subcells halo, in a batch of small grids, integrated together with
+    Cahn_Hilliard_equation_integration(), and written back; the other tiles are left unchanged. The subcells of the
+    active tiles get exactly the values of a full grid step. Every full_sweep_every steps the whole grid is
+    integrated by integrator, and the activity of all the tiles is checked again. In the late coarsening, when most
+    of the grid sits at the bulk concentrations and only the interfaces move, the cost of a step is proportional
+    to the fraction of active tiles.
+
+    Parameters:
+    integrator: function
+            time integration function with the signature of Cahn_Hilliard_equation_integration(),
+            used for the full sweeps (explicit or explicit_inplace)
+    shape: tuple of ints
+            shape (Ny, Nx) of the concentration grid ((Nz, Ny, Nx) for a 3D microstructure)
+    A, k, dx, dy, M, dt: floats
+            parameters of the Cahn-Hilliard equation, see Cahn_Hilliard_equation_integration()
+    tile_size: int, >=1
+            number of subcells per side of the tiles (reduced to the grid size along shorter axes)
+    tolerance: float, >=0.
+            maximum change of the concentration per step of a quiescent tile
+    full_sweep_every: int, >=1
+            number of steps between two full grid steps
+    dz: float or None
+            dimension in z direction of a concentration subcell, None (default) for a 2D microstructure
+    boundary: str
+            boundary conditions, 'periodic' (default) or 'neumann'
+
+    Raise:
+        ValueError if tile_size or full_sweep_every are not >=1, tolerance is <0., or shape is not the shape
+        of a single microstructure"""
+
+    def __init__(self, integrator, shape, A, k, dx, dy, M, dt, tile_size=32, tolerance=1e-7, full_sweep_every=50,
+                 dz=None, boundary='periodic'):
+
+        #check validity of input parameters (the physical parameters are checked by the integrators)
+        if tile_size < 1 or full_sweep_every < 1:
+            raise ValueError('tile_size and full_sweep_every must be integers >=1, check the config.txt file description')
+        if tolerance < 0.:
+            raise ValueError('The activity tolerance must be >=0., check the config.txt file description')
+        if len(shape) != len(grid_spacings(dx, dy, dz)):
+            raise ValueError('The active set integration only supports a single 2D (or 3D, with dz) concentration grid')
+        check_boundary(boundary)
+
+        self.integrator = integrator
+        self.shape = tuple(shape)
+        self.A, self.k, self.dx, self.dy, self.M, self.dt = A, k, dx, dy, M, dt
+        self.dz = dz
+        self.boundary = boundary
+        self.tolerance = tolerance
+        self.full_sweep_every = full_sweep_every
+        #tile sides and first subcell of the tiles along each axis: the last tile is moved back to end at the
+        #edge of the grid, overlapping the previous one, when the tile side does not divide the grid size
+        self.tile_shape = tuple(min(tile_size, n) for n in self.shape)
+        self._origins = [np.minimum(np.arange(-(-n//t))*t, n-t) for n, t in zip(self.shape, self.tile_shape)]
+        self.tiles_shape = tuple(len(origins) for origins in self._origins)
+        #active tiles (None until the first full sweep) and number of steps since the last full sweep
+        self.active = None
+        self.steps_since_sweep = 0
+
+    @property
+    def active_fraction(self):
+        """Fraction of the tiles that will be updated by the next step (1. before the first step)"""
+        return 1. if self.active is None else float(np.mean(self.active))
+
+    def _tile_indices(self, tiles, halo):
+        """This method returns the index arrays gathering the given tiles, extended by halo subcells on each side,
+        as a batch of shape (n_tiles,)+tile_shape (+2*halo along each axis)"""
+        n_axes = len(self.shape)
+        indices = []
+        for axis, (origins, t, n) in enumerate(zip(self._origins, self.tile_shape, self.shape)):
+            axis_indices = origins[tiles[:, axis]][:, None] + np.arange(-halo, t+halo)
+            if halo > 0:
+                axis_indices = boundary_indices(axis_indices, n, self.boundary)
+            shape = [len(tiles)] + [1]*n_axes
+            shape[1+axis] = t+2*halo
+            indices.append(axis_indices.reshape(shape))
+        return tuple(indices)
+
+    def _activity(self, tiles, changes):
+        """This method returns the tiles active in the next step, given the absolute changes of the concentration
+        (array of shape (n_tiles,)+tile_shape) of the tiles updated in the last step: the tiles that changed by more
+        than tolerance, and their neighbours (diagonal ones included) whose subcells are within 2 subcells from
+        the changes larger than tolerance (across the edges of the grid only for periodic boundary conditions)"""
+        active = np.zeros(self.tiles_shape, dtype=bool)
+        n_axes = len(self.shape)
+        for offset in itertools.product((-1, 0, 1), repeat=n_axes):
+            #band of the tiles within 2 subcells from the edges towards the neighbour at the given offset
+            band = (slice(None),)+tuple(slice(None) if o == 0 else slice(0, HALO) if o < 0 else slice(-HALO, None)
+                                        for o in offset)
+            changed = changes[band].reshape(len(tiles), -1).max(axis=1) > self.tolerance
+            neighbours = tiles[changed] + np.array(offset)
+            if self.boundary == 'neumann':
+                inside = np.all((neighbours >= 0) & (neighbours < np.array(self.tiles_shape)), axis=1)
+                neighbours = neighbours[inside]
+            else:
+                neighbours = neighbours % np.array(self.tiles_shape)
+            active[tuple(neighbours.T)] = True
+        return active
+
+    def step(self, c, chem_potential=None):
+        """This method performs one time step, updating the active tiles (or the whole grid, at the full sweeps),
+        and updates the set of active tiles
+
+        Parameters:
+        c: array of floats of the shape of the stepper
+           concentration grid, overwritten with the updated values
+        chem_potential: array of floats of the shape of c, or None
+           chemical potential of c, if already computed, passed to the integrator at the full sweeps
+
+        Returns:
+        c: array of floats
+           concentration grid updated according to Cahn-Hilliard equation"""
+
+        if np.shape(c) != self.shape:
+            raise ValueError('Concentration grid of shape '+str(np.shape(c))+' does not match the active set shape '+str(self.shape))
+
+        if self.active is None or self.steps_since_sweep >= self.full_sweep_every:
+            #full grid step, checking the activity of all the tiles
+            c_previous = np.array(c, copy=True)
+            c = self.integrator(c, self.A, self.k, self.dx, self.dy, self.M, self.dt, chem_potential,
+                                dz=self.dz, boundary=self.boundary)
+            tiles = np.argwhere(np.ones(self.tiles_shape, dtype=bool))
+            self.active = self._activity(tiles, np.abs(c - c_previous)[self._tile_indices(tiles, 0)])
+            self.steps_since_sweep = 1
+            return c
+
+        tiles = np.argwhere(self.active)
+        self.steps_since_sweep += 1
+        if len(tiles) == 0:
+            return c
+
+        #integrate the active tiles, with their halos, as a batch of grids; the boundary conditions applied
+        #to the edges of each block only affect its halo, which is discarded
+        blocks = c[self._tile_indices(tiles, HALO)]
+        updated_blocks = Cahn_Hilliard_equation_integration(blocks, self.A, self.k, self.dx, self.dy, self.M, self.dt,
+                                                            dz=self.dz, boundary=self.boundary)
+        interior = (slice(None),)+(slice(HALO, -HALO),)*len(self.shape)
+        updated_blocks = updated_blocks[interior]
+        changes = np.abs(updated_blocks - blocks[interior])
+        c[self._tile_indices(tiles, 0)] = updated_blocks
+        self.active = self._activity(tiles, changes)
+        return c
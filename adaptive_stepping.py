@@ -0,0 +1,110 @@
+import numpy as np
+from chemical_potential_free_energy import free_energy
+
+
+class AdaptiveTimeStepper:
+    """This class performs time integration of the Cahn-Hilliard equation with a time step adapted to the dynamics.
+    The local error of each step is estimated by step doubling: the grid is evolved with one step dt and with two
+    steps dt/2, and the maximum difference between the two results is compared with the tolerance. A step is
+    accepted only if the error is within the tolerance and the free energy does not increase; the more accurate
+    two half-steps result is kept. After each attempt, dt is rescaled by safety*sqrt(tolerance/error)
+    (the local error of the first order schemes scales as dt^2), within [dt_min, dt_max] and by at most
+    a factor max_growth. A step that still fails the checks at dt_min is accepted anyway, and counted in n_forced.
+
+    Parameters:
+    integrator: function
+            time integration function with the signature of Cahn_Hilliard_equation_integration()
+    A, k, dx, dy, M: floats (A, k, M can be arrays of shape (B, 1, 1) for a batch of microstructures)
+            parameters of the Cahn-Hilliard equation, see Cahn_Hilliard_equation_integration()
+    dt: float, >0.
+        initial time step
+    dt_min, dt_max: floats, 0. < dt_min <= dt_max
+        bounds of the time step
+    tolerance: float, >0.
+        maximum accepted local error on the concentration
+    safety: float in (0,1]
+        safety factor applied to the optimal time step
+    max_growth: float, >1.
+        maximum growth factor of the time step between two consecutive steps
+    dz: float or None
+        dimension in z direction of a concentration subcell, None (default) for a 2D microstructure
+    boundary: str
+        boundary conditions, 'periodic' (default) or 'neumann'"""
+
+    def __init__(self, integrator, A, k, dx, dy, M, dt, dt_min, dt_max, tolerance, safety=0.9, max_growth=2.,
+                 dz=None, boundary='periodic'):
+
+        #check validity of input parameters
+        if dt_min <= 0. or dt_max < dt_min:
+            raise ValueError('Time step bounds must satisfy 0 < dt_min <= dt_max, check the config.txt file description')
+        if tolerance <= 0.:
+            raise ValueError('Tolerance must be positive, check the config.txt file description')
+        if not 0. < safety <= 1. or max_growth <= 1.:
+            raise ValueError('Safety factor must be in (0,1] and max_growth > 1')
+
+        self.integrator = integrator
+        self.A, self.k, self.dx, self.dy, self.M = A, k, dx, dy, M
+        self.dz = dz
+        self.boundary = boundary
+        self.dt = min(max(dt, dt_min), dt_max)
+        self.dt_min = dt_min
+        self.dt_max = dt_max
+        self.tolerance = tolerance
+        self.safety = safety
+        self.max_growth = max_growth
+        #statistics of the integration
+        self.n_accepted = 0
+        self.n_rejected = 0
+        self.n_forced = 0
+
+    def _integrate(self, c, dt):
+        """This method performs a single step of the integrator on a copy of c, so that in place integrators
+        do not overwrite the grid needed by the other attempts"""
+        return self.integrator(c.copy(), self.A, self.k, self.dx, self.dy, self.M, dt, dz=self.dz, boundary=self.boundary)
+
+    def step(self, c, dt_limit=np.inf):
+        """This method performs one accepted time step, retrying with smaller time steps if needed
+
+        Parameters:
+        c: array of floats
+           current concentration grid (not modified)
+        dt_limit: float
+           maximum time step for this step, e.g. to end exactly at a given time
+
+        Returns:
+        c_updated: array of floats
+                   concentration grid after the accepted step
+        dt_taken: float
+                  time step of the accepted step"""
+
+        F = free_energy(c, self.A, self.k, self.dx, self.dy, self.dz, self.boundary)
+        while True:
+            dt = min(self.dt, dt_limit)
+            c_full = self._integrate(c, dt)
+            c_half = self._integrate(self._integrate(c, dt/2), dt/2)
+            #python float, so that the time step is not rounded to the precision of a float32 grid
+            error = float(np.max(np.abs(c_half - c_full)))
+            F_updated = free_energy(c_half, self.A, self.k, self.dx, self.dy, self.dz, self.boundary)
+            #free energy must not increase, up to round-off errors
+            energy_decreased = np.all(F_updated <= F + 1e-12*np.abs(F))
+
+            #optimal time step for the next attempt
+            factor = self.max_growth if error == 0. else self.safety*np.sqrt(self.tolerance/error)
+            factor = min(self.max_growth, max(0.2, factor))
+
+            if error <= self.tolerance and energy_decreased:
+                self.n_accepted += 1
+                #only grow the time step if it was not limited by dt_limit
+                if dt == self.dt or factor < 1.:
+                    self.dt = min(self.dt_max, max(self.dt_min, dt*factor))
+                return c_half, dt
+            if dt <= self.dt_min:
+                self.n_accepted += 1
+                self.n_forced += 1
+                return c_half, dt
+
+            self.n_rejected += 1
+            #a step increasing the free energy is retried with at most half the time step
+            if not energy_decreased:
+                factor = min(factor, 0.5)
+            self.dt = max(self.dt_min, dt*factor)
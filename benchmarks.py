@@ -0,0 +1,294 @@
+import numpy as np
+import argparse as ap
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timezone
+from concentration_laplacian import concentration_laplacian
+from chemical_potential_free_energy import chemical_potential, free_energy, fused_diagnostics
+from CahnHilliard_equation import INTEGRATORS
+from snapshot_io import open_snapshot_writer, load_snapshots
+from structure_factor import StructureFactorAnalyzer
+from active_set import ActiveSetStepper
+
+#parameters of the benchmarked functions (same as the default configuration)
+A, K, DX, DY, M, DT = 1., 0.5, 1., 1., 1., 0.01
+
+#maximum size of the snapshot files written by the I/O benchmarks
+MAX_IO_BYTES = 64*2**20
+
+#largest grid size of the text format benchmarks, whose files grow by about 20 bytes per subcell
+MAX_TEXT_N = 1024
+
+#extension of the snapshot files written by the I/O benchmarks
+SNAPSHOT_EXTENSIONS = {'binary': '.npy', 'text': '.txt', 'compressed': '.chz'}
+
+
+def make_grid(N, dtype):
+    """This function returns the seeded random N-by-N concentration grid used by all the benchmarks"""
+    rng = np.random.default_rng(0)
+    return (0.5 + 0.02*(2.*rng.random((N, N)) - 1.)).astype(dtype)
+
+
+def n_io_frames(N, dtype, output_format):
+    """This function returns the number of grids written by the I/O benchmarks, so that files stay below MAX_IO_BYTES"""
+    frame_bytes = N*N*{'binary': np.dtype(dtype).itemsize, 'text': 20, 'compressed': 2}[output_format]
+    return int(max(2, min(16, MAX_IO_BYTES // frame_bytes)))
+
+
+def setup_laplacian(N, dtype, directory):
+    """This function returns the benchmark of concentration_laplacian() on an N-by-N grid"""
+    c = make_grid(N, dtype)
+    return lambda: concentration_laplacian(c, DX, DY)
+
+
+def setup_chemical_potential(N, dtype, directory):
+    """This function returns the benchmark of chemical_potential() on an N-by-N grid"""
+    c = make_grid(N, dtype)
+    return lambda: chemical_potential(c, A)
+
+
+def setup_free_energy(N, dtype, directory):
+    """This function returns the benchmark of free_energy() on an N-by-N grid"""
+    c = make_grid(N, dtype)
+    return lambda: free_energy(c, A, K, DX, DY)
+
+
+def setup_fused_diagnostics(N, dtype, directory):
+    """This function returns the benchmark of fused_diagnostics() on an N-by-N grid"""
+    c = make_grid(N, dtype)
+    return lambda: fused_diagnostics(c, A, K, DX, DY)
+
+
+def setup_structure_factor(N, dtype, directory):
+    """This function returns the benchmark of the structure factor analysis of an N-by-N grid"""
+    c = make_grid(N, dtype)
+    analyzer = StructureFactorAnalyzer(c.shape, DX, DY)
+    return lambda: analyzer.analyze(c)
+
+
+def make_setup_step(integrator):
+    """This function returns the setup of the benchmark of a time step of the given integrator"""
+    def setup_step(N, dtype, directory):
+        c = make_grid(N, dtype)
+        integrate = INTEGRATORS[integrator]
+        return lambda: integrate(c.copy(), A, K, DX, DY, M, DT)
+    return setup_step
+
+
+def setup_active_set_step(N, dtype, directory):
+    """This function returns the benchmark of an active set step (including the full sweeps, every 50 steps)
+    on a sparse N-by-N grid, as in the late coarsening: two bulk domains at concentration 0 and 1,
+    and a noisy square of side N/8 at the centre"""
+    c = np.zeros((N, N), dtype=dtype)
+    c[:, :N//2] = 1.
+    side = max(2, N//8)
+    c[(N-side)//2:(N+side)//2, (N-side)//2:(N+side)//2] = make_grid(side, dtype)
+    stepper = ActiveSetStepper(INTEGRATORS['explicit_inplace'], c.shape, A, K, DX, DY, M, DT)
+    stepper.step(c)
+    return lambda: stepper.step(c)
+
+
+def make_setup_write(output_format):
+    """This function returns the setup of the benchmark writing a sequence of grids with the snapshot writer"""
+    def setup_write(N, dtype, directory):
+        c = make_grid(N, dtype)
+        n_frames = n_io_frames(N, dtype, output_format)
+        path = os.path.join(directory, 'benchmark_write'+SNAPSHOT_EXTENSIONS[output_format])
+        def write():
+            with open_snapshot_writer(path, output_format, (N, N), n_frames, np.dtype(dtype)) as writer:
+                for frame in range(n_frames):
+                    writer.write(frame*DT, c)
+        return write
+    return setup_write
+
+
+def make_setup_load(output_format):
+    """This function returns the setup of the benchmark reproducing the data loading of plots.py: the snapshots
+    are opened with load_snapshots(), one grid out of 5 is read as in the animation, and the file of the average
+    quantities is read with np.loadtxt"""
+    def setup_load(N, dtype, directory):
+        c = make_grid(N, dtype)
+        n_frames = n_io_frames(N, dtype, output_format)
+        path = os.path.join(directory, 'benchmark_load'+SNAPSHOT_EXTENSIONS[output_format])
+        averages_path = os.path.join(directory, 'benchmark_averages.txt')
+        with open_snapshot_writer(path, output_format, (N, N), n_frames, np.dtype(dtype)) as writer:
+            for frame in range(n_frames):
+                writer.write(frame*DT, c)
+        np.savetxt(averages_path, np.zeros((n_frames, 4)), header='Time AverageConcentration AverageChem.Potential FreeEnergy',
+                   comments='')
+        def load():
+            t, frames = load_snapshots(path, output_format)
+            total = 0.
+            for frame in range(0, len(t), 5):
+                total += float(frames[frame].sum())
+            np.loadtxt(averages_path, skiprows=1, unpack=True, usecols=(0, 1, 2, 3))
+            return total
+        return load
+    return setup_load
+
+
+#benchmarks: name -> (setup function, largest grid size or None)
+#the setup function receives grid size, dtype and a scratch directory and returns the function to be timed
+BENCHMARKS = {'concentration_laplacian': (setup_laplacian, None),
+              'chemical_potential': (setup_chemical_potential, None),
+              'free_energy': (setup_free_energy, None),
+              'fused_diagnostics': (setup_fused_diagnostics, None),
+              'structure_factor': (setup_structure_factor, None),
+              'step_explicit': (make_setup_step('explicit'), None),
+              'step_explicit_inplace': (make_setup_step('explicit_inplace'), None),
+              'step_spectral': (make_setup_step('spectral'), None),
+              'step_active_set_sparse': (setup_active_set_step, None),
+              'write_snapshots_binary': (make_setup_write('binary'), None),
+              'write_snapshots_text': (make_setup_write('text'), MAX_TEXT_N),
+              'write_snapshots_compressed': (make_setup_write('compressed'), None),
+              'load_snapshots_binary': (make_setup_load('binary'), None),
+              'load_snapshots_text': (make_setup_load('text'), MAX_TEXT_N),
+              'load_snapshots_compressed': (make_setup_load('compressed'), None)}
+
+
+def time_function(function, repeat=5, min_time=0.2):
+    """This function times a function with timeit: the number of calls per measurement is chosen so that
+    each measurement lasts at least min_time seconds, and the measurement is repeated.
+
+    Parameters:
+    function: callable without arguments
+            function to be timed
+    repeat: int, >=1
+            number of measurements
+    min_time: float
+            minimum duration of a measurement, in seconds
+
+    Returns:
+    timing: dict
+            best and median time per call (in seconds), number of calls per measurement and number of measurements"""
+
+    timer = timeit.Timer(function)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time or number >= 10**6:
+            break
+        number = max(2*number, int(number*1.2*min_time/max(elapsed, 1e-9)))
+    times = [elapsed/number] + [timer.timeit(number)/number for i in range(repeat-1)]
+    return {'best': min(times), 'median': float(np.median(times)), 'number': number, 'repeat': repeat}
+
+
+def run_benchmarks(sizes, dtypes, names=None, repeat=5, min_time=0.2, log=None):
+    """This function runs the benchmarks for each grid size and float precision
+
+    Parameters:
+    sizes: list of ints
+            grid sizes N of the N-by-N benchmark grids
+    dtypes: list of str
+            float precisions, e.g. ['float32', 'float64']
+    names: list of str or None
+            benchmarks to be run (default: all the BENCHMARKS)
+    repeat, min_time: int, float
+            see time_function()
+    log: file-like or None
+            if given, a line is printed to it for each benchmark
+
+    Returns:
+    results: list of dicts
+            name, N, dtype and timing of each benchmark
+
+    Raise:
+        ValueError if a benchmark name is not valid"""
+
+    names = list(BENCHMARKS) if names is None else names
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError('Unknown benchmark '+name+', valid options are: '+', '.join(BENCHMARKS))
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name in names:
+            setup, max_size = BENCHMARKS[name]
+            for N in sizes:
+                if max_size is not None and N > max_size:
+                    continue
+                for dtype in dtypes:
+                    timing = time_function(setup(N, dtype, directory), repeat, min_time)
+                    result = {'name': name, 'N': N, 'dtype': dtype}
+                    result.update(timing)
+                    results.append(result)
+                    if log is not None:
+                        log.write('{:<24} N={:<5} {:<8} {:.3e} s\n'.format(name, N, dtype, timing['best']))
+                        log.flush()
+    return results
+
+
+def benchmark_report(results):
+    """This function returns the benchmark results together with a description of the machine and software"""
+    return {'metadata': {'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                         'python': platform.python_version(),
+                         'numpy': np.__version__,
+                         'platform': platform.platform(),
+                         'cpu_count': os.cpu_count()},
+            'results': results}
+
+
+def compare_results(results, baseline_results, threshold=0.1):
+    """This function compares the best times of the benchmarks with the ones of a stored baseline
+
+    Parameters:
+    results: list of dicts
+            benchmark results, as returned by run_benchmarks()
+    baseline_results: list of dicts
+            benchmark results of the baseline
+    threshold: float, >=0.
+            relative change of the time below which a benchmark is considered unchanged
+
+    Returns:
+    comparison: list of dicts
+            name, N, dtype, baseline and current time, ratio current/baseline and status ('faster', 'slower'
+            or 'unchanged') of each benchmark present in both results"""
+
+    baseline = {(result['name'], result['N'], result['dtype']): result['best'] for result in baseline_results}
+    comparison = []
+    for result in results:
+        key = (result['name'], result['N'], result['dtype'])
+        if key not in baseline:
+            continue
+        ratio = result['best']/baseline[key]
+        if ratio > 1.+threshold:
+            status = 'slower'
+        elif ratio < 1./(1.+threshold):
+            status = 'faster'
+        else:
+            status = 'unchanged'
+        comparison.append({'name': key[0], 'N': key[1], 'dtype': key[2], 'baseline': baseline[key],
+                           'current': result['best'], 'ratio': ratio, 'status': status})
+    return comparison
+
+
+if __name__ == '__main__':
+    parser = ap.ArgumentParser(description='Benchmark the kernels, the time integration and the I/O of the simulation')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 256, 1024, 4096], help='grid sizes N')
+    parser.add_argument('--dtypes', nargs='+', default=['float32', 'float64'], help='float precisions')
+    parser.add_argument('--benchmarks', nargs='+', default=None, help='benchmarks to run: '+', '.join(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=5, help='number of measurements of each benchmark')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum duration of a measurement, in seconds')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file to store the results')
+    parser.add_argument('--compare', metavar='baseline', default=None, help='JSON results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change considered significant')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.dtypes, args.benchmarks, args.repeat, args.min_time, log=sys.stdout)
+    with open(args.output, 'w') as f:
+        json.dump(benchmark_report(results), f, indent=1)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline_results = json.load(f)['results']
+        comparison = compare_results(results, baseline_results, args.threshold)
+        print('\nComparison with', args.compare)
+        for entry in comparison:
+            print('{:<24} N={:<5} {:<8} {:.3e} s -> {:.3e} s  x{:.2f}  {}'.format(
+                  entry['name'], entry['N'], entry['dtype'], entry['baseline'], entry['current'], entry['ratio'], entry['status']))
+        #non-zero exit status if any benchmark got slower, so that regressions can be caught automatically
+        sys.exit(int(any(entry['status'] == 'slower' for entry in comparison)))
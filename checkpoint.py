@@ -0,0 +1,109 @@
+import numpy as np
+import hashlib
+import os
+
+
+#settings determining the simulated trajectory: the section name, and its keys (None for all the keys)
+HASHED_SETTINGS = {'microstructure_settings': None,
+                   'time_settings': ('t0', 'dt', 'integrator', 'dtype', 'adaptive', 'dt_min', 'dt_max', 'tolerance'),
+                   'simulation_seed': None,
+                   'initial_conditions': None,
+                   'ensemble': None,
+                   'active_set': None}
+
+
+def config_hash(config, hashed_settings=HASHED_SETTINGS):
+    """This function computes a hash of the physical and initial condition settings of the simulation,
+    used to check that a simulation is restarted from a checkpoint produced with the same settings.
+    The number of iterations, t_end, output cadence, checkpoints, data paths and the other sections are
+    not included, so that a restart can extend the run or write its outputs elsewhere.
+
+    Parameters:
+    config: configparser.ConfigParser
+            simulation configuration
+    hashed_settings: dict
+            sections included in the hash, each with the tuple of its included keys (None for all the keys)
+
+    Returns:
+    hash: str
+          hexadecimal sha256 digest of the included sections and values"""
+
+    sha = hashlib.sha256()
+    for section in sorted(config.sections()):
+        if section not in hashed_settings:
+            continue
+        keys = hashed_settings[section]
+        for key, value in sorted(config.items(section)):
+            if keys is None or key in keys:
+                sha.update(f"[{section}]{key}={value.strip()}\n".encode())
+    return sha.hexdigest()
+
+
+def save_checkpoint(path, c, t, step, configuration_hash, extra=None):
+    """This function saves to a binary .npz file all the information needed to restart the simulation:
+    concentration grid, current time, step index, state of numpy random number generator and configuration hash.
+    The file is first written to a temporary file and then renamed, so that an interrupted write
+    never corrupts the previous checkpoint.
+
+    Parameters:
+    path: str
+          path of the checkpoint file
+    c: array of floats
+       current concentration grid
+    t: float
+       current time
+    step: int
+          index of the last performed time step
+    configuration_hash: str
+          hash of the simulation configuration, as returned by config_hash()
+    extra: dict or None
+          additional named arrays or numbers to be stored (e.g. the current time step of adaptive integration)"""
+
+    extra = {} if extra is None else extra
+    rng_name, rng_keys, rng_pos, rng_has_gauss, rng_cached_gaussian = np.random.get_state()
+    temporary_path = path+'.tmp'
+    with open(temporary_path, 'wb') as f:
+        np.savez(f, c=c, t=t, step=step, config_hash=configuration_hash,
+                 rng_name=rng_name, rng_keys=rng_keys, rng_pos=rng_pos,
+                 rng_has_gauss=rng_has_gauss, rng_cached_gaussian=rng_cached_gaussian,
+                 **{'extra_'+name: value for name, value in extra.items()})
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+
+
+def load_checkpoint(path, configuration_hash=None, return_extra=False):
+    """This function reads a checkpoint written by save_checkpoint() and restores the state
+    of numpy random number generator.
+
+    Parameters:
+    path: str
+          path of the checkpoint file
+    configuration_hash: str or None
+          if given, hash of the current configuration, which must match the one stored in the checkpoint
+    return_extra: bool
+          if True, also return the additional values stored with the extra parameter of save_checkpoint()
+
+    Returns:
+    c: array of floats
+       concentration grid
+    t: float
+       time of the checkpoint
+    step: int
+          index of the last time step performed before the checkpoint
+    extra: dict
+          additional values stored in the checkpoint (only if return_extra is True)
+
+    Raise:
+        ValueError if the checkpoint was produced with a different configuration"""
+
+    with np.load(path) as checkpoint:
+        if configuration_hash is not None and str(checkpoint['config_hash']) != configuration_hash:
+            raise ValueError('Checkpoint '+path+' was produced with a different simulation configuration')
+        np.random.set_state((str(checkpoint['rng_name']), checkpoint['rng_keys'], int(checkpoint['rng_pos']),
+                             int(checkpoint['rng_has_gauss']), float(checkpoint['rng_cached_gaussian'])))
+        c, t, step = checkpoint['c'].copy(), float(checkpoint['t']), int(checkpoint['step'])
+        if return_extra:
+            extra = {name[len('extra_'):]: checkpoint[name][()] for name in checkpoint.files if name.startswith('extra_')}
+            return c, t, step, extra
+        return c, t, step
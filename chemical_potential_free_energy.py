@@ -1,48 +1,89 @@
 import numpy as np
+from concentration_laplacian import grid_spacings, check_boundary
 
 
-def free_energy(c, A, k, dx, dy):
+def parameter_as_dtype(value, dtype):
+    """This function converts a numpy parameter (scalar, or array of shape (B, 1, 1) with a value per microstructure)
+    to the floating point type of the concentration grid, so that a float32 grid is not upcast to float64 by
+    float64 parameters. Python floats, which never change the type of an array, are returned unchanged.
+
+    Parameters:
+    value: float or numpy array
+           parameter multiplying the grid (e.g. A, k, M, dt)
+    dtype: numpy dtype
+           type of the concentration grid (non floating point types leave the parameter unchanged)
+
+    Returns:
+    value: float or numpy array of type dtype"""
+
+    if not np.issubdtype(dtype, np.floating) or not (np.ndim(value) > 0 or isinstance(value, np.generic)):
+        return value
+    return np.asarray(value, dtype=dtype)
+
+
+def free_energy(c, A, k, dx, dy, dz=None, boundary='periodic'):
     """This function computes the free energy of the system as the sum of the homogeneous term and 
     of the gradient term of the generalized diffusion potential. 
     Check README.md for the physical meaning of the parameters
     
     Parameters:
-    c: Ny-by-Nx array of float numbers 
+    c: Ny-by-Nx array of float numbers, or array of shape (B, Ny, Nx) for a batch of B microstructures
+       (Nz-by-Ny-by-Nx, or (B, Nz, Ny, Nx), for a 3D microstructure)
        concentration field of 2D microstructure formed by Nx times Ny subcells
-    A: float
+    A: float, or array of shape (B, 1, 1) with a value per microstructure
        multiplicative constant
-    k: float
+    k: float, or array of shape (B, 1, 1) with a value per microstructure
        gradient coefficient
     dx: float
         dimension in x direction of a concentration subcell
     dy: float
         dimension in y direction of a concentration subcell
+    dz: float or None
+        dimension in z direction of a concentration subcell, None (default) for a 2D microstructure
+    boundary: str
+        boundary conditions, 'periodic' (default) or 'neumann'
     
     Returns:
-    free_energy: float
+    free_energy: float, or 1D array of B floats for a batch of microstructures
                  the total free energy of the concentration configuration"""
     
     
     #check validity of input parameters, validity of c already check in the create_initial_config() function
-    if dx<=0. or dy<=0. or A<0. or k<0.:
-        raise ValueError('dx, dy, A, k parameters cannot be negative, check again the config.txt file description')
+    spacings = grid_spacings(dx, dy, dz)
+    if any(d <= 0. for d in spacings) or np.any(np.asarray(A)<0.) or np.any(np.asarray(k)<0.):
+        raise ValueError('dx, dy, dz, A, k parameters cannot be negative, check again the config.txt file description')
+    check_boundary(boundary)
     
-    #retrieve shape of the c array
-    Ny, Nx = np.shape(c)
+    #the grid axes are the last ones of c (leading axes, if any, index different microstructures)
+    c = np.asarray(c)
+    grid_axes = tuple(range(-len(spacings), 0))
+    A, k = parameter_as_dtype(A, c.dtype), parameter_as_dtype(k, c.dtype)
 
-    #compute homogeneous free energy term
-    F_homogeneous = dx*dy*A*np.sum(c*c*(1-c)*(1-c))
+    #compute homogeneous free energy term, multiplied by the subcell area (volume in 3D)
+    subcell_volume = dx*dy if dz is None else dx*dy*dz
+    F_homogeneous = subcell_volume*np.sum(A*c*c*(1-c)*(1-c), axis=grid_axes)
 
     #compute gradient term using forward finite difference to compute the derivatives:
      #to simulate a periodic structure of unit cell equal to the simulated microstructure, for edge elements
      #use the element at the other edge of the supercell to compute the difference, 
-     #as if the supercell was closed with opposite edges connected
-    c_y_minus_dy_elements = np.vstack([c[Ny-1,:],c[0:Ny-1,:]])
-    c_x_minus_dx_elements = np.hstack([c[:,Nx-1].reshape((Nx,1)), c[:,0:Nx-1]])
-    F_gradient = (k/(dx)**2)*np.sum((c-c_x_minus_dx_elements)**2) + (k/(dy)**2)*np.sum((c-c_y_minus_dy_elements)**2)
+     #as if the supercell was closed with opposite edges connected;
+     #for neumann boundary conditions the edge elements have no outer neighbour, and only the differences
+     #between the elements inside the supercell contribute
+    F_gradient = 0.
+    for n, d in enumerate(spacings):
+        if boundary == 'neumann':
+            F_axis = np.sum((k/(d)**2)*np.diff(c, axis=-1-n)**2, axis=grid_axes)
+        else:
+            c_minus_d_elements = np.roll(c, 1, axis=-1-n)
+            F_axis = np.sum((k/(d)**2)*(c-c_minus_d_elements)**2, axis=grid_axes)
+        F_gradient = F_axis if n == 0 else F_gradient + F_axis
 
     free_energy = F_homogeneous + F_gradient
 
+    #return a single float for a single microstructure
+    if np.ndim(free_energy) == 0:
+        free_energy = float(free_energy)
+
     return free_energy
 
 def chemical_potential(c, A):
@@ -50,42 +91,188 @@ def chemical_potential(c, A):
     as the analytical derivative of the free energy homogeneous term with respect to the concentration.
     
     Parameters:
-    c: N-by-N 2D array of float numbers 
+    c: N-by-N 2D array of float numbers, or array of shape (B, N, N) for a batch of B microstructures
+       (or a 3D microstructure, the chemical potential being computed subcell by subcell)
        concentration field of 2D microstructure formed by Nx times Ny subcells
-    A: float
+    A: float, or array of shape (B, 1, 1) with a value per microstructure
        multiplicative constant
        
     Returns:
-    chem_potential: Ny-by-Nx array of float numbers 
+    chem_potential: array of float numbers of same shape of c
                     chemical potential field """
-    if A<0.:
+    if np.any(np.asarray(A)<0.):
         raise ValueError('A must be positive, check the config.txt file description')
+    c = np.asarray(c)
+    A = parameter_as_dtype(A, c.dtype)
 
-    chem_potential = 2*A*(c*((1-c)**2) - (c**2)*(1-c))
+    #2A*(c*(1-c)^2 - c^2*(1-c)) factorized as 2A*c*(1-c)*(1-2c), with the same operations
+    #of the in place integrator (see stencil_workspace.py), so that the two give identical values
+    chem_potential = (c*-2 + 1)*((1-c)*c)*(2*A)
 
     return chem_potential
 
-def average_chemical_potential_and_concentration(c_grid, chem_pot_grid, N):
+def average_chemical_potential_and_concentration(c_grid, chem_pot_grid, n_axes=2):
     """This function computes the average chemical potential and average concentration value of a concentration configuration
     starting from its chemical potential grid and concentration grid
     
     Parameters:
-    c: N-by-N 2D array of float numbers
+    c: Ny-by-Nx 2D array of float numbers, or array of shape (B, Ny, Nx) for a batch of B microstructures
+       (Nz-by-Ny-by-Nx, or (B, Nz, Ny, Nx), for a 3D microstructure)
        concentration grid
-    chem_pot_grid: N-by-N 2D array of float numbers
+    chem_pot_grid: array of float numbers of same shape of c
                chemical potential grid
-    N: int
-       Specifies the shape (N,N) of the chem_grid and c array
+    n_axes: int
+       number of spatial axes of the grids, 2 (default) or 3 for a 3D microstructure
        
     Returns:
-    average_chem_pot: float
+    average_chem_pot: float, or 1D array of B floats for a batch of microstructures
                       The average chemical potential of the chemical potential grid
-    average_c: float
-                The average concentration value of the """
+    average_c: float, or 1D array of B floats for a batch of microstructures
+                The average concentration value of the concentration grid"""
     
-    average_chem_pot = np.sum(chem_pot_grid)/(N*N)
-    average_c = np.sum(c_grid)/(N*N)
+    grid_axes = tuple(range(-n_axes, 0))
+    average_chem_pot = np.mean(chem_pot_grid, axis=grid_axes)
+    average_c = np.mean(c_grid, axis=grid_axes)
 
     return average_chem_pot, average_c
 
-    
\ No newline at end of file
+    
+def _value_per_grid(value, n_axes=2):
+    """This function reduces a parameter of shape (B, 1, 1) (or (B, 1, 1, 1) for 3D microstructures, n_axes=3)
+    to shape (B,), to multiply the sums over each grid"""
+    return np.asarray(value).reshape(np.shape(value)[:-n_axes]) if np.ndim(value) >= n_axes else value
+
+def _sum_of_squares(a, n_axes):
+    """This function returns the sum of the squares of a over its last n_axes axes, with an einsum
+    ('...ij,...ij->...' for n_axes=2) avoiding the temporary array of the squares"""
+    indices = 'ijk'[:n_axes]
+    return np.einsum('...'+indices+',...'+indices+'->...', a, a)
+
+#approximate number of elements of the blocks of rows (xy planes in 3D) processed at once by fused_diagnostics(),
+#small enough for the block and its scratch buffers to stay in the CPU cache
+DIAGNOSTICS_BLOCK_ELEMENTS = 2**16
+
+def fused_diagnostics(c, A, k, dx, dy, dz=None, boundary='periodic', out=None):
+    """This function computes, with a single pass over the concentration grid, all the quantities
+    saved by the simulation: average concentration, average chemical potential, homogeneous and gradient
+    terms of the free energy. The grid is processed in blocks of rows (of xy planes in 3D) of about
+    DIAGNOSTICS_BLOCK_ELEMENTS elements, using two block-sized scratch buffers, so that each block is read
+    from memory once and all its quantities are computed while it stays in the CPU cache; no full-grid
+    temporary is allocated besides the chemical potential grid (not even that one, if out is given).
+    The product c*(1-c) is shared by the chemical potential and the homogeneous term, and the gradient term
+    is computed from the forward differences of c along each axis (the ones along the rows reading the
+    first row of the next block). The chemical potential grid is also returned, so that it can be reused
+    by the next time integration step (see Cahn_Hilliard_equation_integration()).
+    
+    Parameters:
+    c: Ny-by-Nx array of float numbers, or array of shape (B, Ny, Nx) for a batch of B microstructures
+       (Nz-by-Ny-by-Nx, or (B, Nz, Ny, Nx), for a 3D microstructure)
+       concentration field of 2D microstructure formed by Nx times Ny subcells
+    A: float, or array of shape (B, 1, 1) with a value per microstructure
+       multiplicative constant
+    k: float, or array of shape (B, 1, 1) with a value per microstructure
+       gradient coefficient
+    dx, dy: floats, >0.
+       dimensions in x and y direction of a concentration subcell
+    dz: float or None
+       dimension in z direction of a concentration subcell, None (default) for a 2D microstructure
+    boundary: str
+       boundary conditions, 'periodic' (default) or 'neumann'
+    out: array of floats of same shape and dtype of c, or None
+       array where the chemical potential is written (allocated if None)
+    
+    Returns:
+    average_c: float, or 1D array of B floats for a batch of microstructures
+               average concentration
+    average_chem_pot: float, or 1D array of B floats
+               average chemical potential
+    F_homogeneous: float, or 1D array of B floats
+               homogeneous term of the free energy
+    F_gradient: float, or 1D array of B floats
+               gradient term of the free energy (free_energy() returns F_homogeneous + F_gradient)
+    chem_potential: array of float numbers of same shape of c
+               chemical potential field, equal to chemical_potential(c, A)"""
+
+    #check validity of input parameters
+    spacings = grid_spacings(dx, dy, dz)
+    if any(d <= 0. for d in spacings) or np.any(np.asarray(A)<0.) or np.any(np.asarray(k)<0.):
+        raise ValueError('dx, dy, dz, A, k parameters cannot be negative, check again the config.txt file description')
+    check_boundary(boundary)
+
+    c = np.asarray(c)
+    if not np.issubdtype(c.dtype, np.inexact):
+        c = c.astype(np.float64)
+    n_axes = len(spacings)
+    grid_axes = tuple(range(-n_axes, 0))
+    n_cells = int(np.prod(np.shape(c)[-n_axes:]))
+    A, k = parameter_as_dtype(A, c.dtype), parameter_as_dtype(k, c.dtype)
+    chem_potential = np.empty_like(c) if out is None else out
+
+    #blocks of rows along the first grid axis, for all the microstructures of the batch
+    row_axis = c.ndim-n_axes
+    n_rows = c.shape[row_axis]
+    rows = max(1, DIAGNOSTICS_BLOCK_ELEMENTS//max(1, c.size//n_rows))
+    block_shape = c.shape[:row_axis]+(min(rows, n_rows),)+c.shape[row_axis+1:]
+    c_one_minus_c = np.empty(block_shape, dtype=c.dtype)
+    scratch = np.empty(block_shape, dtype=c.dtype)
+
+    def rows_of(a, r0, r1, axis=row_axis):
+        index = [slice(None)]*a.ndim
+        index[axis] = slice(r0, r1)
+        return a[tuple(index)]
+
+    sums = {name: 0. for name in ('c', 'chem_potential', 'homogeneous')}
+    squares = [0.]*n_axes
+    for r0 in range(0, n_rows, rows):
+        r1 = min(r0+rows, n_rows)
+        c_block = rows_of(c, r0, r1)
+        mu_block = rows_of(chem_potential, r0, r1)
+        #c*(1-c) is shared by the chemical potential 2A*c*(1-c)*(1-2c) and the homogeneous term A*c^2*(1-c)^2
+        c1c = rows_of(c_one_minus_c, 0, r1-r0)
+        np.subtract(1, c_block, out=c1c)
+        c1c *= c_block
+        np.multiply(c_block, -2, out=mu_block)
+        mu_block += 1
+        mu_block *= c1c
+        mu_block *= 2*A
+        sums['homogeneous'] = sums['homogeneous'] + _sum_of_squares(c1c, n_axes)
+        sums['c'] = sums['c'] + np.sum(c_block, axis=grid_axes)
+        sums['chem_potential'] = sums['chem_potential'] + np.sum(mu_block, axis=grid_axes)
+
+        #squared forward differences along each axis, with periodic boundary conditions (the last difference
+        #wraps around the edge, while there is none for neumann boundary conditions)
+        for n in range(n_axes):
+            axis = c.ndim-1-n
+            if axis == row_axis:
+                #differences with the next row, also the first row of the next block
+                last = min(r1, n_rows-1)
+                difference = rows_of(scratch, 0, last-r0)
+                np.subtract(rows_of(c, r0+1, last+1), rows_of(c, r0, last), out=difference)
+                edge = boundary != 'neumann' and r1 == n_rows
+                edge_difference = (np.take(c, 0, axis=axis) - np.take(c, n_rows-1, axis=axis)) if edge else None
+            else:
+                difference = rows_of(rows_of(scratch, 0, r1-r0), 0, c.shape[axis]-1, axis)
+                np.subtract(rows_of(c_block, 1, None, axis), rows_of(c_block, 0, -1, axis), out=difference)
+                edge = boundary != 'neumann'
+                edge_difference = (np.take(c_block, 0, axis=axis) - np.take(c_block, c.shape[axis]-1, axis=axis)) if edge else None
+            squares[n] = squares[n] + _sum_of_squares(difference, n_axes)
+            if edge_difference is not None:
+                squares[n] = squares[n] + _sum_of_squares(edge_difference, n_axes-1)
+
+    subcell_volume = dx*dy if dz is None else dx*dy*dz
+    F_homogeneous = subcell_volume*_value_per_grid(A, n_axes)*sums['homogeneous']
+    #squares divided by the squared subcell dimension
+    F_gradient = 0.
+    for n, d in enumerate(spacings):
+        F_gradient = squares[n]/(d*d) if n == 0 else F_gradient + squares[n]/(d*d)
+    F_gradient = _value_per_grid(k, n_axes)*F_gradient
+
+    average_c = sums['c']/n_cells
+    average_chem_pot = sums['chem_potential']/n_cells
+
+    #return single floats for a single microstructure
+    if np.ndim(c) == n_axes:
+        average_c, average_chem_pot, F_homogeneous, F_gradient = \
+            float(average_c), float(average_chem_pot), float(F_homogeneous), float(F_gradient)
+
+    return average_c, average_chem_pot, F_homogeneous, F_gradient, chem_potential
@@ -1,44 +1,137 @@
 import numpy as np
 
-def concentration_laplacian(c, dx, dy):
-    """This function calculates the laplacian of the concentration of a 2D microstructure 
-       using second symmetric derivative: 
+#boundary conditions of the microstructure, selected with the boundary key of the configuration file:
+#periodic (opposite edges connected) or neumann (no flux through the edges, mirrored edge subcells)
+BOUNDARIES = ('periodic', 'neumann')
+
+
+def grid_spacings(dx, dy, dz=None):
+    """This function returns the subcell dimensions along the grid axes of the concentration array,
+    in the order x, y (, z): x is the last axis of the array, y the second to last and z, for a 3D
+    microstructure (dz given), the third to last. The leading axes, if any, index different microstructures.
+
+    Parameters:
+    dx, dy: floats
+        dimensions in x and y direction of a concentration subcell
+    dz: float or None
+        dimension in z direction of a concentration subcell, None for a 2D microstructure
+
+    Returns:
+    spacings: tuple of floats
+        (dx, dy) for a 2D microstructure, (dx, dy, dz) for a 3D one"""
+    return (dx, dy) if dz is None else (dx, dy, dz)
+
+
+def check_boundary(boundary):
+    """This function checks that boundary is one of the available BOUNDARIES
+
+    Raise:
+        ValueError if boundary is not 'periodic' or 'neumann'"""
+    if boundary not in BOUNDARIES:
+        raise ValueError('Unknown boundary condition '+repr(boundary)+', valid options are: '+', '.join(BOUNDARIES))
+
+
+def boundary_indices(indices, n, boundary='periodic'):
+    """This function maps indices along an axis of n subcells, which can fall outside the grid (e.g. the halo of
+    a block of subcells), to the subcells holding their values: the subcell at the opposite edge for periodic
+    boundary conditions, the mirrored subcell at the same edge for neumann boundary conditions
+
+    Parameters:
+    indices: array of ints, in [-n, 2n)
+        indices along the axis
+    n: int
+        number of subcells along the axis
+    boundary: str
+        boundary conditions, 'periodic' (default) or 'neumann'
+
+    Returns:
+    indices: array of ints, in [0, n)
+        indices of the subcells inside the grid"""
+    indices = np.asarray(indices)
+    if boundary == 'neumann':
+        return np.where(indices < 0, -1-indices, np.where(indices >= n, 2*n-1-indices, indices))
+    return indices % n
+
+
+def _sum_neighbours(c, axis, out, boundary='periodic'):
+    """This function writes in out the sum c(x-d) + c(x+d) of the two neighbours of each subcell along axis,
+    using slices of c instead of shifted copies of the grid. With periodic boundary conditions the neighbour
+    outside an edge is the subcell at the opposite edge, with neumann boundary conditions it is the edge subcell
+    itself (mirrored edge), so that there is no flux through the edge"""
+    n = c.shape[axis]
+
+    def along(start, stop):
+        index = [slice(None)]*c.ndim
+        index[axis] = slice(start, stop)
+        return tuple(index)
+
+    np.add(c[along(0, n-2)], c[along(2, n)], out=out[along(1, n-1)])
+    if boundary == 'neumann':
+        np.add(c[along(0, 1)], c[along(1, 2)], out=out[along(0, 1)])
+        np.add(c[along(n-2, n-1)], c[along(n-1, n)], out=out[along(n-1, n)])
+    else:
+        np.add(c[along(n-1, n)], c[along(1, 2)], out=out[along(0, 1)])
+        np.add(c[along(n-2, n-1)], c[along(0, 1)], out=out[along(n-1, n)])
+    return out
+
+
+def concentration_laplacian(c, dx, dy, dz=None, boundary='periodic', out=None, scratch=None):
+    """This function calculates the laplacian of the concentration of a 2D (or 3D) microstructure
+       using second symmetric derivative:
        lap(c) = (c(x+dx,y)+c(x-dx,y)-2c(x,y))/(dx*dx) + (c(x,y+dy)+c(x,y-dy)-2c(x,y))/(dy*dy)
+       (plus the same term along z for a 3D microstructure).
        For the discrete microstructure that we simulate, dx, dy are equivalent to the subcell x and y dimensions
-       while c(x+dx, y) is equivalent to concentration of the right of c(x,y) cell, 
+       while c(x+dx, y) is equivalent to concentration of the right of c(x,y) cell,
        c(x, y+dy) is the concentration of the one below, considering cartesian axis with y axis pointing down, etc.
-    
+       The neighbours are read through slices of c, so that only two scratch grids are allocated
+       besides the result, whatever the number of dimensions (none, if out and scratch are given).
+
     Parameters:
-    c: Ny-by-Nx array of float numbers 
+    c: Ny-by-Nx array of float numbers, or array of shape (B, Ny, Nx) for a batch of B microstructures
+       (Nz-by-Ny-by-Nx, or (B, Nz, Ny, Nx), for a 3D microstructure)
        concentration field of 2D microstructure formed by Nx times Ny subcells
     dx: float
         dimension in x direction of a concentration subcell
     dy: float
         dimension in y direction of a concentration subcell
-        
+    dz: float or None
+        dimension in z direction of a concentration subcell, None (default) for a 2D microstructure
+    boundary: str
+        boundary conditions, 'periodic' (default) or 'neumann' (zero flux, c(x-dx) = c(x) at the left edge etc.)
+    out: array of floats of same shape of c, or None
+        array where the laplacian is written (allocated if None)
+    scratch: tuple of two arrays of floats of same shape of c, or None
+        buffers of the neighbour sums and of 2c (allocated if None)
+
     Returns:
-    c_laplacian: Nx-by-Ny array of float numbers
+    c_laplacian: array of float numbers of same shape of c (out, if given)
                  the laplacian of the microstructure concentration"""
-    
+
     #check validity of input parameters, validity of c already check in the create_initial_config() function
-    if dx<=0. or dy<=0.:
-        raise ValueError('dx and dy parameters must be positive, check the config.txt file description')
-    
-    #create c_laplacian output array of same shape of c
-    Ny, Nx = np.shape(c)
-     
-     #to simulate a periodic structure of unit cell equal to the simulated microstructure, for edge elements,
-     #use the element at the other edge of the supercell to compute the difference, 
-     #as if the supercell was closed with opposite edges connected
-    c_y_plus_dy_elements = np.vstack([c[Ny-1,:],c[0:Ny-1,:]])
-    c_y_minus_dy_elements = np.vstack([c[1:Ny,:],c[0,:]])
-    c_x_plus_dx_elements = np.hstack([c[:, 1:Nx], c[:,0].reshape((Nx,1))])
-    c_x_minus_dx_elements = np.hstack([c[:,Nx-1].reshape((Nx,1)), c[:,0:Nx-1]])
-    
-    #Reconstruct formula for symmetric second derivative
-    c_laplacian = (c_x_minus_dx_elements + c_x_plus_dx_elements - 2*c)/(dx*dx)
+    spacings = grid_spacings(dx, dy, dz)
+    if any(d <= 0. for d in spacings):
+        raise ValueError('dx, dy and dz parameters must be positive, check the config.txt file description')
+    check_boundary(boundary)
 
-    c_laplacian += (c_y_minus_dy_elements + c_y_plus_dy_elements-2*c)/(dy*dy)
+    #the grid axes are the last ones of c (leading axes, if any, index different microstructures)
+    c = np.asarray(c)
+    if not np.issubdtype(c.dtype, np.inexact):
+        c = c.astype(np.float64)
+    c_laplacian = np.empty_like(c) if out is None else out
+    neighbours, twice_c = (np.empty_like(c), np.empty_like(c)) if scratch is None else scratch
+    np.multiply(c, 2, out=twice_c)
 
+     #to simulate a periodic structure of unit cell equal to the simulated microstructure, for edge elements,
+     #use the element at the other edge of the supercell to compute the difference,
+     #as if the supercell was closed with opposite edges connected (or, for neumann boundary conditions,
+     #use the edge element itself, as if the supercell was closed by mirrors)
+    for n, d in enumerate(spacings):
+        #Reconstruct formula for symmetric second derivative along axis -n-1
+        term = c_laplacian if n == 0 else neighbours
+        _sum_neighbours(c, c.ndim-1-n, term, boundary)
+        term -= twice_c
+        term /= d*d
+        if n > 0:
+            c_laplacian += term
 
-    return c_laplacian
\ No newline at end of file
+    return c_laplacian
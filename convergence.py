@@ -0,0 +1,116 @@
+import numpy as np
+
+#criteria of the ConvergenceMonitor, in the order in which they are checked
+CRITERIA = ('free_energy', 'max_dc', 'chem_potential')
+
+#description of the quantity measured by each criterion, used in the messages
+DESCRIPTIONS = {'free_energy': 'relative change of the free energy per step',
+                'max_dc': 'maximum concentration change per step',
+                'chem_potential': 'change of the average chemical potential per step'}
+
+
+class ConvergenceMonitor:
+    """This class decides when a simulation can stop before performing all its time steps, because the grid stopped
+    changing (e.g. the noise of a concentration outside the spinodal region decayed) or the coarsening stalled.
+    Every check_every steps it measures, since the previous check and per time step:
+    - free_energy: the relative change of the free energy
+    - max_dc: the maximum absolute change of the concentration of a subcell
+    - chem_potential: the absolute change of the average chemical potential
+    A criterion is met when its measure stays below its tolerance for patience consecutive checks; the first
+    criterion met gives the stop reason. A tolerance of 0. disables the criterion. For a batch of microstructures,
+    the largest measure among the microstructures is used, so that all of them must be converged.
+
+    Parameters:
+    check_every: int, >=1
+            number of time steps between two checks
+    tolerances: dict
+            tolerance of each criterion (criteria not given are disabled)
+    patience: dict or int
+            number of consecutive checks below tolerance needed by each criterion (the same for all if int)
+
+    Raise:
+        ValueError if check_every or a patience are not >=1, or a tolerance is <0."""
+
+    def __init__(self, check_every=10, tolerances=None, patience=5):
+        tolerances = {} if tolerances is None else tolerances
+        patience = patience if isinstance(patience, dict) else {name: patience for name in CRITERIA}
+        if check_every < 1:
+            raise ValueError('convergence_check_every must be an integer >=1, check the config.txt file description')
+        for name in CRITERIA:
+            if tolerances.get(name, 0.) < 0.:
+                raise ValueError('The tolerance of '+name+' must be >=0., check the config.txt file description')
+            if patience.get(name, 1) < 1:
+                raise ValueError('The patience of '+name+' must be an integer >=1, check the config.txt file description')
+        self.check_every = check_every
+        self.tolerances = {name: float(tolerances.get(name, 0.)) for name in CRITERIA}
+        self.patience = {name: int(patience.get(name, 1)) for name in CRITERIA}
+        self.counts = {name: 0 for name in CRITERIA}
+        self.measures = {}
+        self._previous = None
+
+    @property
+    def enabled(self):
+        """True if at least one criterion has a positive tolerance"""
+        return any(tolerance > 0. for tolerance in self.tolerances.values())
+
+    def due(self, step):
+        """This method returns True if the convergence must be checked at the given step"""
+        return step % self.check_every == 0
+
+    def update(self, step, c, diagnostics):
+        """This method measures the change of the grid and of its diagnostics since the previous check
+
+        Parameters:
+        step: int
+              current step index
+        c: array of floats
+              current concentration grid
+        diagnostics: dict
+              diagnostics of the current grid (see Simulation.diagnostics())
+
+        Returns:
+        reason: str or None
+              name of the first criterion met, None if the simulation must go on"""
+
+        free_energy = np.asarray(diagnostics['free_energy'], dtype=np.float64)
+        chem_potential = np.asarray(diagnostics['average_chemical_potential'], dtype=np.float64)
+        previous, self._previous = self._previous, (step, np.array(c, copy=True), free_energy, chem_potential)
+        if previous is None or step <= previous[0]:
+            return None
+        previous_step, previous_c, previous_free_energy, previous_chem_potential = previous
+        n_steps = step - previous_step
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relative_change = np.abs(free_energy - previous_free_energy)/np.abs(previous_free_energy)
+        self.measures = {'free_energy': float(np.max(np.nan_to_num(relative_change, nan=0., posinf=np.inf)))/n_steps,
+                         'max_dc': float(np.max(np.abs(np.asarray(c) - previous_c)))/n_steps,
+                         'chem_potential': float(np.max(np.abs(chem_potential - previous_chem_potential)))/n_steps}
+        reason = None
+        for name in CRITERIA:
+            if self.tolerances[name] <= 0.:
+                continue
+            self.counts[name] = self.counts[name] + 1 if self.measures[name] < self.tolerances[name] else 0
+            if reason is None and self.counts[name] >= self.patience[name]:
+                reason = name
+        return reason
+
+    def describe(self, reason):
+        """This method returns a sentence explaining why the criterion reason was met"""
+        return '{} below {} for {} consecutive checks, every {} steps'.format(
+               DESCRIPTIONS[reason], self.tolerances[reason], self.patience[reason], self.check_every)
+
+    def state(self):
+        """This method returns the state of the monitor as a dict of arrays, to be stored in a checkpoint"""
+        if self._previous is None:
+            return {'convergence_counts': np.array([self.counts[name] for name in CRITERIA])}
+        step, c, free_energy, chem_potential = self._previous
+        return {'convergence_counts': np.array([self.counts[name] for name in CRITERIA]),
+                'convergence_step': step, 'convergence_c': c,
+                'convergence_free_energy': free_energy, 'convergence_chem_potential': chem_potential}
+
+    def restore(self, state):
+        """This method restores the state returned by state(), e.g. when restarting from a checkpoint"""
+        self.counts = dict(zip(CRITERIA, (int(count) for count in state['convergence_counts'])))
+        self._previous = None
+        if 'convergence_step' in state:
+            self._previous = (int(state['convergence_step']), np.array(state['convergence_c']),
+                              np.asarray(state['convergence_free_energy']), np.asarray(state['convergence_chem_potential']))
@@ -0,0 +1,86 @@
+import numpy as np
+try:
+    import scipy.fft as sfft
+except ImportError:   #the NumPy implementation below is used instead
+    sfft = None
+
+
+def _along(a, axis, start, stop):
+    #slice [start, stop) of a along axis
+    index = [slice(None)]*a.ndim
+    index[axis] = slice(start, stop)
+    return a[tuple(index)]
+
+
+def _phase(n, axis, ndim, sign, dtype):
+    #factors exp(sign*i*pi*m/(2n)) of the wave numbers m = 0, ..., n, shaped to broadcast along axis
+    shape = [1]*ndim
+    shape[axis] = n+1
+    return np.exp(sign*1j*np.pi*np.arange(n+1)/(2*n)).astype(dtype).reshape(shape)
+
+
+def _dct(a, axis):
+    #type II DCT along axis, as the FFT of the grid extended with its mirror image (period 2n)
+    n = a.shape[axis]
+    a_hat = np.fft.rfft(np.concatenate((a, np.flip(a, axis=axis)), axis=axis), axis=axis)
+    a_hat *= _phase(n, axis, a.ndim, -1, a_hat.dtype)
+    return _along(a_hat, axis, 0, n).real
+
+
+def _idct(a_hat, axis):
+    #inverse of _dct() along axis: the spectrum of the mirrored grid is rebuilt (its component n is 0)
+    #and transformed back, keeping the first n elements
+    n = a_hat.shape[axis]
+    pad = [(0, 0)]*a_hat.ndim
+    pad[axis] = (0, 1)
+    spectrum = np.pad(a_hat, pad).astype(np.result_type(a_hat.dtype, np.complex64))
+    spectrum *= _phase(n, axis, a_hat.ndim, 1, spectrum.dtype)
+    return _along(np.fft.irfft(spectrum, n=2*n, axis=axis), axis, 0, n)
+
+
+def dctn(a, axes):
+    """This function computes the type II discrete cosine transform of a over the given axes,
+    with the unnormalized convention of scipy.fft.dctn:
+    a_hat[m] = 2*sum_j a[j]*cos(pi*m*(2j+1)/(2n)) along each axis of n elements.
+    The cosines are the eigenvectors of the discrete laplacian with neumann (mirrored edges) boundary conditions,
+    as the complex exponentials of the FFT are for periodic ones. scipy.fft is used if available, otherwise
+    the transform is computed along each axis with the NumPy FFT of the grid extended with its mirror image.
+
+    Parameters:
+    a: array of floats
+       input array (float32 arrays are transformed in single precision)
+    axes: tuple of ints
+       axes over which the transform is computed
+
+    Returns:
+    a_hat: array of floats of the same shape of a
+       cosine transform of a"""
+
+    a = np.asarray(a)
+    if sfft is not None:
+        return sfft.dctn(a, type=2, axes=axes)
+    for axis in axes:
+        a = _dct(a, axis)
+    return a
+
+
+def idctn(a_hat, axes):
+    """This function computes the inverse of dctn() over the given axes, i.e. idctn(dctn(a, axes), axes) = a,
+    with scipy.fft.idctn if available, otherwise with the NumPy FFT
+
+    Parameters:
+    a_hat: array of floats
+       cosine transform
+    axes: tuple of ints
+       axes over which the inverse transform is computed
+
+    Returns:
+    a: array of floats of the same shape of a_hat
+       array whose cosine transform is a_hat"""
+
+    a_hat = np.asarray(a_hat)
+    if sfft is not None:
+        return sfft.idctn(a_hat, type=2, axes=axes)
+    for axis in axes:
+        a_hat = _idct(a_hat, axis)
+    return a_hat
@@ -1,40 +1,54 @@
 import numpy as np
 from numpy.random import rand
 
-def create_initial_config(N, c_0, c_noise):
-    """This method generates a 2D supercell of dimensions N*N, formed by subcells of composition
-    given by c_0 plus a random fluctuation.
+def create_initial_config(N, c_0, c_noise, dtype=np.float64, dimensions=2):
+    """This method generates a 2D supercell of dimensions N*N (or a 3D supercell of dimensions N*N*N),
+    formed by subcells of composition given by c_0 plus a random fluctuation. Rectangular supercells
+    (e.g. thin films or channels) are generated giving their shape instead of N.
        
     Parameters:
-        N : int
-             number of cells in x and y direction, must be at least =2.
+        N : int, or tuple of ints
+             number of cells in x and y direction, must be at least =2; or shape (Ny, Nx) of a rectangular
+             supercell ((Nz, Ny, Nx) in 3D), in which case dimensions is given by the length of the shape
         c_0: float
              unperturbed concentration
         c_noise: float
              concentration fluctuation 
+        dtype: numpy floating point type
+             precision of the grid (default np.float64); the random values are always drawn in double precision,
+             so that the same seed gives the same grid, rounded to the chosen precision
+        dimensions: int, 2 or 3
+             number of dimensions of the supercell (default 2)
     
     Returns:
-        initState: N-by-N 2D array
+        initState: N-by-N 2D array (N-by-N-by-N 3D array for dimensions=3, array of the given shape if N is a tuple)
         The state of the initial configuration of the Nx*Ny supercell, represented by a grid of N columns and N rows. 
         
     Raise:
         ValueError if the supercell dimensions are less than 1 or not integer numers, if C_0 or c_noise 
-        are not in [0,1], or if any of the initialized subcells' concentration is not in [0,1]"""
+        are not in [0,1], if any of the initialized subcells' concentration is not in [0,1],
+        or if dtype is not a floating point type or dimensions is not 2 or 3"""
     
     #check validity of input parameters
-    if not isinstance(N, int):
+    shape = tuple(N) if isinstance(N, (tuple, list)) else (N,)*dimensions
+    if not all(isinstance(n, int) for n in shape):
         raise TypeError('Nx or Ny values must be integer numbers.')
-    if N < 2:
+    if min(shape) < 2:
         raise ValueError('Both dimensions of the lattice must be > 1.')
     if c_0 < 0 or c_0 > 1:
         raise ValueError('Unperturbed concentration must be in [0,1].')
     if c_noise < 0 or c_noise > 1:
         raise ValueError('Concentration fluctuation must be in [0,1].')
+    if len(shape) not in (2, 3):
+        raise ValueError('The supercell must have 2 or 3 dimensions.')
+    if not np.issubdtype(dtype, np.floating):
+        raise ValueError('The grid dtype must be a floating point type, check the config.txt file description')
     
     #create initial configuration with noise described by uniform distribution of mean value c_noise;
     #rand(d_0, d_1) returns array with d_0 rows and d_1 columns, 
-    #so to represent real space configuration with cartesian x and y axis, use d_0_Ny, d_1=Nx.
-    initState = c_0 + c_noise*(0.5-rand(N, N)) 
+    #so to represent real space configuration with cartesian x and y axis, use d_0_Ny, d_1=Nx
+    #(and d_0=Nz, d_1=Ny, d_2=Nx for a 3D supercell).
+    initState = c_0 + c_noise*(0.5-rand(*shape)) 
     
     #check validity of initial configuration
     initState_validity = np.logical_and(initState>=0, initState<=1)
@@ -42,4 +56,29 @@ def create_initial_config(N, c_0, c_noise):
     if not initState_validity.all():
         raise ValueError('Invalid combination of c_0 and c_noise: negative concentrations occurred')
     
-    return initState
\ No newline at end of file
+    return initState.astype(dtype, copy=False)
+
+
+def read_grid_shape(config):
+    """This function reads the shape of the concentration grid from the microstructure_settings section of the
+    configuration: Nx and Ny (and Nz for a 3D microstructure, i.e. if dz is given) number of cells along
+    each direction, each one defaulting to N
+
+    Parameters:
+    config: configparser.ConfigParser
+            simulation configuration
+
+    Returns:
+    shape: tuple of ints
+           (Ny, Nx), or (Nz, Ny, Nx) for a 3D microstructure"""
+
+    N = config.get('microstructure_settings', 'N', fallback=None)
+    #Nz is only needed by a 3D microstructure
+    names = ('Nz', 'Ny', 'Nx') if config.has_option('microstructure_settings', 'dz') else ('Ny', 'Nx')
+    shape = []
+    for name in names:
+        size = config.get('microstructure_settings', name, fallback=N)
+        if size is None:
+            raise ValueError(name+' (or N) must be given, check the config.txt file description')
+        shape.append(int(size))
+    return tuple(shape)
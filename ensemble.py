@@ -0,0 +1,102 @@
+import numpy as np
+import os
+from create_initial_config import create_initial_config
+
+#parameters that can be given a different value for each replica in the [ensemble] section
+REPLICA_PARAMETERS = ('c0', 'c_noise', 'A', 'M', 'grad_coeff', 'seed')
+
+
+def read_ensemble_settings(config, base_values):
+    """This function expands the [ensemble] section of the configuration file into one value per replica
+    for each of the REPLICA_PARAMETERS. Each parameter can be given in the section as a comma separated list
+    with either one value (shared by all replicas) or n_replicas values; parameters not given in the section
+    take the value in base_values for all replicas, except the seed: replica b gets seed base_values['seed']+b,
+    so that replicas are independent. If base_values['seed'] is None and no seed is given in the section,
+    replicas are not seeded.
+
+    Parameters:
+    config: configparser.ConfigParser
+            simulation configuration, with an [ensemble] section holding at least n_replicas
+    base_values: dict
+            value of each of the REPLICA_PARAMETERS in the single simulation settings
+
+    Returns:
+    n_replicas: int
+                number of replicas integrated together
+    replica_values: dict
+            1D array of n_replicas values for each of the REPLICA_PARAMETERS (None for unseeded replicas)
+
+    Raise:
+        ValueError if n_replicas is lower than 1, or if a list does not have 1 or n_replicas values"""
+
+    n_replicas = int(config.get('ensemble', 'n_replicas'))
+    if n_replicas < 1:
+        raise ValueError('n_replicas must be an integer >= 1, check the config.txt file description')
+
+    replica_values = {}
+    for name in REPLICA_PARAMETERS:
+        if config.has_option('ensemble', name):
+            values = [value.strip() for value in config.get('ensemble', name).split(',')]
+        elif name == 'seed':
+            seed = base_values['seed']
+            replica_values[name] = None if seed is None else seed + np.arange(n_replicas)
+            continue
+        else:
+            values = [base_values[name]]
+        if len(values) == 1:
+            values = values*n_replicas
+        if len(values) != n_replicas:
+            raise ValueError('Ensemble parameter '+name+' must have 1 or n_replicas values, check the config.txt file description')
+        dtype = int if name == 'seed' else float
+        replica_values[name] = np.array([dtype(value) for value in values])
+
+    return n_replicas, replica_values
+
+
+def per_replica(values, dimensions=2):
+    """This function reshapes a 1D array of B per-replica values to shape (B, 1, 1) ((B, 1, 1, 1) for 3 dimensions),
+    so that it broadcasts against a batch of concentration grids of shape (B, Ny, Nx) ((B, Nz, Ny, Nx))"""
+    return np.asarray(values).reshape((-1,)+(1,)*dimensions)
+
+
+def create_ensemble_initial_config(N, c_0_values, c_noise_values, seeds=None, dtype=np.float64, dimensions=2):
+    """This function generates the initial configurations of a batch of replicas with create_initial_config(),
+    seeding numpy random number generator with the seed of each replica before generating it.
+
+    Parameters:
+    N: int, or tuple of ints
+       number of cells in x and y direction, must be at least =2, or shape of a rectangular grid
+       (see create_initial_config())
+    c_0_values: 1D array of B floats
+       unperturbed concentration of each replica
+    c_noise_values: 1D array of B floats
+       concentration fluctuation of each replica
+    seeds: 1D array of B ints, or None
+       seed of each replica; if None, the random generator is not seeded
+    dtype: numpy floating point type
+       precision of the grids (default np.float64)
+    dimensions: int, 2 or 3
+       number of dimensions of the grids (default 2)
+
+    Returns:
+    initState: array of shape (B, N, N) (or (B, N, N, N) in 3D, (B,)+N for a rectangular grid)
+               initial concentration grids of the replicas"""
+
+    n_replicas = len(c_0_values)
+    if len(c_noise_values) != n_replicas or (seeds is not None and len(seeds) != n_replicas):
+        raise ValueError('All replica parameters must have the same number of values')
+
+    shape = tuple(N) if isinstance(N, (tuple, list)) else (N,)*dimensions
+    initState = np.empty((n_replicas,)+shape, dtype=dtype)
+    for b in range(n_replicas):
+        if seeds is not None:
+            np.random.seed(int(seeds[b]))
+        initState[b] = create_initial_config(N, float(c_0_values[b]), float(c_noise_values[b]), dtype, dimensions)
+    return initState
+
+
+def replica_datasave_path(path, replica):
+    """This function returns the path of the file storing the data of a single replica,
+    e.g. ./Data/average_parameters_r2.txt for ./Data/average_parameters.txt and replica 2"""
+    root, extension = os.path.splitext(path)
+    return root+'_r'+str(replica)+extension
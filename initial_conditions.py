@@ -0,0 +1,308 @@
+import numpy as np
+from snapshot_io import load_snapshots
+
+#noise models of the initial concentration grids built with numpy Generators
+NOISE_MODELS = ('uniform', 'gaussian', 'correlated')
+
+#approximate number of subcells of a tile: the grid is generated (and loaded) one tile of rows (of xy planes
+#in 3D) at a time, each tile with its own random stream, so that no full-grid temporary is needed
+TILE_ELEMENTS = 2**22
+
+#children of the seed sequence of a grid: the tile streams are spawned from the first one, the positions
+#of the nuclei are drawn from the second one
+NOISE_STREAMS, NUCLEI_STREAM = 0, 1
+
+
+def tile_rows(shape):
+    """This function returns the number of rows (xy planes for 3D grids) of the tiles of a grid of the given shape"""
+    return max(1, TILE_ELEMENTS//int(np.prod(shape[1:])))
+
+
+def _child(seed_sequence, index):
+    #child number index of seed_sequence, equal to the one returned by seed_sequence.spawn(), but without changing
+    #the number of children already spawned, so that the streams do not depend on previous calls
+    return np.random.SeedSequence(seed_sequence.entropy, spawn_key=tuple(seed_sequence.spawn_key)+(index,),
+                                  pool_size=seed_sequence.pool_size)
+
+
+def replica_seed_sequences(seed=None, n_replicas=1, replica_seeds=None):
+    """This function returns the seed sequences of the random streams of the replicas of an ensemble
+    (of a single simulation, for n_replicas=1): the independent children spawned by the seed sequence of seed,
+    or, if given, the seed sequences of the seeds of each replica
+
+    Parameters:
+    seed: int or None
+          seed of the simulation (None for a seed sequence drawn from the operating system entropy)
+    n_replicas: int
+          number of replicas
+    replica_seeds: 1D array of n_replicas ints, or None
+          seed of each replica
+
+    Returns:
+    seed_sequences: list of numpy.random.SeedSequence
+          seed sequence of each replica"""
+
+    if replica_seeds is not None:
+        return [np.random.SeedSequence(int(replica_seed)) for replica_seed in replica_seeds]
+    return np.random.SeedSequence(seed).spawn(n_replicas)
+
+
+def _correlate(c, c_0, c_noise, spacings, correlation_length):
+    #filter the white noise of c in Fourier space with exp(-|k|^2*correlation_length^2/2), normalize it to
+    #standard deviation c_noise around c_0 and write it back to c one tile at a time; the filter is applied
+    #one axis at a time, so that the FFT of the grid and the filtered grid are the only full-grid temporaries
+    grid_axes = tuple(range(c.ndim))
+    c_hat = np.fft.rfftn(c, axes=grid_axes)
+    for axis, d in zip(grid_axes, spacings[::-1]):
+        n = c.shape[axis]
+        k = 2*np.pi*(np.fft.rfftfreq(n, d) if axis == c.ndim-1 else np.fft.fftfreq(n, d))
+        shape = [1]*c.ndim
+        shape[axis] = len(k)
+        c_hat *= np.exp(-0.5*(k*correlation_length)**2).astype(c.dtype).reshape(shape)
+    #zero average noise
+    c_hat[(0,)*c.ndim] = 0.
+    field = np.fft.irfftn(c_hat, s=c.shape, axes=grid_axes)
+    del c_hat
+    rms = np.sqrt(np.vdot(field.ravel(), field.ravel())/field.size)
+    scale = c_noise/rms if rms > 0. else 0.
+    rows = tile_rows(c.shape)
+    for r0 in range(0, c.shape[0], rows):
+        tile = c[r0:r0+rows]
+        np.multiply(field[r0:r0+rows], scale, out=tile, casting='same_kind')
+        tile += c_0
+        np.clip(tile, 0, 1, out=tile)
+
+
+def add_nuclei(c, n_nuclei, radius, concentration, rng, spacings):
+    """This function places spherical nuclei (circular in 2D) of the given concentration centered at random subcells
+    of the grid, e.g. to start a nucleation and growth simulation; the nuclei crossing an edge continue at the opposite edge
+
+    Parameters:
+    c: 2D or 3D array of floats
+       concentration grid, modified in place (e.g. a numpy memory map)
+    n_nuclei: int, >=0
+       number of nuclei
+    radius: float, >0.
+       radius of the nuclei
+    concentration: float in [0,1]
+       concentration inside the nuclei
+    rng: numpy.random.Generator
+       random generator of the positions of the nuclei
+    spacings: tuple of floats
+       subcell dimensions (dx, dy) ((dx, dy, dz) in 3D)
+
+    Raise:
+        ValueError if n_nuclei is negative, radius is not positive or concentration is not in [0,1]"""
+
+    if n_nuclei < 0 or radius <= 0.:
+        raise ValueError('n_nuclei must be >=0 and nucleus_radius >0., check the config.txt file description')
+    if concentration < 0. or concentration > 1.:
+        raise ValueError('nucleus_concentration must be in [0,1], check the config.txt file description')
+    grid_spacings = spacings[::-1]
+    centers = rng.integers(0, c.shape, size=(n_nuclei, c.ndim))
+    for center in centers:
+        #box of subcells around the nucleus, and squared distance of each subcell from its center
+        indices, distance_squared = [], 0.
+        for axis, (n, d) in enumerate(zip(c.shape, grid_spacings)):
+            half_side = min(int(radius/d), n//2)
+            offsets = np.arange(-half_side, half_side+1)
+            shape = [1]*c.ndim
+            shape[axis] = len(offsets)
+            distance_squared = distance_squared + ((offsets*d)**2).reshape(shape)
+            indices.append((center[axis]+offsets) % n)
+        box_index = np.ix_(*indices)
+        box = c[box_index]
+        box[distance_squared <= radius*radius] = concentration
+        c[box_index] = box
+
+
+def generate_initial_config(shape, c_0, c_noise, noise='uniform', seed_sequence=None, dtype=np.float64, out=None,
+                            spacings=None, correlation_length=1.):
+    """This function generates an initial concentration grid c_0 plus a random fluctuation with numpy Generators.
+    The grid is filled one tile of rows (of xy planes in 3D, see tile_rows()) at a time, drawing each tile in the
+    precision of the grid from its own stream, spawned from seed_sequence: the grid only depends on the seed,
+    and huge grids can be written directly into a memory map without full-grid temporaries.
+    The noise models are:
+    - uniform: values uniformly distributed in [c_0 - c_noise/2, c_0 + c_noise/2], as create_initial_config()
+    - gaussian: gaussian white noise of standard deviation c_noise
+    - correlated: gaussian noise filtered in Fourier space by exp(-|k|^2*correlation_length^2/2), i.e. correlated
+      over about correlation_length, normalized to standard deviation c_noise (the FFT of the grid and the filtered
+      grid are computed in memory)
+    Gaussian and correlated values outside [0,1] are reassigned to 0 or 1, as done by the integrators.
+
+    Parameters:
+    shape: tuple of ints
+           shape (Ny, Nx) of the grid ((Nz, Ny, Nx) in 3D), all sizes must be at least =2
+    c_0: float in [0,1]
+           unperturbed concentration
+    c_noise: float in [0,1]
+           amplitude (uniform) or standard deviation (gaussian, correlated) of the fluctuation
+    noise: str
+           noise model, one of NOISE_MODELS
+    seed_sequence: numpy.random.SeedSequence or None
+           seed sequence of the grid (None for a seed sequence drawn from the operating system entropy)
+    dtype: numpy floating point type
+           precision of the grid (default np.float64)
+    out: array of the given shape and dtype, or None
+           array where the grid is written (e.g. a memory map opened with open_initial_config_memmap())
+    spacings: tuple of floats or None
+           subcell dimensions (dx, dy) ((dx, dy, dz) in 3D) for the correlated noise (default: 1. along each axis)
+    correlation_length: float, >0.
+           correlation length of the correlated noise
+
+    Returns:
+    c: array of the given shape and dtype
+       initial concentration grid (out, if given)
+
+    Raise:
+        ValueError if the shape, c_0, c_noise, noise, dtype or correlation_length are not valid, or if uniform noise
+        gives concentrations outside [0,1]"""
+
+    #check validity of input parameters
+    shape = tuple(int(n) for n in shape)
+    if len(shape) not in (2, 3) or min(shape) < 2:
+        raise ValueError('The grid must have 2 or 3 dimensions of at least 2 subcells, check the config.txt file description')
+    if c_0 < 0. or c_0 > 1. or c_noise < 0. or c_noise > 1.:
+        raise ValueError('c0 and c_noise must be in [0,1], check the config.txt file description')
+    if noise not in NOISE_MODELS:
+        raise ValueError('Unknown noise model '+repr(noise)+', valid options are: '+', '.join(NOISE_MODELS))
+    if noise == 'uniform' and (c_0 - 0.5*c_noise < 0. or c_0 + 0.5*c_noise > 1.):
+        raise ValueError('Invalid combination of c_0 and c_noise: negative concentrations occurred')
+    if noise == 'correlated' and correlation_length <= 0.:
+        raise ValueError('correlation_length must be >0., check the config.txt file description')
+    dtype = np.dtype(dtype if out is None else out.dtype)
+    if dtype not in (np.float32, np.float64):
+        raise ValueError('The grid dtype must be float32 or float64, check the config.txt file description')
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif np.shape(out) != shape:
+        raise ValueError('Output array of shape '+str(np.shape(out))+' does not match the grid shape '+str(shape))
+    seed_sequence = np.random.SeedSequence() if seed_sequence is None else seed_sequence
+    spacings = (1.,)*len(shape) if spacings is None else spacings
+
+    #fill the grid tile by tile, each tile with its own stream, transforming the random values in place
+    rows = tile_rows(shape)
+    for tile_index, r0 in enumerate(range(0, shape[0], rows)):
+        rng = np.random.default_rng(_child(_child(seed_sequence, NOISE_STREAMS), tile_index))
+        tile = out[r0:r0+rows]
+        if noise == 'uniform':
+            rng.random(tile.shape, dtype=dtype, out=tile)
+            tile *= -c_noise
+            tile += c_0 + 0.5*c_noise
+        else:
+            rng.standard_normal(tile.shape, dtype=dtype, out=tile)
+            if noise == 'gaussian':
+                tile *= c_noise
+                tile += c_0
+                np.clip(tile, 0, 1, out=tile)
+
+    if noise == 'correlated':
+        _correlate(out, c_0, c_noise, spacings, correlation_length)
+    return out
+
+
+def load_initial_config(path, shape, output_format='npy', frame=-1, dtype=np.float64, out=None):
+    """This function loads an initial concentration grid from a file: a .npy file holding the grid (output_format
+    'npy'), or a frame of the concentration grids stored by a previous simulation (output_format 'binary', 'text'
+    or 'compressed', see snapshot_io.load_snapshots()). The grid is copied one tile of rows at a time from the
+    memory mapped file.
+
+    Parameters:
+    path: str
+          path of the file
+    shape: tuple of ints
+          expected shape of the grid (for an ensemble, (B,)+grid shape; a single grid is then given to all the replicas)
+    output_format: str
+          'npy', 'binary', 'text' or 'compressed'
+    frame: int
+          index of the frame of a snapshot file (default: the last one)
+    dtype: numpy floating point type
+          precision of the grid (default np.float64)
+    out: array of the given shape and dtype, or None
+          array where the grid is written (e.g. a memory map opened with open_initial_config_memmap())
+
+    Returns:
+    c: array of the given shape and dtype
+       initial concentration grid (out, if given)
+
+    Raise:
+        ValueError if the stored grid has not the expected shape"""
+
+    if output_format == 'npy':
+        source = np.load(path, mmap_mode='r')
+    else:
+        times, frames = load_snapshots(path, output_format, dtype)
+        source = frames[frame]
+    shape = tuple(shape)
+    if np.shape(source) != shape and np.shape(source) != shape[1:]:
+        raise ValueError('The grid of shape '+str(np.shape(source))+' stored in '+path+' does not match the grid shape '+
+                         str(shape)+', check the config.txt file description')
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    #a single grid is copied to each replica of an ensemble
+    targets = [out] if np.shape(source) == shape else list(out)
+    for target in targets:
+        rows = tile_rows(target.shape)
+        for r0 in range(0, target.shape[0], rows):
+            target[r0:r0+rows] = source[r0:r0+rows]
+    return out
+
+
+def open_initial_config_memmap(path, shape, dtype=np.float64):
+    """This function creates a .npy file holding a grid of the given shape and dtype, and returns it as a
+    writable memory map, so that huge grids can be generated (and integrated in place) without holding them in memory"""
+    return np.lib.format.open_memmap(path, mode='w+', dtype=np.dtype(dtype), shape=tuple(shape))
+
+
+def configured_initial_config(config, shape, c_0_values, c_noise_values, seed_sequences, dtype, spacings, ensemble=False):
+    """This function builds the initial concentration grid described by the initial_conditions section of the
+    configuration: loaded from a file (path, with format and frame), or generated with generate_initial_config()
+    (noise model noise, correlation_length), with n_nuclei nuclei of radius nucleus_radius and concentration
+    nucleus_concentration added by add_nuclei(); if memmap_path is given, the grid is written to that .npy file.
+
+    Parameters:
+    config: configparser.ConfigParser
+            simulation configuration
+    shape: tuple of ints
+            shape of the grid of a microstructure
+    c_0_values, c_noise_values: 1D arrays of B floats
+            unperturbed concentration and fluctuation of each replica (a single one for a single simulation)
+    seed_sequences: list of B numpy.random.SeedSequence
+            seed sequence of each replica, see replica_seed_sequences()
+    dtype: numpy floating point type
+            precision of the grid
+    spacings: tuple of floats
+            subcell dimensions (dx, dy) ((dx, dy, dz) in 3D)
+    ensemble: bool
+            if True, the grids of the B replicas are returned as an array of shape (B,)+shape
+
+    Returns:
+    c: array of shape shape (or (B,)+shape for an ensemble)
+       initial concentration grid"""
+
+    n_replicas = len(c_0_values)
+    full_shape = (n_replicas,)+tuple(shape) if ensemble else tuple(shape)
+    memmap_path = config.get('initial_conditions', 'memmap_path', fallback=None)
+    out = None if memmap_path is None else open_initial_config_memmap(memmap_path, full_shape, dtype)
+
+    path = config.get('initial_conditions', 'path', fallback=None)
+    if path is not None:
+        c = load_initial_config(path, full_shape, config.get('initial_conditions', 'format', fallback='npy'),
+                                int(config.get('initial_conditions', 'frame', fallback='-1')), dtype, out)
+    else:
+        #the legacy noise, if nuclei or a memory map are requested, is replaced by the uniform one
+        noise = config.get('initial_conditions', 'noise', fallback='uniform')
+        noise = 'uniform' if noise == 'legacy' else noise
+        c = np.empty(full_shape, dtype=dtype) if out is None else out
+        for b in range(n_replicas):
+            generate_initial_config(shape, float(c_0_values[b]), float(c_noise_values[b]), noise, seed_sequences[b], dtype, c[b] if ensemble else c, spacings,
+                                    float(config.get('initial_conditions', 'correlation_length', fallback='1.')))
+
+    n_nuclei = int(config.get('initial_conditions', 'n_nuclei', fallback='0'))
+    if n_nuclei > 0:
+        for b in range(n_replicas):
+            #the positions of the nuclei are drawn from a stream independent of the noise of the tiles
+            rng = np.random.default_rng(_child(seed_sequences[b], NUCLEI_STREAM))
+            add_nuclei(c[b] if ensemble else c, n_nuclei, float(config.get('initial_conditions', 'nucleus_radius', fallback='2.')),
+                       float(config.get('initial_conditions', 'nucleus_concentration', fallback='1.')), rng, spacings)
+    return c
@@ -0,0 +1,76 @@
+import numpy as np
+
+
+def linear_output_steps(n_iterations, every):
+    """This function returns the time steps at which data are saved when saving once every `every` steps.
+    The initial (0) and the final (n_iterations) steps are always included.
+
+    Parameters:
+    n_iterations: int, not <0
+                  number of time steps of the simulation
+    every: int, >0
+           number of time steps between two consecutive outputs
+
+    Returns:
+    steps: sorted 1D array of ints
+           time step indices at which data are saved"""
+
+    if not isinstance(every, (int, np.integer)) or every < 1:
+        raise ValueError('Output cadence must be an integer >= 1, check the config.txt file description')
+    if n_iterations < 0:
+        raise ValueError('n_iterations cannot be negative, check the config.txt file description')
+
+    steps = np.arange(0, n_iterations+1, every)
+    if steps[-1] != n_iterations:
+        steps = np.append(steps, n_iterations)
+    return steps
+
+
+def log_output_steps(n_iterations, n_points):
+    """This function returns approximately n_points time steps logarithmically spaced between 1 and n_iterations,
+    plus the initial step 0. Steps that coincide after rounding to integers are counted once,
+    so fewer than n_points steps are returned when n_iterations is small.
+
+    Parameters:
+    n_iterations: int, not <0
+                  number of time steps of the simulation
+    n_points: int, >0
+              number of logarithmically spaced outputs
+
+    Returns:
+    steps: sorted 1D array of ints
+           time step indices at which data are saved"""
+
+    if not isinstance(n_points, (int, np.integer)) or n_points < 1:
+        raise ValueError('Number of output points must be an integer >= 1, check the config.txt file description')
+    if n_iterations < 0:
+        raise ValueError('n_iterations cannot be negative, check the config.txt file description')
+    if n_iterations == 0:
+        return np.array([0])
+
+    steps = np.rint(np.geomspace(1, n_iterations, n_points)).astype(int)
+    return np.unique(np.concatenate([[0], steps]))
+
+
+def output_steps(n_iterations, every, schedule='linear', n_points=100):
+    """This function returns the time steps at which data are saved, according to the chosen schedule
+
+    Parameters:
+    n_iterations: int, not <0
+                  number of time steps of the simulation
+    every: int, >0
+           number of time steps between two outputs, used by the linear schedule
+    schedule: str
+              either 'linear' (once every `every` steps) or 'log' (logarithmically spaced steps)
+    n_points: int, >0
+              number of outputs, used by the log schedule
+
+    Returns:
+    steps: sorted 1D array of ints
+           time step indices at which data are saved"""
+
+    if schedule == 'linear':
+        return linear_output_steps(n_iterations, every)
+    if schedule == 'log':
+        return log_output_steps(n_iterations, n_points)
+    raise ValueError('Unknown output schedule '+repr(schedule)+', valid options are: linear, log')
@@ -0,0 +1,264 @@
+import numpy as np
+import multiprocessing as mp
+import os
+import queue
+from multiprocessing import shared_memory
+from threading import BrokenBarrierError
+from chemical_potential_free_energy import parameter_as_dtype
+from concentration_laplacian import check_boundary, boundary_indices, concentration_laplacian
+from stencil_workspace import CahnHilliardWorkspace
+
+#number of rows of the neighbouring strips needed to update a strip: the explicit step applies
+#two laplacians (5-point stencils), so each cell depends on the cells up to 2 rows away
+HALO = 2
+#seconds between two checks that the worker processes are alive, while waiting for the end of their steps
+POLL_INTERVAL = 0.1
+#seconds waited for each worker process to stop when the engine is closed, before terminating it
+JOIN_TIMEOUT = 5.
+
+
+def _row_runs(rows):
+    """This function splits the rows of a strip plus halos (see boundary_indices()) in runs of consecutive rows
+    of the grid, increasing or decreasing (the mirrored halos of neumann boundary conditions), and returns
+    them as pairs of slices (rows of the block, rows of the grid), so that the block is filled by copying
+    basic slices of the grid"""
+    runs = []
+    start = 0
+    for end in range(1, len(rows)+1):
+        if end == len(rows) or abs(rows[end]-rows[end-1]) != 1 or (end-start > 1 and rows[end]-rows[end-1] != rows[start+1]-rows[start]):
+            first, last = int(rows[start]), int(rows[end-1])
+            if last >= first:
+                source = slice(first, last+1)
+            else:
+                source = slice(first, last-1 if last > 0 else None, -1)
+            runs.append((slice(start, end), source))
+            start = end
+    return runs
+
+
+class _ExplicitStripStep:
+    """This class performs the explicit step of Cahn_Hilliard_equation_integration() on a block of rows
+    with preallocated buffers, with exactly the same operations, so that the rows of the strip get
+    the values of the serial step"""
+
+    def __init__(self, shape, dtype, A, k, dx, dy, M, dt, dz, boundary):
+        self.buffers = [np.empty(shape, dtype=dtype) for i in range(5)]
+        self.A, self.k = parameter_as_dtype(A, dtype), parameter_as_dtype(k, dtype)
+        self.dtM = parameter_as_dtype(dt, dtype)*parameter_as_dtype(M, dtype)
+        self.dx, self.dy, self.dz, self.boundary = dx, dy, dz, boundary
+
+    def step(self, block):
+        chem_potential, laplacian, scratch, neighbours, twice_c = self.buffers
+        #chemical potential (c*-2 + 1)*((1-c)*c)*(2*A), as chemical_potential()
+        np.multiply(block, -2, out=chem_potential)
+        chem_potential += 1
+        np.subtract(1, block, out=scratch)
+        scratch *= block
+        chem_potential *= scratch
+        chem_potential *= 2*self.A
+        #c + dt*M*lap(mu - 2k*lap(c))
+        concentration_laplacian(block, self.dx, self.dy, self.dz, self.boundary, laplacian, (neighbours, twice_c))
+        laplacian *= 2*self.k
+        chem_potential -= laplacian
+        concentration_laplacian(chem_potential, self.dx, self.dy, self.dz, self.boundary, laplacian, (neighbours, twice_c))
+        laplacian *= self.dtM
+        np.add(block, laplacian, out=block)
+        np.clip(block, 0, 1, out=block)
+        return block
+
+
+def _worker_loop(buffer_names, shape, dtype, r0, r1, parameters, inplace, barrier, task_queue, done_queue):
+    """This function is run by each worker process of the ParallelStepEngine: it waits for the number of steps
+    to perform and, at each step, updates the rows [r0, r1) of the grid reading the current buffer and writing
+    the next one. The rows of the strip and of the neighbouring strips needed by the stencils (halo) are copied,
+    as basic slices, from the shared buffer in a block of rows allocated once, which replaces the explicit exchange
+    of halos between workers; the block is updated in place (by a CahnHilliardWorkspace for the in place
+    integrator) and its strip rows are copied to the next buffer. All the workers wait at the barrier before
+    starting the next step, so that the halos are always up to date."""
+
+    shms = [shared_memory.SharedMemory(name=name) for name in buffer_names]
+    buffers = [np.ndarray(shape, dtype=dtype, buffer=shm.buf) for shm in shms]
+    A, k, dx, dy, M, dt, dz, boundary = parameters
+    Ny = shape[0]
+    #rows (xy planes for a 3D grid) of the strip plus halos, with periodic boundary conditions
+    #(or mirrored at the edges of the grid, for neumann boundary conditions)
+    runs = _row_runs(boundary_indices(np.arange(r0-HALO, r1+HALO), Ny, boundary))
+    block = np.empty((r1-r0+2*HALO,)+tuple(shape[1:]), dtype=dtype)
+    #the boundary conditions applied to the block edges only affect halo rows, which are discarded:
+    #the strip rows are computed with exactly the same operations of the serial step
+    if inplace:
+        workspace = CahnHilliardWorkspace(block.shape, dx, dy, dtype=dtype, dz=dz, boundary=boundary)
+        update = lambda block: workspace.step(block, A, k, M, dt)
+    else:
+        update = _ExplicitStripStep(block.shape, dtype, A, k, dx, dy, M, dt, dz, boundary).step
+
+    try:
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+            n_steps, source = task
+            try:
+                for step in range(n_steps):
+                    for block_rows, grid_rows in runs:
+                        block[block_rows] = buffers[source][grid_rows]
+                    update(block)
+                    buffers[1-source][r0:r1] = block[HALO:HALO+r1-r0]
+                    barrier.wait()
+                    source = 1-source
+                done_queue.put(None)
+            except BrokenBarrierError:
+                done_queue.put('aborted because another worker failed')
+            except Exception as error:
+                barrier.abort()
+                done_queue.put(repr(error))
+    finally:
+        del buffers
+        for shm in shms:
+            shm.close()
+
+
+class ParallelStepEngine:
+    """This class performs the explicit time integration of the Cahn-Hilliard equation on a pool of persistent
+    worker processes. The periodic grid is split into horizontal strips, one per worker, held in two
+    multiprocessing.shared_memory buffers (current and next grid). At each step every worker updates its strip
+    reading a 2-rows halo from the neighbouring strips; since each strip is computed with the same operations of
+    Cahn_Hilliard_equation_integration() (of Cahn_Hilliard_inplace_integration(), for inplace=True), the result
+    is bit-for-bit identical to the serial integration. The workers only allocate their buffers once, and
+    perform any number of steps per request, synchronizing at a barrier, so that the communication with the
+    main process is paid once per request and not once per step.
+    A 3D grid is split in the same way into slabs of xy planes along z.
+
+    Parameters:
+    c: Ny-by-Nx 2D array of floats (Nz-by-Ny-by-Nx 3D array for a 3D microstructure)
+       initial concentration grid
+    A: float, not <0.
+       multiplicative constant of chemical potential
+    k: float, not <0.
+       gradient coefficient
+    dx, dy: floats, not <0. nor = 0.
+           dimensions in x and y direction of a concentration subcell
+    M: float, not <0.
+       mobility of the concentration's particles
+    dt: float, not <0.
+        time step for time integration
+    n_workers: int or None
+        number of worker processes (default: number of CPUs), reduced if the grid has fewer rows
+    dz: float or None
+        dimension in z direction of a concentration subcell, None (default) for a 2D microstructure
+    boundary: str
+        boundary conditions, 'periodic' (default) or 'neumann'
+    inplace: bool
+        if True, the strips are updated with the operations of the in place integrator (explicit_inplace),
+        otherwise with the ones of the explicit integrator (default)"""
+
+    def __init__(self, c, A, k, dx, dy, M, dt, n_workers=None, dz=None, boundary='periodic', inplace=False):
+
+        #check validity of input parameters (validity of the parameters is also checked by the serial step)
+        c = np.asarray(c)
+        if not np.issubdtype(c.dtype, np.floating):
+            c = c.astype(np.float64)
+        if np.ndim(c) != (2 if dz is None else 3):
+            raise ValueError('ParallelStepEngine only supports a single 2D (or 3D, with dz) concentration grid')
+        if M<0. or dt<0. or A<0. or k<0. or dx<=0. or dy<=0. or (dz is not None and dz<=0.):
+            raise ValueError('A, k, dx, dy, dz, M, dt parameters cannot be negative, check again the config.txt file description')
+        check_boundary(boundary)
+        if n_workers is None:
+            n_workers = os.cpu_count()
+        if n_workers < 1:
+            raise ValueError('The number of workers must be >= 1')
+        Ny = np.shape(c)[0]
+        n_workers = min(n_workers, Ny)
+
+        self.shape = np.shape(c)
+        self.n_workers = n_workers
+        self._source = 0
+        self._closed = False
+
+        #current and next grid in shared memory
+        self._shms = [shared_memory.SharedMemory(create=True, size=c.nbytes) for i in range(2)]
+        self._buffers = [np.ndarray(self.shape, dtype=c.dtype, buffer=shm.buf) for shm in self._shms]
+        self._buffers[0][...] = c
+
+        #split rows in strips and start one persistent worker per strip
+        bounds = np.linspace(0, Ny, n_workers+1).astype(int)
+        context = mp.get_context()
+        barrier = context.Barrier(n_workers)
+        self._barrier = barrier
+        self._done_queue = context.Queue()
+        self._task_queues = []
+        self._workers = []
+        for w in range(n_workers):
+            task_queue = context.Queue()
+            worker = context.Process(target=_worker_loop, daemon=True,
+                                     args=([shm.name for shm in self._shms], self.shape, c.dtype,
+                                           int(bounds[w]), int(bounds[w+1]), (A, k, dx, dy, M, dt, dz, boundary),
+                                           inplace, barrier, task_queue, self._done_queue))
+            worker.start()
+            self._task_queues.append(task_queue)
+            self._workers.append(worker)
+
+    @property
+    def c(self):
+        """Copy of the current concentration grid"""
+        return self._buffers[self._source].copy()
+
+    def step(self, n_steps=1):
+        """This method performs n_steps time integration steps on the worker processes
+
+        Parameters:
+        n_steps: int, >0
+                 number of time steps to perform
+
+        Returns:
+        c: array of the shape of the grid
+           copy of the updated concentration grid
+
+        Raise:
+            RuntimeError if any of the workers failed or exited (e.g. killed by a signal)"""
+
+        if self._closed:
+            raise RuntimeError('ParallelStepEngine has been closed')
+        for task_queue in self._task_queues:
+            task_queue.put((n_steps, self._source))
+        errors = []
+        while len(errors) < len(self._workers):
+            try:
+                errors.append(self._done_queue.get(timeout=POLL_INTERVAL))
+            except queue.Empty:
+                #a dead worker never reaches the barrier: the other workers are released and the run is aborted
+                dead = [(w, worker.exitcode) for w, worker in enumerate(self._workers) if not worker.is_alive()]
+                if dead:
+                    self._barrier.abort()
+                    self.close()
+                    raise RuntimeError('Parallel time integration failed: '+
+                                       ', '.join('worker {} exited with code {}'.format(w, code) for w, code in dead))
+        errors = [error for error in errors if error is not None]
+        if errors:
+            self.close()
+            raise RuntimeError('Parallel time integration failed: '+'; '.join(errors))
+        self._source = (self._source + n_steps) % 2
+        return self.c
+
+    def close(self):
+        """This method stops the worker processes and releases the shared memory"""
+        if self._closed:
+            return
+        self._closed = True
+        for task_queue in self._task_queues:
+            task_queue.put(None)
+        for worker in self._workers:
+            worker.join(JOIN_TIMEOUT)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        del self._buffers
+        for shm in self._shms:
+            shm.close()
+            shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
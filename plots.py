@@ -5,6 +5,9 @@ import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 import time as time
+from snapshot_io import load_snapshots
+from ensemble import replica_datasave_path
+from render_frames import render_animation, downsample_grid, frame_indices, configured_slice_index
 
 "-----------------------------------IMPORT IMAGES PATHS------------------------------------------"
 #Import configuration parameters from simulation_configuration.txt file
@@ -20,24 +23,42 @@ other_variables_pic = config.get('image_paths', 'other_variables_pic')
 # Data files paths
 c_grid_datasave = config.get('data_paths', 'c_config_datasave')
 aver_quantities_datasave = config.get('data_paths', 'aver_quantities_datasave')
+output_format = config.get('data_paths', 'output_format', fallback='binary')
+snapshot_dtype = config.get('data_paths', 'snapshot_dtype', fallback=config.get('time_settings', 'dtype', fallback='float64'))
+
+# Rendering of the animation: one stored frame every frame_stride, grids downsampled by averaging blocks
+# of downsample-by-downsample subcells, optionally rendered in parallel on a pool of processes
+parallel_rendering = config.getboolean('rendering', 'parallel', fallback=False)
+render_workers = int(config.get('rendering', 'n_workers', fallback='0'))
+frame_stride = int(config.get('rendering', 'frame_stride', fallback='5'))
+downsample = int(config.get('rendering', 'downsample', fallback='1'))
+fps = float(config.get('rendering', 'fps', fallback='20'))
+
+# Replica to be plotted, for ensemble simulations
+ensemble_option = config.getboolean('ensemble', 'enabled', fallback=False)
+if ensemble_option:
+    plot_replica = int(config.get('ensemble', 'plot_replica', fallback='0'))
+    aver_quantities_datasave = replica_datasave_path(aver_quantities_datasave, plot_replica)
+
+# Plane plotted for 3D microstructures: the xy plane at z = slice_index (None for 2D microstructures)
+slice_index = configured_slice_index(config)
 
 "---------------------------------IMPORT DATA FROM FILES-----------------------------------------"
-#Read concentration data from file
-concentration_evolution = np.loadtxt(c_grid_datasave, skiprows=1)
-
-#Separate time indicator
-t_concentration = concentration_evolution[:, 0]
-
-#Retrieve information on number of time steps and concentration grid shape
-n_iterations, N = np.shape(concentration_evolution)       
-
-#Remember that N = Nx*Ny + 1, with Ny = Nx; compute Nx
-Nx = int(np.sqrt(N - 1))
-#Re-arranger concentration values in grid format
-c = concentration_evolution[:,1:N].reshape(n_iterations,Nx,Nx)
+#Open concentration data file for streaming: frames are memory mapped (binary format) or read on demand
+#(text and compressed formats), so that only the frames used in the plots are read from disk,
+#one at a time, and memory usage does not grow with the number of stored frames
+#(for 3D grids, only the plotted xy plane of each frame is read from the memory map)
+t_concentration, c = load_snapshots(c_grid_datasave, output_format, np.dtype(snapshot_dtype))
+frame_index = tuple(index for index in (plot_replica if ensemble_option else None, slice_index) if index is not None)
+if frame_index:
+    c = c[(slice(None),)+frame_index]
+
+#Retrieve information on number of time steps
+n_iterations = len(t_concentration)
 
 #Read average quantities data from file
-t_average, average_c, average_chem_potential, free_energy = np.loadtxt(aver_quantities_datasave, skiprows=1, unpack=True)
+t_average, average_c, average_chem_potential, free_energy = np.loadtxt(aver_quantities_datasave, skiprows=1, unpack=True,
+                                                                      usecols=(0, 1, 2, 3))
 
 "--------------------------------------PLOT CONCENTRATION DATA-------------------------------------------------"
 #Create figure and subplot
@@ -47,7 +68,7 @@ ax1 = fig.add_subplot(111)
 #Set figure title
 fig.suptitle('Spinodal decomposition', fontsize=16)
 #Plot initial concentration grid on a 2D regular raster
-im = ax1.imshow(c[0], cmap='bwr', interpolation=None)
+im = ax1.imshow(downsample_grid(c[0], downsample), cmap='bwr', interpolation=None)
 
 # create an Axes on the right side of ax. The width of cax will be 5%
 # of ax and the padding between cax and ax will be fixed at 0.05 inch.
@@ -67,16 +88,27 @@ plt.savefig(initial_c_grid_pic)
 #Define function containing operations to be performed during the animation
 def animate(i):
     #Update graph with next concentration grid in the timeline
-    im.set_data(c[i])
+    im.set_data(downsample_grid(c[i], downsample))
     #Update concentration plot title
     ax1.set_title("Concentration grid: t = "+"{:.2f}".format(t_concentration[i])+" arb.units")
     return im, ax1
 
-#Perform animation: plot one simulated configuration every 5, 
-# with a 1 ms pause between each frame
-anim = animation.FuncAnimation(fig, animate, frames=range(0,n_iterations,5), interval=1, repeat=False)
-#Save the animation
-anim.save(c_grid_evolution_anim)
+if parallel_rendering:
+    #Render the frames of the animation on a pool of processes (all the CPUs if n_workers is 0),
+    #each drawing its frames independently with the same layout, then assemble the .gif or .mp4 file
+    ensemble_replica = plot_replica if ensemble_option else None
+    render_animation(c_grid_datasave, output_format, c_grid_evolution_anim, frame_stride, downsample,
+                     ensemble_replica, render_workers if render_workers > 0 else None, fps, slice_index=slice_index)
+    #Show the last frame of the animation, as at the end of the serial animation
+    animate(frame_indices(n_iterations, frame_stride)[-1])
+else:
+    #Perform animation: plot one simulated configuration every frame_stride (default 5),
+    # with a 1 ms pause between each frame. Frames are read and rendered one at a time while the animation
+    # is saved, without caching their data
+    anim = animation.FuncAnimation(fig, animate, frames=range(0,n_iterations,frame_stride), interval=1, repeat=False,
+                                   cache_frame_data=False)
+    #Save the animation
+    anim.save(c_grid_evolution_anim)
 
 #Save final concentration grid
 plt.savefig(final_c_grid_pic)
@@ -0,0 +1,152 @@
+import numpy as np
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+try:
+    import resource
+except ImportError:   #not available on Windows
+    resource = None
+
+
+def peak_resident_memory():
+    """This function returns the peak resident memory of the process in bytes, or None if it cannot be measured"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #ru_maxrss is in bytes on macOS and in kilobytes on the other systems
+    return int(peak if sys.platform == 'darwin' else peak*1024)
+
+
+class PhaseProfiler:
+    """This class records the wall time spent in each phase of the simulation loop (e.g. integration, diagnostics,
+    string formatting, file writes), both cumulative and for each time step, together with the bytes written
+    and the peak memory. Phases are timed with the phase() context manager; end_step() closes a time step.
+    Functions added with add_hook() are called at each phase boundary with ('start', name) or ('end', name),
+    so that external profilers can mark the same phases in their own timelines.
+    When the profiler is disabled, phase() returns an empty context and nothing is recorded.
+
+    Parameters:
+    enabled: bool
+             if False, the profiler does not record anything
+    trace_memory: bool
+             if True, the peak memory allocated by python and numpy is also traced with tracemalloc
+             (more accurate than the peak resident memory, but it slows down the allocations)"""
+
+    def __init__(self, enabled=True, trace_memory=False):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.cumulative = {}
+        self.calls = {}
+        self.step_times = {}
+        self.bytes_written = {}
+        self.n_steps = 0
+        self._hooks = []
+        self._current_step = {}
+        self._start_time = None
+        self._wall_time = 0.
+        self._null_context = nullcontext()
+
+    def add_hook(self, hook):
+        """This method adds a function hook(event, name), called with event 'start' or 'end' at each phase boundary"""
+        self._hooks.append(hook)
+
+    def start(self):
+        """This method starts the measurement of the wall time of the run (and the memory tracing, if requested)"""
+        if not self.enabled:
+            return
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._start_time = time.perf_counter()
+
+    def stop(self):
+        """This method stops the measurement of the wall time of the run"""
+        if not self.enabled or self._start_time is None:
+            return
+        self._wall_time += time.perf_counter() - self._start_time
+        self._start_time = None
+
+    def phase(self, name):
+        """This method returns a context manager timing the code executed inside it as phase name"""
+        if not self.enabled:
+            return self._null_context
+        return self._timed_phase(name)
+
+    @contextmanager
+    def _timed_phase(self, name):
+        for hook in self._hooks:
+            hook('start', name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.cumulative[name] = self.cumulative.get(name, 0.) + elapsed
+            self.calls[name] = self.calls.get(name, 0) + 1
+            self._current_step[name] = self._current_step.get(name, 0.) + elapsed
+            for hook in self._hooks:
+                hook('end', name)
+
+    def end_step(self):
+        """This method closes a time step, storing the time spent in each phase during the step"""
+        if not self.enabled:
+            return
+        for name in self.cumulative:
+            #phases that appear for the first time get zero time in the previous steps
+            times = self.step_times.setdefault(name, [0.]*self.n_steps)
+            times.append(self._current_step.get(name, 0.))
+        self._current_step = {}
+        self.n_steps += 1
+
+    def add_bytes(self, category, n_bytes):
+        """This method adds n_bytes to the bytes written to the files of the given category"""
+        if self.enabled:
+            self.bytes_written[category] = self.bytes_written.get(category, 0) + int(n_bytes)
+
+    def summary(self):
+        """This method returns the recorded figures
+
+        Returns:
+        summary: dict
+                 wall time, number of steps, steps per second, bytes written, peak memory and, for each phase,
+                 cumulative time, fraction of the wall time, number of calls and mean/max time per step"""
+
+        wall_time = self._wall_time
+        if self._start_time is not None:
+            wall_time += time.perf_counter() - self._start_time
+        phases = {}
+        for name, cumulative in sorted(self.cumulative.items(), key=lambda item: -item[1]):
+            step_times = np.array(self.step_times.get(name, [0.]))
+            phases[name] = {'cumulative': cumulative,
+                            'fraction': cumulative/wall_time if wall_time > 0. else 0.,
+                            'calls': self.calls[name],
+                            'mean_per_step': float(step_times.mean()),
+                            'max_per_step': float(step_times.max())}
+        return {'wall_time': wall_time,
+                'n_steps': self.n_steps,
+                'steps_per_second': self.n_steps/wall_time if wall_time > 0. else 0.,
+                'bytes_written': dict(self.bytes_written, total=sum(self.bytes_written.values())),
+                'peak_resident_memory': peak_resident_memory(),
+                'peak_traced_memory': tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None,
+                'phases': phases}
+
+    def print_summary(self, file=sys.stdout):
+        """This method prints to file a table with the recorded figures"""
+        summary = self.summary()
+        file.write('\n Profiling summary: {} steps in {:.3f} s ({:.1f} steps/s)\n'.format(
+                   summary['n_steps'], summary['wall_time'], summary['steps_per_second']))
+        file.write(' {:<20}{:>12}{:>9}{:>16}{:>16}\n'.format('phase', 'total [s]', '%', 'mean/step [s]', 'max/step [s]'))
+        for name, phase in summary['phases'].items():
+            file.write(' {:<20}{:>12.4f}{:>9.1f}{:>16.3e}{:>16.3e}\n'.format(
+                       name, phase['cumulative'], 100.*phase['fraction'], phase['mean_per_step'], phase['max_per_step']))
+        for category, n_bytes in summary['bytes_written'].items():
+            file.write(' bytes written ({}): {}\n'.format(category, n_bytes))
+        for key in ('peak_resident_memory', 'peak_traced_memory'):
+            if summary[key] is not None:
+                file.write(' {}: {:.1f} MiB\n'.format(key.replace('_', ' '), summary[key]/2**20))
+
+    def write_report(self, path):
+        """This method writes the recorded figures to a JSON file"""
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=1)
@@ -0,0 +1,248 @@
+import numpy as np
+import configparser as cp
+import argparse as ap
+import multiprocessing as mp
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from snapshot_io import load_snapshots
+from create_initial_config import read_grid_shape
+try:
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.axes_grid1 import make_axes_locatable
+except ImportError:   #only needed to render the frames
+    plt = None
+try:
+    from PIL import Image
+except ImportError:   #only needed to assemble GIF animations
+    Image = None
+
+#name pattern of the rendered frame images, numbered in the order of the animation
+FRAME_NAME = 'frame_{:06d}.png'
+
+#state of each rendering process: snapshots, color limits and the figure reused for all its frames
+_worker = {}
+
+
+def downsample_grid(c, factor):
+    """This function reduces the resolution of a concentration grid by averaging blocks of factor-by-factor
+    subcells (the last rows and columns not filling a whole block are discarded)
+
+    Parameters:
+    c: 2D array of floats
+       concentration grid
+    factor: int, >=1
+       side of the averaged blocks (1 returns the grid unchanged)
+
+    Returns:
+    downsampled: 2D array of floats
+       grid of shape (Ny//factor, Nx//factor)
+
+    Raise:
+        ValueError if factor is not a positive integer"""
+
+    if factor < 1:
+        raise ValueError('The downsampling factor must be an integer >=1, check the config.txt file description')
+    if factor == 1:
+        return c
+    Ny, Nx = (np.shape(c)[0]//factor)*factor, (np.shape(c)[1]//factor)*factor
+    return np.asarray(c)[:Ny, :Nx].reshape(Ny//factor, factor, Nx//factor, factor).mean(axis=(1, 3))
+
+
+def frame_indices(n_frames, stride=5):
+    """This function returns the indices of the stored frames shown in the animation: one every stride,
+    as in the animation of plots.py"""
+    if stride < 1:
+        raise ValueError('The frame stride must be an integer >=1, check the config.txt file description')
+    return list(range(0, n_frames, stride))
+
+
+def configured_slice_index(config):
+    """This function returns the index along z of the xy plane plotted for 3D microstructures, read from the
+    slice_index key of the rendering section of the configuration (default: the middle plane, Nz//2),
+    or None for 2D microstructures (configurations without dz)"""
+    if not config.has_option('microstructure_settings', 'dz'):
+        return None
+    middle_plane = read_grid_shape(config)[0]//2
+    return int(config.get('rendering', 'slice_index', fallback=str(middle_plane)))
+
+
+def _plotted_frames(c_grid_datasave, output_format, replica, slice_index):
+    #open the snapshots (memory mapped or read on demand), selecting the replica of an ensemble
+    #and the xy plane at z = slice_index of 3D grids
+    times, c = load_snapshots(c_grid_datasave, output_format)
+    frame_index = tuple(index for index in (replica, slice_index) if index is not None)
+    if frame_index:
+        c = c[(slice(None),)+frame_index]
+    return times, c
+
+
+def _init_worker(c_grid_datasave, output_format, replica, slice_index, color_limits, downsample, dpi):
+    #open the snapshots and build the figure once per rendering process, with the same layout of plots.py:
+    #the color scale is fixed by the initial grid, as in the animation
+    plt.switch_backend('Agg')
+    times, c = _plotted_frames(c_grid_datasave, output_format, replica, slice_index)
+    fig = plt.figure()
+    ax1 = fig.add_subplot(111)
+    fig.suptitle('Spinodal decomposition', fontsize=16)
+    im = ax1.imshow(downsample_grid(c[0], downsample), cmap='bwr', interpolation=None,
+                    vmin=color_limits[0], vmax=color_limits[1])
+    divider = make_axes_locatable(ax1)
+    cax = divider.append_axes("right", size="5%", pad=0.05)
+    plt.colorbar(im, cax)
+    _worker.update(times=times, c=c, fig=fig, ax1=ax1, im=im, downsample=downsample, dpi=dpi)
+
+
+def _render_frame(task):
+    #draw a stored frame in the figure of the process and save it as a numbered image
+    position, index, frame_path = task
+    _worker['im'].set_data(downsample_grid(_worker['c'][index], _worker['downsample']))
+    _worker['ax1'].set_title("Concentration grid: t = "+"{:.2f}".format(_worker['times'][index])+" arb.units")
+    _worker['fig'].savefig(frame_path, dpi=_worker['dpi'])
+    return position
+
+
+def render_frames(c_grid_datasave, output_format, frames_directory, stride=5, downsample=1, replica=None,
+                  n_workers=None, dpi=None, slice_index=None):
+    """This function renders the concentration grids shown in the animation of plots.py as numbered PNG images,
+    splitting the frames among a pool of processes. Each process opens the snapshot file for streaming and reuses
+    its own figure, with the colormap, colorbar and titles of plots.py; the color scale is fixed by the initial
+    grid, as in the animation. Frames are independent, so rendering scales with the number of processes.
+
+    Parameters:
+    c_grid_datasave: str
+            path of the file storing the concentration grids
+    output_format: str
+            format of the file, see snapshot_io.load_snapshots()
+    frames_directory: str
+            directory where the images frame_000000.png, frame_000001.png, ... are saved
+    stride: int, >=1
+            one stored frame every stride is rendered
+    downsample: int, >=1
+            side of the blocks of subcells averaged in a single pixel of the image (see downsample_grid())
+    replica: int or None
+            replica to be rendered, for ensemble simulations
+    n_workers: int or None
+            number of rendering processes (default: number of CPUs)
+    dpi: float or None
+            resolution of the images (default: the one of matplotlib)
+    slice_index: int or None
+            for 3D grids, index along z of the rendered xy plane
+
+    Returns:
+    frame_paths: list of str
+            paths of the rendered images, in the order of the animation
+
+    Raise:
+        ImportError if matplotlib is not available"""
+
+    if plt is None:
+        raise ImportError('matplotlib is needed to render the concentration grids')
+    times, c = _plotted_frames(c_grid_datasave, output_format, replica, slice_index)
+    first_frame = downsample_grid(c[0], downsample)
+    color_limits = (float(np.min(first_frame)), float(np.max(first_frame)))
+    indices = frame_indices(len(times), stride)
+    os.makedirs(frames_directory, exist_ok=True)
+    frame_paths = [os.path.join(frames_directory, FRAME_NAME.format(position)) for position in range(len(indices))]
+    tasks = list(zip(range(len(indices)), indices, frame_paths))
+
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    if n_workers < 1:
+        raise ValueError('The number of rendering processes must be >= 1, check the config.txt file description')
+    #chunks of consecutive frames, so that each process reads neighbouring frames (e.g. from the same chunk
+    #of a compressed file) and the communication overhead stays small
+    chunksize = max(1, len(tasks)//(4*n_workers))
+    #forked processes do not import the main module again, so that scripts without a main guard
+    #(such as plots.py) can render in parallel
+    context = mp.get_context('fork') if 'fork' in mp.get_all_start_methods() else mp.get_context()
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=context, initializer=_init_worker,
+                             initargs=(c_grid_datasave, output_format, replica, slice_index, color_limits,
+                                       downsample, dpi)) as executor:
+        list(executor.map(_render_frame, tasks, chunksize=chunksize))
+    return frame_paths
+
+
+def assemble_animation(frame_paths, output_path, fps=20):
+    """This function assembles the rendered images in an animation, whose format is chosen by the extension
+    of output_path: GIF (with Pillow, reading one image at a time) or MP4 (with the ffmpeg executable)
+
+    Parameters:
+    frame_paths: list of str
+            paths of the images, in the order of the animation, named as FRAME_NAME for MP4 output
+    output_path: str
+            path of the animation, with extension .gif or .mp4
+    fps: float, >0.
+            frames per second of the animation
+
+    Raise:
+        ValueError if the extension is not .gif or .mp4
+        ImportError if Pillow (GIF) or ffmpeg (MP4) are not available"""
+
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension == '.gif':
+        if Image is None:
+            raise ImportError('Pillow is needed to assemble GIF animations')
+        images = (Image.open(path).convert('RGB') for path in frame_paths)
+        first_image = next(images)
+        first_image.save(output_path, save_all=True, append_images=images, duration=1000./fps, loop=0)
+    elif extension == '.mp4':
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            raise ImportError('The ffmpeg executable is needed to assemble MP4 animations')
+        frames_pattern = os.path.join(os.path.dirname(frame_paths[0]), FRAME_NAME.replace('{:06d}', '%06d'))
+        #H.264 with yuv420p pixels needs even image sides
+        subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-framerate', str(fps), '-i', frames_pattern,
+                        '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', output_path], check=True)
+    else:
+        raise ValueError('Unknown animation format '+repr(extension)+', valid options are: .gif, .mp4')
+
+
+def render_animation(c_grid_datasave, output_format, output_path, stride=5, downsample=1, replica=None,
+                     n_workers=None, fps=20, frames_directory=None, slice_index=None):
+    """This function renders in parallel the frames of the concentration grid animation with render_frames()
+    and assembles them with assemble_animation()
+
+    Parameters:
+    c_grid_datasave, output_format, stride, downsample, replica, n_workers, slice_index: see render_frames()
+    output_path: str
+            path of the animation (.gif or .mp4)
+    fps: float, >0.
+            frames per second of the animation
+    frames_directory: str or None
+            if given, the rendered images are kept in this directory as an image series,
+            otherwise they are written to a temporary directory, deleted at the end"""
+
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        directory = temporary_directory if frames_directory is None else frames_directory
+        frame_paths = render_frames(c_grid_datasave, output_format, directory, stride, downsample, replica, n_workers,
+                                    slice_index=slice_index)
+        assemble_animation(frame_paths, output_path, fps)
+
+
+if __name__ == '__main__':
+    parser = ap.ArgumentParser(description='Render the concentration grid animation on a pool of processes')
+    parser.add_argument('config_file', help='simulation configuration file, e.g. simulation_configuration.txt')
+    parser.add_argument('--output', default=None, help='animation path, .gif or .mp4 (default: c_grid_evolution_anim)')
+    parser.add_argument('--workers', type=int, default=None, help='number of rendering processes (default: number of CPUs)')
+    parser.add_argument('--stride', type=int, default=None, help='render one stored frame every stride')
+    parser.add_argument('--downsample', type=int, default=None, help='side of the blocks of subcells averaged in a pixel')
+    parser.add_argument('--fps', type=float, default=None, help='frames per second of the animation')
+    parser.add_argument('--frames-dir', default=None, help='directory where the rendered images are kept')
+    args = parser.parse_args()
+
+    config = cp.ConfigParser()
+    config.read(args.config_file)
+    replica = None
+    if config.getboolean('ensemble', 'enabled', fallback=False):
+        replica = int(config.get('ensemble', 'plot_replica', fallback='0'))
+    n_workers = args.workers if args.workers is not None else int(config.get('rendering', 'n_workers', fallback='0'))
+    render_animation(config.get('data_paths', 'c_config_datasave'),
+                     config.get('data_paths', 'output_format', fallback='binary'),
+                     args.output if args.output is not None else config.get('image_paths', 'c_grid_evolution_anim'),
+                     args.stride if args.stride is not None else int(config.get('rendering', 'frame_stride', fallback='5')),
+                     args.downsample if args.downsample is not None else int(config.get('rendering', 'downsample', fallback='1')),
+                     replica, n_workers if n_workers > 0 else None,
+                     args.fps if args.fps is not None else float(config.get('rendering', 'fps', fallback='20')),
+                     args.frames_dir, configured_slice_index(config))
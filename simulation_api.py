@@ -0,0 +1,716 @@
+import numpy as np
+import os
+import sys
+from collections import deque, namedtuple
+from contextlib import ExitStack, nullcontext
+from chemical_potential_free_energy import fused_diagnostics
+from CahnHilliard_equation import select_integrator
+from concentration_laplacian import check_boundary, grid_spacings
+from create_initial_config import create_initial_config, read_grid_shape
+from snapshot_io import open_snapshot_writer, truncate_text_file
+from output_schedule import output_steps
+from checkpoint import config_hash, save_checkpoint, load_checkpoint
+from parallel_stepping import ParallelStepEngine
+from adaptive_stepping import AdaptiveTimeStepper
+from active_set import ActiveSetStepper
+from profiling import PhaseProfiler
+from ensemble import read_ensemble_settings, per_replica, create_ensemble_initial_config, replica_datasave_path
+from initial_conditions import configured_initial_config, replica_seed_sequences
+from structure_factor import StructureFactorAnalyzer
+from convergence import ConvergenceMonitor, CRITERIA
+
+#state of the simulation passed to the sinks: diagnostics is None when not computed at that step
+SimulationState = namedtuple('SimulationState', ['step', 't', 'c', 'diagnostics'])
+
+#first line of the files of the average quantities
+AVERAGES_HEADER = "Time AverageConcentration AverageChem.Potential FreeEnergy\n"
+
+
+class Simulation:
+    """This class evolves a concentration grid according to the Cahn-Hilliard equation, with the integrator,
+    time stepping and parallel options of the configuration file. The states of the simulation are streamed
+    by the run() generator, which yields (t, c, diagnostics) at the chosen cadence, and are passed to the
+    sinks added with add_sink() (file writers, in-memory ring buffers, callbacks) at their own cadence.
+    The initial state and the final state are always yielded and passed to all the sinks.
+
+    Parameters:
+    c: N-by-N 2D array of floats, or array of shape (B, N, N) for a batch of B microstructures
+       (N-by-N-by-N, or (B, N, N, N), for 3D microstructures)
+       initial concentration grid
+    A, grad_coeff, M: floats, not <0. (or arrays of shape (B, 1, 1), (B, 1, 1, 1) in 3D, with a value per microstructure)
+       multiplicative constant of chemical potential, gradient coefficient and mobility
+    dx, dy: floats, >0.
+       dimensions in x and y direction of a concentration subcell
+    dt: float, >0.
+       time step (initial time step with adaptive time stepping)
+    n_iterations: int
+       number of time steps (maximum number of accepted steps with adaptive time stepping)
+    t0: float
+       initial time
+    integrator: str
+       name of the integration scheme, one of the keys of CahnHilliard_equation.INTEGRATORS
+    t_end: float
+       time at which the simulation stops, even if n_iterations were not performed
+    adaptive: bool
+       if True, the time step is adapted by an AdaptiveTimeStepper with bounds dt_min, dt_max and tolerance
+    dt_min, dt_max, tolerance: floats
+       parameters of the adaptive time stepping (dt_min and dt_max default to dt)
+    n_workers: int
+       number of worker processes of the parallel explicit integration (0 for serial integration)
+    profiler: PhaseProfiler or None
+       profiler timing the phases of the simulation loop
+    convergence_monitor: ConvergenceMonitor or None
+       if given, the simulation stops as soon as the monitor finds it converged, storing the criterion met
+       in the stop_reason attribute
+    dz: float or None
+       dimension in z direction of a concentration subcell for a 3D microstructure, None (default) for a 2D one
+    boundary: str
+       boundary conditions of the microstructure, 'periodic' (default) or 'neumann' (no flux through the edges)
+    active_set: bool
+       if True, each explicit step only updates the tiles of the grid that are still evolving, with an
+       ActiveSetStepper with parameters tile_size, activity_tolerance and full_sweep_every; the fraction of
+       active tiles is added to the diagnostics"""
+
+    def __init__(self, c, A, grad_coeff, dx, dy, M, dt, n_iterations, t0=0., integrator='explicit', t_end=np.inf,
+                 adaptive=False, dt_min=None, dt_max=None, tolerance=1e-3, n_workers=0, profiler=None,
+                 convergence_monitor=None, dz=None, boundary='periodic', active_set=False, tile_size=32,
+                 activity_tolerance=1e-7, full_sweep_every=50):
+
+        #check validity of the options (validity of the physical parameters is checked by the integrators)
+        if n_workers > 0 and integrator not in ('explicit', 'explicit_inplace'):
+            raise ValueError('Parallel integration is only available for the explicit integrators, check the config.txt file description')
+        if n_workers > 0 and adaptive:
+            raise ValueError('Parallel integration is not available with adaptive time stepping, check the config.txt file description')
+        if active_set and (integrator not in ('explicit', 'explicit_inplace') or adaptive or n_workers > 0):
+            raise ValueError('Active set integration is only available for the serial explicit integrators without adaptive time stepping, '
+                             'check the config.txt file description')
+        check_boundary(boundary)
+
+        self.c = c
+        self.A, self.grad_coeff, self.dx, self.dy, self.M = A, grad_coeff, dx, dy, M
+        self.dz = dz
+        #number of grid axes of the microstructure (the leading axes of c, if any, index different microstructures)
+        self.dimensions = 2 if dz is None else 3
+        self.boundary = boundary
+        self.dt = dt
+        self.n_iterations = n_iterations
+        self.t0 = t0
+        self.t = t0
+        self.t_end = t_end
+        self.step = 0
+        self.n_workers = n_workers
+        self.integrator = integrator
+        self.integrate = select_integrator(integrator)
+        self.adaptive_stepper = None
+        if adaptive:
+            self.adaptive_stepper = AdaptiveTimeStepper(self.integrate, A, grad_coeff, dx, dy, M, dt,
+                                                        dt if dt_min is None else dt_min,
+                                                        dt if dt_max is None else dt_max, tolerance, dz=dz,
+                                                        boundary=boundary)
+        self.active_stepper = None
+        if active_set:
+            self.active_stepper = ActiveSetStepper(self.integrate, np.shape(c), A, grad_coeff, dx, dy, M, dt, tile_size,
+                                                   activity_tolerance, full_sweep_every, dz=dz, boundary=boundary)
+        self.profiler = PhaseProfiler(enabled=False) if profiler is None else profiler
+        self.convergence_monitor = convergence_monitor
+        #criterion of the convergence monitor that stopped the simulation early, None if it was not stopped
+        self.stop_reason = None
+        self._sinks = []
+        #chemical potential of the current grid, computed by the diagnostics and reused by the next step
+        self._chem_potential = None
+        self._chem_potential_buffer = None
+        #True once the current state was passed to the sinks
+        self._state_emitted = False
+
+    @classmethod
+    def from_config(cls, config, profiler=None):
+        """This method builds a simulation from the settings of the configuration file (see README.md),
+        seeding numpy random number generator and creating the initial concentration grid
+
+        Parameters:
+        config: configparser.ConfigParser
+                simulation configuration
+        profiler: PhaseProfiler or None
+                profiler timing the phases of the simulation loop
+
+        Returns:
+        simulation: Simulation
+                simulation at its initial state"""
+
+        # Microstructure geometry and material specific parameters
+        dx = float(config.get('microstructure_settings', 'dx'))
+        dy = float(config.get('microstructure_settings', 'dy'))
+        #a subcell dimension along z makes the microstructure 3D, with Nz*Ny*Nx subcells
+        dz = config.get('microstructure_settings', 'dz', fallback=None)
+        dz = None if dz is None else float(dz)
+        dimensions = 2 if dz is None else 3
+        #periodic microstructure, or walled domain without flux through its edges
+        boundary = config.get('microstructure_settings', 'boundary', fallback='periodic')
+        #Nx, Ny (and Nz) give a rectangular grid, e.g. a thin film or a channel: each one defaults to N
+        shape = read_grid_shape(config)
+        M = float(config.get('microstructure_settings', 'M'))
+        grad_coeff = float(config.get('microstructure_settings', 'grad_coeff'))
+        A = float(config.get('microstructure_settings', 'A'))
+        c0 = float(config.get('microstructure_settings', 'c0'))
+        c_noise = float(config.get('microstructure_settings', 'c_noise'))
+        #floating point precision of the grid, kept by all the operations and by the stored snapshots
+        dtype = np.dtype(config.get('time_settings', 'dtype', fallback='float64'))
+
+        # Time integration parameters
+        dt = float(config.get('time_settings', 'dt'))
+        options = {'t0': float(config.get('time_settings', 't0')),
+                   'integrator': config.get('time_settings', 'integrator', fallback='explicit'),
+                   't_end': float(config.get('time_settings', 't_end', fallback='inf')),
+                   'adaptive': config.getboolean('time_settings', 'adaptive', fallback=False),
+                   'dt_min': float(config.get('time_settings', 'dt_min', fallback=str(dt))),
+                   'dt_max': float(config.get('time_settings', 'dt_max', fallback=str(dt))),
+                   'tolerance': float(config.get('time_settings', 'tolerance', fallback='1e-3')),
+                   'n_workers': int(config.get('parallel', 'n_workers', fallback='0')),
+                   'active_set': config.getboolean('active_set', 'enabled', fallback=False),
+                   'tile_size': int(config.get('active_set', 'tile_size', fallback='32')),
+                   'activity_tolerance': float(config.get('active_set', 'tolerance', fallback='1e-7')),
+                   'full_sweep_every': int(config.get('active_set', 'full_sweep_every', fallback='50')),
+                   'profiler': profiler}
+        n_iterations = int(config.get('time_settings', 'n_iterations'))
+
+        # Early termination criteria (disabled if all the tolerances are 0)
+        patience = int(config.get('time_settings', 'convergence_patience', fallback='5'))
+        monitor = ConvergenceMonitor(int(config.get('time_settings', 'convergence_check_every', fallback='10')),
+                                     {name: float(config.get('time_settings', name+'_tol', fallback='0.')) for name in CRITERIA},
+                                     {name: int(config.get('time_settings', name+'_patience', fallback=str(patience))) for name in CRITERIA})
+        if monitor.enabled:
+            options['convergence_monitor'] = monitor
+
+        # Seed option
+        seed_option = bool(config.get('simulation_seed', 'seed_option'))
+        seed = None
+        if seed_option:
+            seed = int(config.get('simulation_seed', 'seed'))
+            np.random.seed(seed)
+
+        # Build initial microstructure concentration grid, for a single simulation or for an ensemble of replicas:
+        # with the default legacy noise the grids are drawn from the global numpy random state, otherwise they are
+        # generated (or loaded) by initial_conditions.configured_initial_config() with independent random streams
+        legacy = (config.get('initial_conditions', 'noise', fallback='legacy') == 'legacy' and
+                  not any(config.has_option('initial_conditions', key) for key in ('path', 'n_nuclei', 'memmap_path')))
+        spacings = grid_spacings(dx, dy, dz)
+        ensemble = config.getboolean('ensemble', 'enabled', fallback=False)
+        if ensemble:
+            base_values = {'c0': c0, 'c_noise': c_noise, 'A': A, 'M': M, 'grad_coeff': grad_coeff, 'seed': seed}
+            n_replicas, replica_values = read_ensemble_settings(config, base_values)
+            #material parameters broadcast against the (B, Ny, Nx) concentration array
+            A = per_replica(replica_values['A'], dimensions)
+            M = per_replica(replica_values['M'], dimensions)
+            grad_coeff = per_replica(replica_values['grad_coeff'], dimensions)
+            c0_values, c_noise_values = replica_values['c0'], replica_values['c_noise']
+            #the streams of the replicas are spawned from the simulation seed, unless seeds are given per replica
+            replica_seeds = replica_values['seed'] if config.has_option('ensemble', 'seed') else None
+        else:
+            n_replicas, c0_values, c_noise_values, replica_seeds = 1, [c0], [c_noise], None
+        if not legacy:
+            c = configured_initial_config(config, shape, c0_values, c_noise_values,
+                                          replica_seed_sequences(seed, n_replicas, replica_seeds), dtype, spacings, ensemble)
+        elif ensemble:
+            c = create_ensemble_initial_config(shape, replica_values['c0'], replica_values['c_noise'], replica_values['seed'],
+                                               dtype, dimensions)
+        else:
+            c = create_initial_config(shape, c0, c_noise, dtype)
+
+        return cls(c, A, grad_coeff, dx, dy, M, dt, n_iterations, dz=dz, boundary=boundary, **options)
+
+    def add_sink(self, sink, steps=None):
+        """This method adds a sink receiving the states of the simulation
+
+        Parameters:
+        sink: object with a write(state) method
+              receives a SimulationState; if its attribute needs_diagnostics is True, the diagnostics
+              are computed at each step the sink receives, and if it has a phase attribute, its writes
+              are timed by the profiler as that phase
+        steps: iterable of ints or None
+              steps at which the sink receives the state (the initial and final states are always received);
+              None for all the steps"""
+        self._sinks.append((sink, None if steps is None else set(steps)))
+
+    @property
+    def finished(self):
+        """True if the simulation performed n_iterations steps, reached t_end or was found converged"""
+        return self.step >= self.n_iterations or self.t >= self.t_end or self.stop_reason is not None
+
+    def diagnostics(self):
+        """This method computes, with fused_diagnostics(), the average concentration, average chemical potential
+        and free energy of the current grid (arrays with a value per microstructure for a batch);
+        the chemical potential grid is kept to be reused by the next integration step
+
+        Returns:
+        diagnostics: dict
+                average_concentration, average_chemical_potential, free_energy, free_energy_homogeneous,
+                free_energy_gradient (and active_fraction, the fraction of tiles updated by the next step,
+                with active set integration)"""
+        #the chemical potential is written in the same buffer at each call
+        c = np.asarray(self.c)
+        buffer = self._chem_potential_buffer
+        if buffer is None or buffer.shape != c.shape or buffer.dtype != c.dtype:
+            self._chem_potential_buffer = np.empty_like(c) if np.issubdtype(c.dtype, np.floating) else None
+        average_c, average_chem_potential, F_homogeneous, F_gradient, self._chem_potential = \
+            fused_diagnostics(self.c, self.A, self.grad_coeff, self.dx, self.dy, self.dz, self.boundary,
+                              out=self._chem_potential_buffer)
+        diagnostics = {'average_concentration': average_c, 'average_chemical_potential': average_chem_potential,
+                       'free_energy': F_homogeneous + F_gradient, 'free_energy_homogeneous': F_homogeneous,
+                       'free_energy_gradient': F_gradient}
+        if self.active_stepper is not None:
+            diagnostics['active_fraction'] = self.active_stepper.active_fraction
+        return diagnostics
+
+    def _steps_to_next_event(self, every):
+        """This method returns the number of steps to the next step at which the state is passed to a sink,
+        yielded or checked for convergence, or the simulation is finished: the steps in between can be
+        performed in a single request to the parallel workers"""
+        monitor = self.convergence_monitor
+        step = self.step + 1
+        while True:
+            t = self.t0 + step*self.dt
+            if (step >= self.n_iterations or t >= self.t_end or (every is not None and step % every == 0) or
+                    (monitor is not None and monitor.due(step)) or
+                    any(steps is None or step in steps for sink, steps in self._sinks)):
+                return step - self.step
+            step += 1
+
+    def _advance(self, parallel_engine, n_steps=1):
+        """This method performs one time step (n_steps steps on the parallel workers)"""
+        with self.profiler.phase('integration'):
+            if self.adaptive_stepper is not None:
+                #adaptive step, not going beyond t_end, accumulating the non-uniform time
+                self.c, dt_taken = self.adaptive_stepper.step(self.c, self.t_end - self.t)
+                self.t = self.t_end if dt_taken >= self.t_end - self.t else self.t + dt_taken
+            else:
+                self.t = self.t0 + (self.step+1)*self.dt
+                if self.active_stepper is not None:
+                    self.c = self.active_stepper.step(self.c, self._chem_potential)
+                elif parallel_engine is None:
+                    self.c = self.integrate(self.c, self.A, self.grad_coeff, self.dx, self.dy, self.M, self.dt, self._chem_potential,
+                                           dz=self.dz, boundary=self.boundary)
+                else:
+                    self.t = self.t0 + (self.step+n_steps)*self.dt
+                    self.c = parallel_engine.step(n_steps)
+        self._chem_potential = None
+        self.step += n_steps
+
+    def _emit(self, every, with_diagnostics):
+        """This method passes the current state to the sinks scheduled at the current step,
+        and returns it if it must be yielded by run() (None otherwise)"""
+        diagnostics = None
+        monitor = self.convergence_monitor
+        if monitor is not None and self.stop_reason is None and monitor.due(self.step):
+            #convergence check, before choosing the sinks so that all of them receive the state if it is the final one
+            with self.profiler.phase('diagnostics'):
+                diagnostics = self.diagnostics()
+            with self.profiler.phase('convergence'):
+                self.stop_reason = monitor.update(self.step, self.c, diagnostics)
+
+        final = self.finished
+        sinks = [sink for sink, steps in self._sinks if steps is None or self.step in steps or final or self.step == 0]
+        yielded = every is not None and (self.step % every == 0 or final)
+
+        if diagnostics is None and ((yielded and with_diagnostics) or any(getattr(sink, 'needs_diagnostics', False) for sink in sinks)):
+            with self.profiler.phase('diagnostics'):
+                diagnostics = self.diagnostics()
+
+        state = SimulationState(self.step, self.t, self.c, diagnostics)
+        for sink in sinks:
+            phase = getattr(sink, 'phase', None)
+            with self.profiler.phase(phase) if phase is not None else nullcontext():
+                sink.write(state)
+        self._state_emitted = True
+        return state if yielded else None
+
+    def run(self, every=1, with_diagnostics=True):
+        """This generator performs the time integration until the simulation is finished, passing the states
+        to the sinks and yielding them at the chosen cadence. Nothing is computed until the next state is requested.
+        The yielded grid is the array used by the simulation, not a copy: copy it to keep it, since the in place
+        integrators update it at the following steps.
+
+        Parameters:
+        every: int or None
+               number of steps between yielded states (the initial and final states are always yielded);
+               None to only pass the states to the sinks
+        with_diagnostics: bool
+               if True, the diagnostics of the yielded states are computed
+
+        Yields:
+        t: float
+           time
+        c: array of floats
+           concentration grid
+        diagnostics: dict or None
+           diagnostics of the grid, see diagnostics()"""
+
+        parallel_engine = None
+        try:
+            if self.n_workers > 0:
+                parallel_engine = ParallelStepEngine(self.c, self.A, self.grad_coeff, self.dx, self.dy, self.M,
+                                                     self.dt, self.n_workers, dz=self.dz, boundary=self.boundary,
+                                                     inplace=self.integrator == 'explicit_inplace')
+            #initial state (not emitted again when the simulation is restarted or resumed)
+            if not self._state_emitted:
+                state = self._emit(every, with_diagnostics)
+                if state is not None:
+                    yield state.t, state.c, state.diagnostics
+
+            self.profiler.start()
+            while not self.finished:
+                #the parallel workers perform all the steps up to the next one that is emitted, and the grid
+                #is copied from the shared memory only at that step
+                self._advance(parallel_engine, 1 if parallel_engine is None else self._steps_to_next_event(every))
+                state = self._emit(every, with_diagnostics)
+                self.profiler.end_step()
+                if state is not None:
+                    yield state.t, state.c, state.diagnostics
+        finally:
+            self.profiler.stop()
+            if parallel_engine is not None:
+                parallel_engine.close()
+
+    def run_to_end(self):
+        """This method performs the whole time integration, only passing the states to the sinks"""
+        for state in self.run(every=None):
+            pass
+
+    def save_checkpoint(self, path, configuration_hash, extra=None):
+        """This method saves a checkpoint of the current state with checkpoint.save_checkpoint()
+        (with the current time step, for adaptive time stepping, and the state of the convergence monitor),
+        together with the additional named values in extra (e.g. the number of outputs already written)"""
+        extra = {} if extra is None else dict(extra)
+        if self.adaptive_stepper is not None:
+            extra['dt'] = self.adaptive_stepper.dt
+        if self.convergence_monitor is not None:
+            extra.update(self.convergence_monitor.state())
+            if self.stop_reason is not None:
+                extra['stop_reason'] = self.stop_reason
+        if self.active_stepper is not None and self.active_stepper.active is not None:
+            extra['active_tiles'] = self.active_stepper.active
+            extra['steps_since_sweep'] = self.active_stepper.steps_since_sweep
+        save_checkpoint(path, self.c, self.t, self.step, configuration_hash, extra=extra if extra else None)
+
+    def restore_checkpoint(self, path, configuration_hash=None):
+        """This method restores the state saved in a checkpoint (see checkpoint.load_checkpoint()),
+        which is considered already passed to the sinks, and returns the dict of the extra values stored with it"""
+        self.c, self.t, self.step, extra = load_checkpoint(path, configuration_hash, return_extra=True)
+        if self.adaptive_stepper is not None and 'dt' in extra:
+            self.adaptive_stepper.dt = float(extra['dt'])
+        if self.convergence_monitor is not None and 'convergence_counts' in extra:
+            self.convergence_monitor.restore(extra)
+            self.stop_reason = str(extra['stop_reason']) if 'stop_reason' in extra else None
+        if self.active_stepper is not None and 'active_tiles' in extra:
+            self.active_stepper.active = np.array(extra['active_tiles'], dtype=bool)
+            self.active_stepper.steps_since_sweep = int(extra['steps_since_sweep'])
+        self._chem_potential = None
+        self._state_emitted = True
+        return extra
+
+
+class SnapshotFileSink:
+    """This class is a sink writing the concentration grids with a snapshot writer of snapshot_io.py
+
+    Parameters:
+    writer: BinarySnapshotWriter, TextSnapshotWriter, CompressedSnapshotWriter or AsyncSnapshotWriter
+            writer of the concentration grids
+    frames_written: int
+            number of grids already stored in the file (when a simulation is restarted), counted
+            with the following ones in the frames_written attribute"""
+
+    phase = 'snapshot_write'
+    needs_diagnostics = False
+
+    def __init__(self, writer, frames_written=0):
+        self.writer = writer
+        self.frames_written = frames_written
+
+    def write(self, state):
+        self.writer.write(state.t, state.c)
+        self.frames_written += 1
+
+    def flush(self):
+        self.writer.flush()
+
+    @property
+    def bytes_written(self):
+        return self.writer.bytes_written
+
+
+class DiagnosticsFileSink:
+    """This class is a sink writing the average concentration, average chemical potential and free energy
+    (with time indicator) to a text file per microstructure
+
+    Parameters:
+    files: list of file objects
+           open text file of each microstructure (a single one for a single microstructure)
+    write_header: bool
+           if True, the line with the column names is written to the files
+    profiler: PhaseProfiler or None
+           profiler timing the formatting of the lines and the file writes as separate phases
+    extra_columns: dict
+           additional columns written after the free energy, as {column name: diagnostics key},
+           e.g. {'ActiveFraction': 'active_fraction'} (the same value is written for all the microstructures)
+    rows_written: int
+           number of rows of average quantities already stored in each file (when a simulation is restarted),
+           counted with the following ones in the rows_written attribute"""
+
+    needs_diagnostics = True
+
+    def __init__(self, files, write_header=True, profiler=None, extra_columns=None, rows_written=0):
+        self.files = files
+        self.rows_written = rows_written
+        self.profiler = PhaseProfiler(enabled=False) if profiler is None else profiler
+        self.extra_columns = {} if extra_columns is None else extra_columns
+        self.bytes_written = 0
+        if write_header:
+            header = AVERAGES_HEADER if not self.extra_columns else \
+                     AVERAGES_HEADER[:-1]+' '+' '.join(self.extra_columns)+'\n'
+            for f in files:
+                f.write(header)
+            self.bytes_written += len(header)*len(files)
+
+    def write(self, state):
+        diagnostics = state.diagnostics
+        with self.profiler.phase('formatting'):
+            extra_values = [str(diagnostics[key]) for key in self.extra_columns.values()]
+            lines = [' '.join([str(state.t),str(c_b),str(chem_b),str(free_E_b)]+extra_values+["\n"])
+                     for c_b, chem_b, free_E_b in zip(np.atleast_1d(diagnostics['average_concentration']),
+                                                      np.atleast_1d(diagnostics['average_chemical_potential']),
+                                                      np.atleast_1d(diagnostics['free_energy']))]
+        with self.profiler.phase('averages_write'):
+            for f, line in zip(self.files, lines):
+                f.write(line)
+        self.bytes_written += sum(len(line) for line in lines)
+        self.rows_written += 1
+
+    def flush(self):
+        for f in self.files:
+            f.flush()
+
+
+class StructureFactorFileSink:
+    """This class is a sink writing, with time indicator, the first moment of the structure factor, the domain length,
+    the interface area and the radially averaged structure factor computed by a StructureFactorAnalyzer
+    to a text file per microstructure
+
+    Parameters:
+    analyzer: StructureFactorAnalyzer
+           analyzer built for the shape of the simulated grid
+    files: list of file objects
+           open text file of each microstructure (a single one for a single microstructure)
+    write_header: bool
+           if True, the line with the column names is written to the files"""
+
+    phase = 'structure_factor'
+    needs_diagnostics = False
+
+    def __init__(self, analyzer, files, write_header=True):
+        self.analyzer = analyzer
+        self.files = files
+        self.bytes_written = 0
+        if write_header:
+            header = analyzer.header()
+            for f in files:
+                f.write(header)
+            self.bytes_written += len(header)*len(files)
+
+    def write(self, state):
+        analysis = self.analyzer.analyze(state.c)
+        S = np.reshape(analysis['S'], (len(self.files), -1))
+        for b, f in enumerate(self.files):
+            line = ' '.join([str(state.t)] + [str(np.atleast_1d(analysis[name])[b])
+                                              for name in ('first_moment', 'domain_length', 'interface_area')] +
+                            [str(value) for value in S[b].tolist()]) + " \n"
+            f.write(line)
+            self.bytes_written += len(line)
+
+    def flush(self):
+        for f in self.files:
+            f.flush()
+
+
+class RingBufferSink:
+    """This class is a sink keeping in memory copies of the last states received
+
+    Parameters:
+    capacity: int, >=1
+              maximum number of stored states (the oldest ones are discarded)
+    needs_diagnostics: bool
+              if True, the diagnostics are computed and stored with the states"""
+
+    def __init__(self, capacity, needs_diagnostics=False):
+        if capacity < 1:
+            raise ValueError('The capacity of the ring buffer must be >= 1')
+        self.states = deque(maxlen=capacity)
+        self.needs_diagnostics = needs_diagnostics
+
+    def write(self, state):
+        self.states.append(state._replace(c=np.array(state.c, copy=True)))
+
+
+class CallbackSink:
+    """This class is a sink calling a function with each state received
+
+    Parameters:
+    callback: function
+              called as callback(state) with a SimulationState
+    needs_diagnostics: bool
+              if True, the diagnostics are computed before calling the function
+    phase: str or None
+              name of the phase timing the calls in the profiler"""
+
+    def __init__(self, callback, needs_diagnostics=False, phase=None):
+        self.callback = callback
+        self.needs_diagnostics = needs_diagnostics
+        self.phase = phase
+
+    def write(self, state):
+        self.callback(state)
+
+
+def run_configured_simulation(config, restart=None, log=sys.stdout):
+    """This function runs the simulation described by the configuration file, writing the concentration grids,
+    the average quantities, the checkpoints and the profiling report to the paths given in the configuration.
+    It is the body of the simulation.py command line tool.
+
+    Parameters:
+    config: configparser.ConfigParser
+            simulation configuration
+    restart: str or None
+            checkpoint to restart the simulation from, appending to the existing output files
+    log: file-like or None
+            destination of the progress messages (None for a silent run)
+
+    Returns:
+    simulation: Simulation
+            the finished simulation"""
+
+    profiler = PhaseProfiler(config.getboolean('profiling', 'enabled', fallback=False),
+                             config.getboolean('profiling', 'trace_memory', fallback=False))
+    simulation = Simulation.from_config(config, profiler)
+
+    # Output cadence: time steps at which concentration grids are saved and average quantities are computed
+    n_iterations = simulation.n_iterations
+    snapshot_every = int(config.get('time_settings', 'snapshot_every', fallback='1'))
+    diagnostics_every = int(config.get('time_settings', 'diagnostics_every', fallback='1'))
+    diagnostics_schedule = config.get('time_settings', 'diagnostics_schedule', fallback='linear')
+    diagnostics_points = int(config.get('time_settings', 'diagnostics_points', fallback='100'))
+    snapshot_steps = set(output_steps(n_iterations, snapshot_every).tolist())
+    diagnostics_steps = set(output_steps(n_iterations, diagnostics_every, diagnostics_schedule, diagnostics_points).tolist())
+
+    # Destinations for data saving (one file of average quantities per replica, for an ensemble)
+    c_grid_datasave = config.get('data_paths', 'c_config_datasave')
+    aver_quantities_datasave = config.get('data_paths', 'aver_quantities_datasave')
+    output_format = config.get('data_paths', 'output_format', fallback='binary')
+    snapshot_dtype = config.get('data_paths', 'snapshot_dtype', fallback=str(np.asarray(simulation.c).dtype))
+    async_queue = int(config.get('data_paths', 'async_queue', fallback='0'))
+    compressed_options = {'tolerance': float(config.get('data_paths', 'quantization_tolerance', fallback='1e-4')),
+                          'delta': config.getboolean('data_paths', 'delta_encoding', fallback=True),
+                          'compression': config.get('data_paths', 'compression', fallback='zlib'),
+                          'chunk_frames': int(config.get('data_paths', 'chunk_frames', fallback='16'))}
+    structure_factor_option = config.getboolean('structure_factor', 'enabled', fallback=False)
+    structure_factor_datasave = config.get('data_paths', 'structure_factor_datasave', fallback='./Data/structure_factor.txt')
+    if np.ndim(simulation.c) > simulation.dimensions:
+        aver_quantities_datasaves = [replica_datasave_path(aver_quantities_datasave, b) for b in range(len(simulation.c))]
+        structure_factor_datasaves = [replica_datasave_path(structure_factor_datasave, b) for b in range(len(simulation.c))]
+    else:
+        aver_quantities_datasaves = [aver_quantities_datasave]
+        structure_factor_datasaves = [structure_factor_datasave]
+    if not structure_factor_option:
+        structure_factor_datasaves = []
+
+    # Checkpoints for restart
+    checkpoint_every = int(config.get('checkpoint', 'checkpoint_every', fallback='0'))
+    checkpoint_path = config.get('checkpoint', 'checkpoint_path', fallback='./Data/checkpoint.npz')
+    configuration_hash = config_hash(config)
+
+    resume_snapshots = None
+    resume_diagnostics = 0
+    n_frames = len(snapshot_steps)
+    if restart is not None:
+        # Restore concentration grid, step index and random number generator state from the checkpoint
+        extra = simulation.restore_checkpoint(restart, configuration_hash)
+        start_step = simulation.step
+
+        #keep only the outputs written up to the checkpoint step, discarding the ones written after it
+        #(including the final outputs written when the simulation stopped at t_end or converged).
+        #Their number is stored in the checkpoint, so that n_iterations and the output cadence can be changed
+        #on restart; it is computed from the schedule for the checkpoints not storing it
+        if 'snapshots_written' in extra:
+            resume_snapshots = int(extra['snapshots_written'])
+            resume_diagnostics = int(extra['diagnostics_written'])
+        else:
+            stopped = simulation.finished
+            resume_snapshots = sum(1 for step in snapshot_steps if step <= start_step) + \
+                               int(stopped and start_step not in snapshot_steps)
+            resume_diagnostics = sum(1 for step in diagnostics_steps if step <= start_step) + \
+                                 int(stopped and start_step not in diagnostics_steps)
+        for path in aver_quantities_datasaves + structure_factor_datasaves:
+            truncate_text_file(path, resume_diagnostics+1)
+        #room for the kept grids and for the ones of the steps following the checkpoint
+        n_frames = resume_snapshots + sum(1 for step in snapshot_steps if step > start_step)
+
+    with open_snapshot_writer(c_grid_datasave, output_format, np.shape(simulation.c), n_frames,
+                              np.dtype(snapshot_dtype), resume_snapshots, async_queue,
+                              compressed_options) as writer, ExitStack() as files_stack:
+        average_files = [files_stack.enter_context(open(path, "w" if restart is None else "a"))
+                         for path in aver_quantities_datasaves]
+        snapshot_sink = SnapshotFileSink(writer, resume_snapshots or 0)
+        #the fraction of active tiles is stored after the average quantities, with active set integration
+        extra_columns = {'ActiveFraction': 'active_fraction'} if simulation.active_stepper is not None else None
+        diagnostics_sink = DiagnosticsFileSink(average_files, restart is None, profiler, extra_columns, resume_diagnostics)
+        simulation.add_sink(snapshot_sink, snapshot_steps)
+        simulation.add_sink(diagnostics_sink, diagnostics_steps)
+        file_sinks = [snapshot_sink, diagnostics_sink]
+
+        if structure_factor_option:
+            #structure factor and domain size, computed at the cadence of the average quantities
+            structure_factor_files = [files_stack.enter_context(open(path, "w" if restart is None else "a"))
+                                      for path in structure_factor_datasaves]
+            analyzer = StructureFactorAnalyzer(np.shape(simulation.c), simulation.dx, simulation.dy, simulation.dz)
+            structure_factor_sink = StructureFactorFileSink(analyzer, structure_factor_files, restart is None)
+            simulation.add_sink(structure_factor_sink, diagnostics_steps)
+            file_sinks.append(structure_factor_sink)
+
+        if checkpoint_every > 0:
+            def checkpoint(state):
+                #save checkpoint, after flushing the outputs so that they are consistent with it
+                for sink in file_sinks:
+                    sink.flush()
+                simulation.save_checkpoint(checkpoint_path, configuration_hash,
+                                           {'snapshots_written': snapshot_sink.frames_written,
+                                            'diagnostics_written': diagnostics_sink.rows_written})
+                profiler.add_bytes('checkpoints', os.path.getsize(checkpoint_path))
+            simulation.add_sink(CallbackSink(checkpoint, phase='checkpoint'), range(checkpoint_every, n_iterations+1, checkpoint_every))
+
+        if log is not None:
+            def print_progress(state):
+                #print simulation status on the command line
+                progress = max(state.step/max(n_iterations, 1),
+                               (state.t-simulation.t0)/(simulation.t_end-simulation.t0) if simulation.t_end > simulation.t0 else 1.)
+                log.write("\r Simulation running: {:.1f}%".format(progress*100))
+            #the progress is printed about every 0.5% of the steps, so that the parallel workers are not stopped at each step
+            simulation.add_sink(CallbackSink(print_progress, phase='progress'), range(0, n_iterations+1, max(1, n_iterations//200)))
+
+        simulation.run_to_end()
+        profiler.add_bytes('snapshots', snapshot_sink.bytes_written)
+        profiler.add_bytes('averages', diagnostics_sink.bytes_written)
+        if structure_factor_option:
+            profiler.add_bytes('structure_factor', structure_factor_sink.bytes_written)
+
+    if simulation.stop_reason is not None and log is not None:
+        log.write("\n Simulation stopped early at step {}, t = {}: {}\n".format(
+                  simulation.step, simulation.t, simulation.convergence_monitor.describe(simulation.stop_reason)))
+
+    stepper = simulation.adaptive_stepper
+    if stepper is not None and log is not None:
+        log.write("\n Adaptive time stepping: {} accepted steps ({} at dt_min), {} rejected steps, final t = {}\n".format(
+                  stepper.n_accepted, stepper.n_forced, stepper.n_rejected, simulation.t))
+
+    if profiler.enabled:
+        if log is not None:
+            profiler.print_summary(log)
+        profiler.write_report(config.get('profiling', 'report_path', fallback='./Data/profiling_report.json'))
+
+    return simulation
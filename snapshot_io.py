@@ -0,0 +1,681 @@
+import numpy as np
+import copy
+import json
+import lzma
+import os
+import queue
+import struct
+import threading
+import zlib
+
+
+def times_datasave_path(c_grid_datasave):
+    """This function returns the path of the file storing the time values of the snapshots
+    saved in binary format in c_grid_datasave, e.g. ./Data/configurations_times.npy for ./Data/configurations.npy"""
+    root, extension = os.path.splitext(c_grid_datasave)
+    return root+'_times.npy'
+
+
+class BinarySnapshotWriter:
+    """This class stores the concentration grids in a .npy file, preallocated with room for n_frames grids
+    and filled through a memory map, so that each snapshot is written as raw binary data without any conversion.
+    The time values are stored in a separate .npy file (see times_datasave_path()), whose length gives the
+    number of valid snapshots; it is rewritten every times_every snapshots, at each flush() (e.g. at each
+    checkpoint) and when the writer is closed, so that the snapshots written before a crash can be read back.
+
+    Parameters:
+    path: str
+          path of the .npy file storing the concentration grids
+    shape: tuple of ints
+           shape of a single concentration grid
+    n_frames: int
+              maximum number of snapshots that will be written
+    dtype: numpy dtype
+           floating point type used to store the grids (default np.float64, np.float32 halves the file size)
+    resume_frames: int or None
+           if given, the existing files are reopened and only their first resume_frames snapshots are kept,
+           the following ones being overwritten by the next writes (used when restarting a simulation);
+           the file is reallocated if it was preallocated for a different number of frames
+    times_every: int
+           number of snapshots between two rewrites of the time values file (default 16)"""
+
+    def __init__(self, path, shape, n_frames, dtype=np.float64, resume_frames=None, times_every=16):
+        self.path = path
+        self.times_path = times_datasave_path(path)
+        self.times_every = times_every
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.bytes_written = 0
+        if resume_frames is None:
+            self._frames = np.lib.format.open_memmap(path, mode='w+', dtype=self.dtype, shape=(n_frames,)+self.shape)
+            self._times = []
+        else:
+            self._frames = np.lib.format.open_memmap(path, mode='r+')
+            if self._frames.shape[1:] != self.shape or self._frames.dtype != self.dtype:
+                raise ValueError('Snapshot file '+path+' does not match the simulation grid, cannot resume it')
+            times = np.load(self.times_path)
+            if len(times) < resume_frames or n_frames < resume_frames:
+                raise ValueError('Snapshot file '+path+' holds less than '+str(resume_frames)+' frames, cannot resume it')
+            self._times = times[:resume_frames].tolist()
+            if self._frames.shape[0] != n_frames:
+                self._resize(n_frames, resume_frames)
+
+    def _resize(self, n_frames, kept_frames):
+        """This method reallocates the grids file with room for n_frames grids (e.g. when a restarted simulation
+        is extended), copying its first kept_frames grids one at a time through a temporary file"""
+        temporary_path = self.path+'.tmp'
+        frames = np.lib.format.open_memmap(temporary_path, mode='w+', dtype=self.dtype, shape=(n_frames,)+self.shape)
+        for i in range(kept_frames):
+            frames[i] = self._frames[i]
+        frames.flush()
+        del frames
+        self._frames = None
+        os.replace(temporary_path, self.path)
+        self._frames = np.lib.format.open_memmap(self.path, mode='r+')
+
+    def write(self, t, c):
+        """This method stores the concentration grid c, taken at time t, as the next snapshot"""
+        n = len(self._times)
+        if n >= self._frames.shape[0]:
+            raise ValueError('Snapshot file '+self.path+' is full: '+str(n)+' frames were preallocated')
+        self._frames[n] = c
+        self._times.append(t)
+        self.bytes_written += self._frames[n].nbytes
+        if len(self._times) % self.times_every == 0:
+            self._save_times()
+
+    def _save_times(self):
+        """This method rewrites the time values file through a temporary file, so that an interrupted write
+        never leaves it corrupted"""
+        temporary_path = self.times_path+'.tmp'
+        with open(temporary_path, 'wb') as f:
+            np.save(f, np.array(self._times, dtype=np.float64))
+        os.replace(temporary_path, self.times_path)
+
+    def flush(self):
+        """This method flushes the memory map to disk and rewrites the time values file"""
+        self._frames.flush()
+        self._save_times()
+
+    def close(self):
+        """This method flushes all the data to disk and releases the memory map"""
+        if self._frames is not None:
+            self.flush()
+            self._frames = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class TextSnapshotWriter:
+    """This class stores the concentration grids in a text file, one line per snapshot, starting with the time
+    value followed by the concentration of each subcell (row by row). The first line of the file holds the
+    column names, Time c_0_0 c_0_1 ... with the indices of each subcell (c_0_0_0 c_0_0_1 ... for a 3D grid),
+    so that the last column name gives the shape of the grid
+
+    Parameters:
+    path: str
+          path of the text file storing the concentration grids
+    shape: tuple of ints
+           shape of a single concentration grid
+    resume_frames: int or None
+           if given, the existing file is reopened and only its first resume_frames snapshots are kept,
+           new snapshots being appended after them (used when restarting a simulation)"""
+
+    def __init__(self, path, shape, resume_frames=None):
+        self.path = path
+        self.shape = tuple(shape)
+        self.bytes_written = 0
+        if resume_frames is not None:
+            truncate_text_file(path, resume_frames+1)
+            self._file = open(path, "a")
+            return
+        self._file = open(path, "w")
+        column_names_string = ["Time"] + ['c_'+'_'.join(map(str, index)) for index in np.ndindex(*self.shape)]
+        self._file.write(' '.join(column_names_string)+' \n')
+
+    def write(self, t, c):
+        """This method writes the concentration grid c, taken at time t, as a new line of the file
+        (single precision grids are written with the shortest representation of their float32 values)"""
+        values = np.ravel(c)
+        values = values.tolist() if values.dtype == np.float64 else values
+        config_data_string = ' '.join([str(t)] + [str(value) for value in values]) + ' \n'
+        self._file.write(config_data_string)
+        self.bytes_written += len(config_data_string)
+
+    def flush(self):
+        """This method flushes the written lines to disk"""
+        self._file.flush()
+
+    def close(self):
+        """This method closes the text file"""
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class AsyncSnapshotWriter:
+    """This class wraps a snapshot writer (BinarySnapshotWriter or TextSnapshotWriter) with a background thread,
+    so that the conversion and the disk writes of the snapshots overlap with the computation of the next time steps.
+    Each grid passed to write() is copied into one of max_queue+1 recycled buffers and handed to the writer thread
+    through a bounded queue: when all the buffers are waiting to be written, write() blocks until the writer thread
+    releases one (backpressure), so that the memory used never grows beyond max_queue+1 grids.
+    An error raised in the writer thread is stored and raised again by the next call of write(), flush() or close(),
+    so that the simulation is aborted instead of silently losing snapshots.
+
+    Parameters:
+    writer: BinarySnapshotWriter or TextSnapshotWriter
+            writer performing the actual writes, only accessed by the writer thread until close()
+    max_queue: int, >=1
+            maximum number of snapshots waiting to be written"""
+
+    _FLUSH = 'flush'
+
+    def __init__(self, writer, max_queue=4):
+        if max_queue < 1:
+            raise ValueError('The snapshot queue must hold at least one snapshot, check the config.txt file description')
+        self.writer = writer
+        self.max_queue = max_queue
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._free_buffers = queue.Queue()
+        self._n_buffers = 0
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._write_loop, name='snapshot-writer', daemon=True)
+        self._thread.start()
+
+    def _write_loop(self):
+        #body of the writer thread: after an error, the queue is still drained (without writing)
+        #so that the computing thread never blocks on a full queue
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is None:
+                    if item is self._FLUSH:
+                        self.writer.flush()
+                    else:
+                        self.writer.write(*item)
+            except BaseException as error:
+                self._error = error
+            finally:
+                if item is not None and item is not self._FLUSH:
+                    self._free_buffers.put(item[1])
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise RuntimeError('The snapshot writer thread failed: '+repr(self._error)) from self._error
+
+    def _buffer(self, c):
+        #reuse a buffer released by the writer thread, allocating a new one only while less than max_queue+1 exist
+        try:
+            buffer = self._free_buffers.get_nowait()
+        except queue.Empty:
+            if self._n_buffers <= self.max_queue:
+                self._n_buffers += 1
+                return np.empty_like(c)
+            buffer = self._free_buffers.get()
+        if buffer.shape != np.shape(c) or buffer.dtype != np.asarray(c).dtype:
+            buffer = np.empty_like(c)
+        return buffer
+
+    def write(self, t, c):
+        """This method copies the concentration grid c, taken at time t, and queues it for writing,
+        blocking while max_queue snapshots are already waiting"""
+        self._raise_error()
+        buffer = self._buffer(c)
+        np.copyto(buffer, c)
+        self._queue.put((t, buffer))
+
+    def flush(self):
+        """This method waits until all the queued snapshots are written, then flushes the writer to disk"""
+        self._raise_error()
+        self._queue.put(self._FLUSH)
+        self._queue.join()
+        self._raise_error()
+
+    @property
+    def bytes_written(self):
+        return self.writer.bytes_written
+
+    def close(self):
+        """This method writes the queued snapshots, stops the writer thread and closes the writer"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self.writer.close()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+        #the run is already failing: release the resources without masking the original exception
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+#first bytes of the compressed snapshot files, followed by the length of the JSON header and the header itself
+COMPRESSED_MAGIC = b'CHSNAPZ1'
+
+#header of each chunk of the compressed snapshot files: size of the compressed data and number of frames
+CHUNK_HEADER = struct.Struct('<QI')
+
+COMPRESSIONS = {'zlib': (zlib.compress, zlib.decompress),
+                'lzma': (lzma.compress, lzma.decompress),
+                'none': (bytes, bytes)}
+
+
+def quantization_levels(tolerance):
+    """This function returns the number of levels used to quantize concentrations in [0, 1] with a maximum error
+    of tolerance, together with the smallest unsigned integer type holding them
+
+    Parameters:
+    tolerance: float, >0.
+               maximum absolute error on the stored concentrations
+
+    Returns:
+    levels: int
+            number of equally spaced quantization levels between 0 and 1
+    dtype: numpy dtype
+           uint8 or uint16 (little endian)
+
+    Raise:
+        ValueError if the tolerance is not positive or too small to be stored in 16 bits"""
+
+    if not tolerance > 0.:
+        raise ValueError('The quantization tolerance must be positive, check the config.txt file description')
+    #rounding to the nearest of levels equally spaced values gives an error of at most 0.5/(levels-1)
+    levels = int(np.ceil(0.5/tolerance)) + 1
+    if levels <= 2**8:
+        return levels, np.dtype('u1')
+    if levels <= 2**16:
+        return levels, np.dtype('<u2')
+    raise ValueError('The quantization tolerance must be at least '+str(0.5/(2**16-1))+', check the config.txt file description')
+
+
+def _read_compressed_header(f, path):
+    #read the JSON header at the beginning of a compressed snapshot file, leaving f at the first chunk
+    if f.read(len(COMPRESSED_MAGIC)) != COMPRESSED_MAGIC:
+        raise ValueError('File '+path+' is not a compressed snapshot file')
+    header_length, = struct.unpack('<I', f.read(4))
+    return json.loads(f.read(header_length).decode())
+
+
+def _scan_chunks(f):
+    #return offset, compressed size and number of frames of each complete chunk, starting from the current position
+    chunks = []
+    while True:
+        offset = f.tell()
+        record = f.read(CHUNK_HEADER.size)
+        if len(record) < CHUNK_HEADER.size:
+            return chunks
+        size, n = CHUNK_HEADER.unpack(record)
+        f.seek(size, os.SEEK_CUR)
+        if f.tell() > os.fstat(f.fileno()).st_size:   #chunk truncated by an interrupted write
+            return chunks
+        chunks.append((offset, size, n))
+
+
+def _decode_chunk(data, header, n):
+    #decompress a chunk and invert the delta encoding, returning its quantized frames
+    decompress = COMPRESSIONS[header['compression']][1]
+    frames = np.frombuffer(decompress(data), dtype=np.dtype(header['dtype'])).reshape((n,)+tuple(header['shape']))
+    if header['delta']:
+        #differences are taken modulo 2**bits, so the cumulative sum in the same type restores the frames
+        frames = np.cumsum(frames, axis=0, dtype=frames.dtype)
+    return frames
+
+
+class CompressedSnapshotWriter:
+    """This class stores the concentration grids in a compact archival file. Since the integrators clip the
+    concentration to [0, 1], each value is quantized to one of the levels equally spaced between 0 and 1
+    allowed by the tolerance (uint8 for tolerance >= 0.002, uint16 down to about 8e-6). The quantized frames are
+    grouped in chunks of chunk_frames frames, optionally delta encoded (each frame stored as its difference from the
+    previous one in the chunk, which compresses much better once the microstructure evolves slowly) and compressed
+    with zlib or lzma. Each chunk only depends on its own frames, so that frames can be decoded lazily
+    (see CompressedSnapshotReader). The time values are stored in a separate .npy file (see times_datasave_path()),
+    rewritten at each flush(); flush() also writes the frames of the incomplete chunk as a shorter chunk.
+
+    Parameters:
+    path: str
+          path of the compressed snapshot file
+    shape: tuple of ints
+           shape of a single concentration grid
+    tolerance: float, >0.
+           maximum absolute error on the stored concentrations
+    delta: bool
+           if True, frames are delta encoded inside each chunk
+    compression: str
+           'zlib', 'lzma' or 'none'
+    chunk_frames: int, >=1
+           number of frames compressed together
+    resume_frames: int or None
+           if given, the existing files are reopened and only their first resume_frames snapshots are kept,
+           new snapshots being appended after them (used when restarting a simulation)"""
+
+    def __init__(self, path, shape, tolerance=1e-4, delta=True, compression='zlib', chunk_frames=16, resume_frames=None):
+        if compression not in COMPRESSIONS:
+            raise ValueError('Unknown compression '+repr(compression)+', valid options are: '+', '.join(COMPRESSIONS))
+        if chunk_frames < 1:
+            raise ValueError('chunk_frames must be an integer >=1, check the config.txt file description')
+        self.path = path
+        self.times_path = times_datasave_path(path)
+        self.shape = tuple(shape)
+        self.levels, self.quantized_dtype = quantization_levels(tolerance)
+        self.header = {'shape': list(self.shape), 'levels': self.levels, 'dtype': self.quantized_dtype.str,
+                       'delta': bool(delta), 'compression': compression}
+        self.chunk_frames = chunk_frames
+        self.bytes_written = 0
+        self._compress = COMPRESSIONS[compression][0]
+        self._pending = []
+        if resume_frames is None:
+            self._file = open(path, 'wb')
+            header = json.dumps(self.header).encode()
+            self._file.write(COMPRESSED_MAGIC + struct.pack('<I', len(header)) + header)
+            self.bytes_written += len(COMPRESSED_MAGIC) + 4 + len(header)
+            self._times = []
+            return
+        self._file = open(path, 'r+b')
+        if _read_compressed_header(self._file, path) != self.header:
+            self._file.close()
+            raise ValueError('Snapshot file '+path+' does not match the simulation grid and settings, cannot resume it')
+        times = np.load(self.times_path)
+        if len(times) < resume_frames:
+            self._file.close()
+            raise ValueError('Snapshot file '+path+' holds less than '+str(resume_frames)+' frames, cannot resume it')
+        self._times = times[:resume_frames].tolist()
+        #keep the chunks before resume_frames; the frames kept from the chunk holding it are written again
+        first_frame = 0
+        end = self._file.tell()
+        for offset, size, n in _scan_chunks(self._file):
+            if first_frame + n > resume_frames:
+                self._file.seek(offset + CHUNK_HEADER.size)
+                frames = _decode_chunk(self._file.read(size), self.header, n)
+                self._pending = list(frames[:resume_frames-first_frame])
+                end = offset
+                break
+            first_frame += n
+            end = offset + CHUNK_HEADER.size + size
+        self._file.seek(end)
+        self._file.truncate()
+
+    def quantize(self, c):
+        """This method returns the concentration grid c quantized to the integer levels of the file"""
+        return np.rint(np.clip(c, 0., 1.)*(self.levels-1)).astype(self.quantized_dtype)
+
+    def _write_chunk(self):
+        #encode and compress the pending frames as a new chunk
+        frames = np.stack(self._pending)
+        if self.header['delta']:
+            frames[1:] = frames[1:] - frames[:-1]
+        data = self._compress(frames.tobytes())
+        self._file.write(CHUNK_HEADER.pack(len(data), len(frames)) + data)
+        self.bytes_written += CHUNK_HEADER.size + len(data)
+        self._pending = []
+
+    def write(self, t, c):
+        """This method quantizes the concentration grid c, taken at time t, and adds it to the current chunk,
+        which is compressed and written once it holds chunk_frames frames"""
+        self._pending.append(self.quantize(c))
+        self._times.append(t)
+        if len(self._pending) >= self.chunk_frames:
+            self._write_chunk()
+
+    def flush(self):
+        """This method writes the frames of the incomplete chunk and the time values, and flushes the file to disk"""
+        if self._pending:
+            self._write_chunk()
+        self._file.flush()
+        np.save(self.times_path, np.array(self._times, dtype=np.float64))
+
+    def close(self):
+        """This method flushes all the data to disk and closes the file"""
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class LazySnapshotFrames:
+    """This class is the base of the snapshot readers giving array-like access to the frames of a file, reading
+    from disk only the requested ones, so that the memory used does not depend on the length of the run.
+    Indexing with an integer returns a grid of type dtype, indexing with a slice returns the stacked grids;
+    frames[:, index] returns a reader applying index to each frame (e.g. to select a replica of an ensemble).
+    Subclasses set n_frames, frame_shape and dtype (float64 by default) and implement _read_frame(i)."""
+
+    dtype = np.dtype(np.float64)
+    _frame_index = ()
+
+    def __len__(self):
+        return self.n_frames
+
+    @property
+    def shape(self):
+        #shape of the indexed frames, computed on a broadcast scalar to avoid allocating a frame
+        return (self.n_frames,) + np.broadcast_to(np.uint8(0), self.frame_shape)[self._frame_index].shape
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def _frame(self, i):
+        if i < 0:
+            i += self.n_frames
+        if not 0 <= i < self.n_frames:
+            raise IndexError('Frame '+str(i)+' out of range for '+str(self.n_frames)+' frames')
+        return self._read_frame(i)[self._frame_index]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        frame_key, index = key[0], key[1:]
+        if isinstance(frame_key, slice):
+            if frame_key == slice(None) and index:
+                if self._frame_index:
+                    raise IndexError('Frames of a snapshot reader can be indexed only once')
+                frames = copy.copy(self)
+                frames._frame_index = index
+                return frames
+            return np.stack([self._frame(i)[index] for i in range(*frame_key.indices(self.n_frames))])
+        return self._frame(int(frame_key))[index]
+
+    def __iter__(self):
+        for i in range(self.n_frames):
+            yield self._frame(i)
+
+    def __array__(self, dtype=None, copy=None):
+        #conversion to a numpy array reads all the frames
+        frames = self[:]
+        return frames if dtype is None else frames.astype(dtype)
+
+
+class CompressedSnapshotReader(LazySnapshotFrames):
+    """This class gives array-like access to the frames of a file written by CompressedSnapshotWriter, decoding
+    only the chunks holding the requested frames (the last decoded chunk is kept, so that consecutive frames
+    are decoded once). See LazySnapshotFrames for the indexing.
+
+    Parameters:
+    path: str
+          path of the compressed snapshot file
+    n_frames: int or None
+          number of valid frames (e.g. the number of stored time values); by default all the complete chunks
+    dtype: numpy floating point type
+          type of the decoded grids (default np.float64)"""
+
+    def __init__(self, path, n_frames=None, dtype=np.float64):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        with open(path, 'rb') as f:
+            self.header = _read_compressed_header(f, path)
+            self._chunks = _scan_chunks(f)
+        self._starts = np.cumsum([0] + [n for offset, size, n in self._chunks])
+        self.n_frames = int(self._starts[-1]) if n_frames is None else min(int(n_frames), int(self._starts[-1]))
+        self.frame_shape = tuple(self.header['shape'])
+        self._cached_chunk = None
+        self._cached_frames = None
+
+    def _read_frame(self, i):
+        #decode (or take from the cache) the chunk holding frame i and dequantize the frame
+        chunk = int(np.searchsorted(self._starts, i, side='right')) - 1
+        if chunk != self._cached_chunk:
+            offset, size, n = self._chunks[chunk]
+            with open(self.path, 'rb') as f:
+                f.seek(offset + CHUNK_HEADER.size)
+                self._cached_frames = _decode_chunk(f.read(size), self.header, n)
+            self._cached_chunk = chunk
+        return (self._cached_frames[i - self._starts[chunk]]/(self.header['levels']-1.)).astype(self.dtype, copy=False)
+
+
+class TextSnapshotReader(LazySnapshotFrames):
+    """This class gives array-like access to the frames of a file written by TextSnapshotWriter. The file is
+    scanned once, line by line, to store the time value and the byte offset of each line; a frame is then read
+    by seeking to its line and parsing it, so that the file is never fully loaded in memory.
+    See LazySnapshotFrames for the indexing.
+
+    Parameters:
+    path: str
+          path of the text file storing the concentration grids
+    dtype: numpy floating point type
+          type of the parsed grids (default np.float64)"""
+
+    def __init__(self, path, dtype=np.float64):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        offsets = []
+        times = []
+        with open(path, 'rb') as f:
+            #the header holds the column names: Time followed by one column per subcell, the last one
+            #holding the largest index along each axis of the grid (e.g. c_3_7 for a 4-by-8 grid)
+            header = f.readline()
+            offset = len(header)
+            frame_shape = tuple(int(index)+1 for index in header.split()[-1].split(b'_')[1:])
+            for line in f:
+                if not line.endswith(b'\n'):   #line truncated by an interrupted write
+                    break
+                offsets.append(offset)
+                times.append(float(line.split(None, 1)[0]))
+                offset += len(line)
+        self.frame_shape = frame_shape
+        self.n_frames = len(offsets)
+        self.times = np.array(times, dtype=np.float64)
+        self._offsets = offsets
+
+    def _read_frame(self, i):
+        with open(self.path, 'rb') as f:
+            f.seek(self._offsets[i])
+            values = f.readline().split()[1:]
+        return np.array(values, dtype=self.dtype).reshape(self.frame_shape)
+
+
+def truncate_text_file(path, n_lines):
+    """This function truncates a text file after its first n_lines lines, 
+    reading the file line by line so that it is never fully loaded in memory
+
+    Parameters:
+    path: str
+          path of the text file
+    n_lines: int
+          number of lines to keep
+
+    Raise:
+        ValueError if the file has less than n_lines lines"""
+
+    with open(path, "rb+") as f:
+        for l in range(n_lines):
+            if not f.readline():
+                raise ValueError('File '+path+' has less than '+str(n_lines)+' lines, cannot resume it')
+        f.truncate(f.tell())
+
+
+def open_snapshot_writer(path, output_format, shape, n_frames, dtype=np.float64, resume_frames=None, async_queue=0,
+                         compressed_options=None):
+    """This function returns the writer storing the simulated concentration grids in the chosen format
+
+    Parameters:
+    path: str
+          path of the file storing the concentration grids
+    output_format: str
+                   either 'binary' (.npy file filled through a memory map), 'text' (one line per snapshot)
+                   or 'compressed' (quantized and compressed chunks, see CompressedSnapshotWriter)
+    shape: tuple of ints
+           shape of a single concentration grid
+    n_frames: int
+              maximum number of snapshots that will be written
+    dtype: numpy dtype
+           floating point type used to store the grids in binary format
+    resume_frames: int or None
+           if given, the existing file is reopened keeping only its first resume_frames snapshots
+    async_queue: int
+           if >0, the writer is wrapped in an AsyncSnapshotWriter writing from a background thread,
+           with at most async_queue snapshots waiting to be written
+    compressed_options: dict or None
+           keyword arguments of CompressedSnapshotWriter (tolerance, delta, compression, chunk_frames)
+
+    Returns:
+    writer: BinarySnapshotWriter, TextSnapshotWriter, CompressedSnapshotWriter or AsyncSnapshotWriter"""
+
+    if output_format == 'binary':
+        writer = BinarySnapshotWriter(path, shape, n_frames, dtype, resume_frames)
+    elif output_format == 'text':
+        writer = TextSnapshotWriter(path, shape, resume_frames)
+    elif output_format == 'compressed':
+        options = {} if compressed_options is None else compressed_options
+        writer = CompressedSnapshotWriter(path, shape, resume_frames=resume_frames, **options)
+    else:
+        raise ValueError('Unknown output format '+repr(output_format)+', valid options are: binary, text, compressed')
+    return AsyncSnapshotWriter(writer, async_queue) if async_queue > 0 else writer
+
+
+def load_snapshots(path, output_format, dtype=np.float64):
+    """This function opens the concentration grids stored by the snapshot writers for streaming access:
+    binary files are memory mapped, while text and compressed files are read through a LazySnapshotFrames reader,
+    so that only the snapshots actually accessed are read from disk and the memory used does not grow with the run.
+
+    Parameters:
+    path: str
+          path of the file storing the concentration grids
+    output_format: str
+                   either 'binary', 'text' or 'compressed'
+    dtype: numpy floating point type
+           type of the grids read from text and compressed files (binary files keep the stored type)
+
+    Returns:
+    times: 1D array of floats
+           time value of each snapshot
+    frames: 3D array-like of floats (n_frames, Ny, Nx)
+            concentration grids, as a read-only memory map for the binary format, as a TextSnapshotReader
+            for the text format and as a CompressedSnapshotReader for the compressed format"""
+
+    if output_format == 'binary':
+        times = np.load(times_datasave_path(path))
+        frames = np.load(path, mmap_mode='r')[:len(times)]
+        return times, frames
+    if output_format == 'text':
+        frames = TextSnapshotReader(path, dtype)
+        return frames.times, frames
+    if output_format == 'compressed':
+        times = np.load(times_datasave_path(path))
+        return times, CompressedSnapshotReader(path, len(times), dtype)
+    raise ValueError('Unknown output format '+repr(output_format)+', valid options are: binary, text, compressed')
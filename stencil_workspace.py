@@ -0,0 +1,268 @@
+import numpy as np
+from functools import lru_cache
+from chemical_potential_free_energy import parameter_as_dtype
+from concentration_laplacian import grid_spacings, check_boundary
+
+
+#size in bytes of the CPU cache holding the blocks processed at once: the level 2 cache of the first CPU on Linux,
+#or 1 MB if it cannot be read
+def _cache_size(default=2**20):
+    try:
+        with open('/sys/devices/system/cpu/cpu0/cache/index2/size') as f:
+            size = f.read().strip()
+        return int(size[:-1])*1024 if size.endswith('K') else int(size)
+    except (OSError, ValueError):
+        return default
+
+CACHE_SIZE = _cache_size()
+
+#number of block-sized buffers touched while a block is processed: the padded concentration (with the rows
+#reached by the stencils), the auxiliary grid and the two scratch buffers
+_BLOCK_BUFFERS = 8
+
+
+class CahnHilliardWorkspace:
+    """This class holds the preallocated buffers needed to perform explicit time integration steps
+    of the Cahn-Hilliard equation without allocating new full-grid arrays at each step.
+    The concentration grid is copied in a buffer padded with a 2-cells halo, filled according to the
+    periodic (or neumann, mirroring the edge cells) boundary conditions. The padded buffer is processed as a
+    flat array: the neighbours along each grid axis are at a fixed distance in memory (1 along x, one padded row
+    along y, one padded xy plane along z), so that all the shifted grids needed by the finite difference stencils
+    are contiguous slices of the same buffer, and each operation runs on contiguous memory. The step is split
+    in two 5-point (7-point in 3D) laplacians: w = mu(c) - 2k*lap(c) is computed in an auxiliary padded grid
+    just ahead of the block of c updated by c += dt*M*lap(w), so that each block is computed while its data
+    is still in the CPU cache. The cells of the halo along the inner axes receive meaningless values, which are
+    never used by the cells of the grid.
+
+    Parameters:
+    shape: tuple of ints (Ny, Nx), or (B, Ny, Nx) for a batch of B microstructures
+           ((Nz, Ny, Nx), or (B, Nz, Ny, Nx), for 3D microstructures)
+           shape of the concentration grid, all grid dimensions must be at least =2
+    dx, dy: floats, >0.
+           dimensions in x and y direction of a concentration subcell
+    dtype: numpy dtype
+           floating point type of the buffers (default np.float64)
+    block_size: int or None
+           number of elements of the padded grid processed at once (per microstructure of the batch);
+           default: the number of elements whose buffers fit in the CPU cache (see CACHE_SIZE)
+    dz: float or None
+           dimension in z direction of a concentration subcell, None (default) for 2D microstructures
+    boundary: str
+           boundary conditions, 'periodic' (default) or 'neumann'"""
+
+    halo = 2
+
+    def __init__(self, shape, dx, dy, dtype=np.float64, block_size=None, dz=None, boundary='periodic'):
+
+        #check validity of input parameters
+        spacings = grid_spacings(dx, dy, dz)
+        if any(d <= 0. for d in spacings):
+            raise ValueError('dx, dy and dz parameters must be positive, check the config.txt file description')
+        check_boundary(boundary)
+        n_axes = len(spacings)
+        batch_shape = tuple(shape[:-n_axes])
+        grid_shape = tuple(shape[-n_axes:])
+        if len(grid_shape) < n_axes or min(grid_shape) < 2:
+            raise ValueError('All the dimensions of the lattice must be > 1.')
+
+        self.shape = batch_shape+grid_shape
+        self.grid_shape = grid_shape
+        self.dx = dx
+        self.dy = dy
+        self.dz = dz
+        self.spacings = spacings
+        self.boundary = boundary
+        self.dtype = np.dtype(dtype)
+
+        h = self.halo
+        self.padded_shape = tuple(n+2*h for n in grid_shape)
+        n_batch = int(np.prod(batch_shape))
+        #distance in the flat padded grid of the neighbours along the grid axes ((y, x) in 2D, (z, y, x) in 3D)
+        self.strides = tuple(int(np.prod(self.padded_shape[axis+1:])) for axis in range(n_axes))
+        if block_size is None:
+            block_size = CACHE_SIZE//(_BLOCK_BUFFERS*n_batch*self.dtype.itemsize)
+        self.block_size = max(1, block_size)
+        #flat padded concentration, auxiliary grid w = mu - 2k*lap(c) and chemical potential, one row per microstructure
+        size = int(np.prod(self.padded_shape))
+        self._c_padded = np.empty((n_batch, size), dtype=self.dtype)
+        self._w = np.empty((n_batch, size), dtype=self.dtype)
+        self._mu_padded = None
+        self._scratch = np.empty((n_batch, self.block_size), dtype=self.dtype)
+        self._increment = np.empty((n_batch, self.block_size), dtype=self.dtype)
+
+    def _grid(self, flat):
+        """This method returns the view of a flat padded buffer with the shape batch + padded grid"""
+        return flat.reshape(self.shape[:len(self.shape)-len(self.grid_shape)]+self.padded_shape)
+
+    def _fill_halo(self, padded):
+        """This method fills the halo of a padded buffer with the values at the opposite edge of the grid,
+        to simulate a periodic structure of unit cell equal to the simulated microstructure, or, for neumann
+        boundary conditions, with the mirror image of the cells at the same edge. The halos are
+        filled one axis at a time, copying whole slabs, so that the edges and corners are filled too"""
+        h = self.halo
+        for axis in range(-len(self.grid_shape), 0):
+            def slab(start, stop, step=None):
+                index = [slice(None)]*(-axis)
+                index[0] = slice(start, stop, step)
+                return (Ellipsis,)+tuple(index)
+            if self.boundary == 'neumann':
+                padded[slab(0, h)] = padded[slab(2*h-1, h-1, -1)]
+                padded[slab(-h, None)] = padded[slab(-h-1, -2*h-1, -1)]
+            else:
+                padded[slab(0, h)] = padded[slab(-2*h, -h)]
+                padded[slab(-h, None)] = padded[slab(h, 2*h)]
+
+    def _per_grid(self, value):
+        """This method reshapes a parameter of shape (B, 1, 1) (one more axis in 3D) to shape (B, 1),
+        to broadcast it against the rows of the flat buffers"""
+        if np.ndim(value) >= len(self.grid_shape):
+            return np.reshape(value, (-1, 1))
+        return value
+
+    def _auxiliary_block(self, lo, hi, A, factor, mu_padded):
+        """This method computes w = mu(c) - 2k*lap(c) at the elements [lo, hi) of the flat padded grid; the
+        chemical potential 2A*(c*(1-c)^2 - c^2*(1-c)) = 2A*c*(1-c)*(1-2c) is computed with the same operations
+        of chemical_potential(), unless it is given in mu_padded"""
+        c = self._c_padded[:, lo:hi]
+        w = self._w[:, lo:hi]
+        scratch = self._scratch[:, :hi-lo]
+        if mu_padded is None:
+            np.subtract(1, c, out=scratch)
+            np.multiply(scratch, c, out=scratch)
+            np.multiply(c, -2, out=w)
+            w += 1
+            w *= scratch
+            w *= 2*A
+        else:
+            w[...] = mu_padded[:, lo:hi]
+        #-2k*lap(c): the center term, then the two neighbours along each axis
+        np.multiply(c, -2*factor*sum(1/(d*d) for d in self.spacings), out=scratch)
+        w += scratch
+        for stride, d in zip(self.strides, self.spacings[::-1]):
+            np.add(self._c_padded[:, lo-stride:hi-stride], self._c_padded[:, lo+stride:hi+stride], out=scratch)
+            scratch *= factor/(d*d)
+            w += scratch
+
+    def step(self, c, A, k, M, dt, chem_potential=None):
+        """This method performs one explicit time integration step of the Cahn-Hilliard equation,
+        updating the concentration grid c in place:
+        c(t+dt) = c(t) + dt*M*lap(mu(c) - 2k*lap(c))
+
+        Parameters:
+        c: array of floats with the shape and dtype of the workspace
+           concentration grid, overwritten with the updated values
+        A: float, not <0. (or array of shape (B, 1, 1) with a value per microstructure)
+           multiplicative constant of chemical potential
+        k: float, not <0. (or array of shape (B, 1, 1) with a value per microstructure)
+           gradient coefficient
+        M: float, not <0. (or array of shape (B, 1, 1) with a value per microstructure)
+           mobility of the concentration's particles
+        dt: float, not <0.
+            time step for time integration
+        chem_potential: array of floats with the shape of the workspace, or None
+            chemical potential of c, if already computed (e.g. by fused_diagnostics()), which is copied 
+            in a padded buffer instead of being computed again
+
+        Returns:
+        c: array of floats
+           the same array given as input, updated according to Cahn-Hilliard equation"""
+
+        if np.any(np.asarray(M)<0.) or np.any(np.asarray(dt)<0.):
+            raise ValueError('M and dt parameters cannot be negative, check again the config.txt file description')
+        if np.any(np.asarray(A)<0.) or np.any(np.asarray(k)<0.):
+            raise ValueError('A and k parameters cannot be negative, check again the config.txt file description')
+        if np.shape(c) != self.shape:
+            raise ValueError('Concentration grid of shape '+str(np.shape(c))+' does not match workspace shape '+str(self.shape))
+        #parameters in the floating point type of the buffers, so that operations are not performed in float64
+        A, k, M, dt = [self._per_grid(parameter_as_dtype(value, self.dtype)) for value in (A, k, M, dt)]
+
+        h = self.halo
+        n_axes = len(self.grid_shape)
+        interior = (Ellipsis,)+(slice(h, -h),)*n_axes
+        c_padded = self._grid(self._c_padded)
+
+        #copy concentration grid in the padded buffer and apply the boundary conditions;
+        #the chemical potential is pointwise, so its halo already satisfies them
+        c_padded[interior] = c
+        self._fill_halo(c_padded)
+        mu_padded = None
+        if chem_potential is not None:
+            if self._mu_padded is None:
+                self._mu_padded = np.empty_like(self._c_padded)
+            mu_padded = self._mu_padded
+            self._grid(mu_padded)[interior] = chem_potential
+            self._fill_halo(self._grid(mu_padded))
+
+        #w is needed one cell (one row, one plane in 3D) around the updated cells, and it is computed up to
+        #w_end just before each block is updated: the new values of c written in the padded buffer are below
+        #the elements still read by the following w blocks
+        outer = self.strides[0]
+        w_end = outer
+        dtM = dt*M
+        center_weight = -2*dtM*sum(1/(d*d) for d in self.spacings)
+        for lo in range(h*outer, (self.padded_shape[0]-h)*outer, self.block_size):
+            hi = min(lo+self.block_size, (self.padded_shape[0]-h)*outer)
+            while w_end < hi+outer:
+                w_block_end = min(w_end+self.block_size, hi+outer)
+                self._auxiliary_block(w_end, w_block_end, A, -2*k, mu_padded)
+                w_end = w_block_end
+            #increment dt*M*lap(w): the center term, then the two neighbours along each axis
+            increment = self._increment[:, :hi-lo]
+            scratch = self._scratch[:, :hi-lo]
+            np.multiply(self._w[:, lo:hi], center_weight, out=increment)
+            for stride, d in zip(self.strides, self.spacings[::-1]):
+                np.add(self._w[:, lo-stride:hi-stride], self._w[:, lo+stride:hi+stride], out=scratch)
+                scratch *= dtM/(d*d)
+                increment += scratch
+            #update concentration block in place and make sure it is physical
+            c_block = self._c_padded[:, lo:hi]
+            c_block += increment
+            np.clip(c_block, 0, 1, out=c_block)
+
+        c[...] = c_padded[interior]
+        return c
+
+
+@lru_cache(maxsize=8)
+def _workspace(shape, dtype, dx, dy, dz, boundary):
+    """This function returns the workspace of the given grid geometry, dtype and boundary conditions, allocated
+    at the first request and kept for the following ones (the least recently used of more than 8 are released)"""
+    return CahnHilliardWorkspace(shape, dx, dy, dtype=dtype, dz=dz, boundary=boundary)
+
+
+def Cahn_Hilliard_inplace_integration(c, A, k, dx, dy, M, dt, chem_potential=None, dz=None, boundary='periodic'):
+    """This function performs explicit time integration of the Cahn-Hilliard equation with the same
+    discretization as Cahn_Hilliard_equation_integration(), but updating the concentration grid in place
+    through a CahnHilliardWorkspace, which is allocated at the first call and reused for all the following
+    calls with the same grid shape, dtype, dx, dy, dz and boundary conditions.
+
+    Parameters:
+    c: N-by-N 2D array of floats, or array of shape (B, N, N) for a batch of B microstructures
+       (N-by-N-by-N, or (B, N, N, N), for a 3D microstructure)
+       input configuration, updated in place if it is a floating point numpy array
+    A: float, not <0. (or array of shape (B, 1, 1) with a value per microstructure)
+       multiplicative constant of chemical potential
+    k: float, not <0. (or array of shape (B, 1, 1) with a value per microstructure)
+       gradient coefficient
+    dx, dy: floats, not <0. nor = 0.
+           dimensions in x and y direction of a concentration subcell
+    M: float, not <0. (or array of shape (B, 1, 1) with a value per microstructure)
+       mobility of the concentration's particles
+    dt: float, not <0.
+        time step for time integration
+    chem_potential: array of same shape of c, or None
+        chemical potential of c, if already computed (e.g. by fused_diagnostics())
+    dz: float or None
+        dimension in z direction of a concentration subcell, None (default) for a 2D microstructure
+    boundary: str
+        boundary conditions, 'periodic' (default) or 'neumann'
+
+    Returns:
+    c_updated: array of same shape of c
+              concentration values updated according to Cahn-Hilliard equation"""
+
+    if not (isinstance(c, np.ndarray) and np.issubdtype(c.dtype, np.floating)):
+        c = np.array(c, dtype=np.float64)
+
+    workspace = _workspace(np.shape(c), c.dtype, float(dx), float(dy), None if dz is None else float(dz), boundary)
+    return workspace.step(c, A, k, M, dt, chem_potential)
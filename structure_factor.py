@@ -0,0 +1,111 @@
+import numpy as np
+from concentration_laplacian import grid_spacings
+
+
+class StructureFactorAnalyzer:
+    """This class computes the radially averaged structure factor S(k) of concentration grids and the quantities
+    describing the coarsening of the microstructure: the first moment k1 of S(k), the characteristic domain
+    length L = 2*pi/k1 and the interface area. The radial bin of each wave vector of the real FFT of the grid,
+    and the number of wave vectors of each bin, are computed once, so that each analysis only needs an FFT
+    and two bincounts. Wave vectors are binned by rounding |k| to a multiple of the smallest wave number
+    of the grid, dk = 2*pi/max(Nx*dx, Ny*dy); the bin 0 (k = 0, the average concentration) is excluded.
+    For a 3D microstructure (dz given) the wave vectors have three components, and the area is the volume.
+
+    Parameters:
+    shape: tuple of ints
+           shape (Ny, Nx) of the concentration grid, or (B, Ny, Nx) for a batch of microstructures
+           ((Nz, Ny, Nx), or (B, Nz, Ny, Nx), for 3D microstructures)
+    dx, dy: floats, >0.
+           subcell sizes along x and y
+    dz: float or None
+           subcell size along z, None (default) for 2D microstructures"""
+
+    def __init__(self, shape, dx, dy, dz=None):
+        self.shape = tuple(shape)
+        spacings = grid_spacings(dx, dy, dz)
+        self.grid_axes = tuple(range(-len(spacings), 0))
+        #grid sizes and lengths along x, y (, z)
+        sizes = self.shape[::-1][:len(spacings)]
+        lengths = [n*d for n, d in zip(sizes, spacings)]
+        Nx, Ny = sizes[:2]
+        self.area = Nx*dx*Ny*dy if dz is None else Nx*dx*Ny*dy*sizes[2]*dz
+        self.n_cells = int(np.prod(sizes))
+        kx = 2.*np.pi*np.fft.rfftfreq(Nx, dx)
+        ky = 2.*np.pi*np.fft.fftfreq(Ny, dy)
+        self.dk = 2.*np.pi/max(lengths)
+        k_squared = ky[:, None]**2 + kx[None, :]**2
+        if dz is not None:
+            kz = 2.*np.pi*np.fft.fftfreq(sizes[2], dz)
+            k_squared = kz[:, None, None]**2 + k_squared
+        bins = np.rint(np.sqrt(k_squared)/self.dk).astype(np.intp)
+        #the real FFT stores only kx >= 0: the columns with kx > 0 (except the Nyquist one, for even Nx)
+        #stand for two wave vectors, kx and -kx
+        weights = np.full(kx.shape, 2.)
+        weights[0] = 1.
+        if Nx % 2 == 0:
+            weights[-1] = 1.
+        self.n_bins = int(bins.max()) + 1
+        self._bins = bins.ravel()
+        self._weights = np.broadcast_to(weights, bins.shape).ravel()
+        counts = np.bincount(self._bins, weights=self._weights, minlength=self.n_bins)
+        #bins without wave vectors (possible only for strongly anisotropic grids) are dropped
+        self._valid = counts > 0
+        self._valid[0] = False
+        self.k = np.arange(self.n_bins)[self._valid]*self.dk
+        self._counts = counts[self._valid]
+
+    def structure_factor(self, c):
+        """This method returns the radially averaged structure factor of the concentration grid c,
+        S(k) = <|FFT(c - <c>)|^2>/(Nx*Ny), averaged over the wave vectors of each bin
+
+        Parameters:
+        c: 2D array of floats (or 3D array (B, Ny, Nx) for a batch, one more axis for 3D microstructures)
+           concentration grid
+
+        Returns:
+        S: 1D array of floats (or 2D array (B, n_k) for a batch)
+           structure factor at the wave numbers self.k"""
+
+        c = np.asarray(c)
+        c_fluctuation = c - c.mean(axis=self.grid_axes, keepdims=True)
+        power = np.abs(np.fft.rfftn(c_fluctuation, axes=self.grid_axes))**2
+        power = power.reshape(-1, self._bins.size)*self._weights
+        #a single bincount for the whole batch, shifting the bins of microstructure b by b*n_bins
+        offsets = (np.arange(len(power))*self.n_bins)[:, None]
+        sums = np.bincount((self._bins + offsets).ravel(), weights=power.ravel(),
+                           minlength=len(power)*self.n_bins).reshape(len(power), self.n_bins)
+        S = sums[:, self._valid]/self._counts/self.n_cells
+        return S.reshape(c.shape[:len(c.shape)-len(self.grid_axes)]+self.k.shape)
+
+    def analyze(self, c):
+        """This method computes the structure factor of the concentration grid c and the quantities derived from it:
+        the first moment k1 = sum(k*S(k))/sum(S(k)), the characteristic domain length L = 2*pi/k1 and the
+        interface area (length, in 2D), estimated as area*k1/pi: for a lamellar microstructure of period L
+        there are two interfaces per period, i.e. an interface length of 2/L = k1/pi per unit area
+        (an interface area of k1/pi per unit volume in 3D).
+        A homogeneous grid has k1 = 0, infinite L and no interfaces.
+
+        Parameters:
+        c: 2D array of floats (or 3D array (B, Ny, Nx) for a batch, one more axis for 3D microstructures)
+           concentration grid
+
+        Returns:
+        analysis: dict
+           'S' (structure factor), 'first_moment', 'domain_length' and 'interface_area'
+           (floats, or arrays with a value per microstructure for a batch)"""
+
+        S = self.structure_factor(c)
+        total = S.sum(axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            first_moment = np.where(total > 0., (S*self.k).sum(axis=-1)/np.where(total > 0., total, 1.), 0.)
+            domain_length = np.where(first_moment > 0., 2.*np.pi/first_moment, np.inf)
+        interface_area = self.area*first_moment/np.pi
+        if np.ndim(first_moment) == 0:
+            first_moment, domain_length, interface_area = float(first_moment), float(domain_length), float(interface_area)
+        return {'S': S, 'first_moment': first_moment, 'domain_length': domain_length, 'interface_area': interface_area}
+
+    def header(self):
+        """This method returns the first line of the structure factor files: time, first moment, domain length,
+        interface area and the structure factor at each wave number"""
+        return ' '.join(["Time", "FirstMoment", "DomainLength", "InterfaceArea"] +
+                        ["S_{:.6g}".format(k) for k in self.k]) + "\n"
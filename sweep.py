@@ -0,0 +1,216 @@
+import configparser as cp
+import argparse as ap
+import itertools
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from simulation_api import run_configured_simulation
+
+#parameters that can be swept, with the configuration section they belong to
+SWEEP_PARAMETERS = {'A': 'microstructure_settings',
+                    'grad_coeff': 'microstructure_settings',
+                    'M': 'microstructure_settings',
+                    'c0': 'microstructure_settings',
+                    'c_noise': 'microstructure_settings',
+                    'N': 'microstructure_settings',
+                    'Nx': 'microstructure_settings',
+                    'Ny': 'microstructure_settings',
+                    'seed': 'simulation_seed'}
+
+#configuration options holding output paths, which are moved inside the directory of each run
+PATH_OPTIONS = {'data_paths': ('c_config_datasave', 'aver_quantities_datasave', 'structure_factor_datasave'),
+                'checkpoint': ('checkpoint_path',),
+                'profiling': ('report_path',),
+                'initial_conditions': ('memmap_path',),
+                'image_paths': ('c_grid_evolution_anim', 'initial_c_grid_pic', 'final_c_grid_pic', 'other_variables_pic')}
+
+#file written in the directory of a run when the simulation completed successfully
+RUN_INFO_FILE = 'run_info.json'
+
+
+def expand_parameter_grid(parameter_grid):
+    """This function returns all the combinations of the swept parameter values (cartesian product of the grids)
+
+    Parameters:
+    parameter_grid: dict
+            list of values of each swept parameter, e.g. {'A': [0.5, 1.], 'N': [64, 128]}
+
+    Returns:
+    combinations: list of dicts
+            one dict {parameter name: value} for each simulation to be run"""
+
+    for name in parameter_grid:
+        if name not in SWEEP_PARAMETERS:
+            raise ValueError('Parameter '+name+' cannot be swept, valid options are: '+', '.join(SWEEP_PARAMETERS))
+    names = sorted(parameter_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*[parameter_grid[name] for name in names])]
+
+
+def run_configuration(base_config, parameters):
+    """This function returns a copy of the base configuration with the swept parameters set to the given values
+
+    Parameters:
+    base_config: configparser.ConfigParser
+            base simulation configuration
+    parameters: dict
+            value of each swept parameter
+
+    Returns:
+    config: configparser.ConfigParser
+            configuration of the run"""
+
+    config = cp.ConfigParser()
+    config.read_dict(base_config)
+    for name, value in parameters.items():
+        config.set(SWEEP_PARAMETERS[name], name, str(value))
+    if 'seed' in parameters:
+        config.set('simulation_seed', 'seed_option', 'True')
+    return config
+
+
+def run_hash(config):
+    """This function returns the hash identifying a run: it depends on all the configuration values
+    except the output paths, so that two runs with the same settings share the same hash
+
+    Parameters:
+    config: configparser.ConfigParser
+            configuration of the run
+
+    Returns:
+    hash: str
+          hexadecimal sha256 digest"""
+
+    sha = hashlib.sha256()
+    for section in sorted(config.sections()):
+        for key, value in sorted(config.items(section)):
+            if key in PATH_OPTIONS.get(section, ()):
+                continue
+            sha.update(f"[{section}]{key}={value.strip()}\n".encode())
+    return sha.hexdigest()
+
+
+def is_complete(run_directory):
+    """This function returns True if the directory holds the results of a successfully completed run"""
+    return os.path.exists(os.path.join(run_directory, RUN_INFO_FILE))
+
+
+def prepare_run(base_config, parameters, output_directory):
+    """This function creates the directory of a run, keyed by the hash of its configuration,
+    and writes in it the configuration file of the run, with all the output paths moved inside the directory
+
+    Parameters:
+    base_config: configparser.ConfigParser
+            base simulation configuration
+    parameters: dict
+            value of each swept parameter
+    output_directory: str
+            directory hosting the directories of all the runs
+
+    Returns:
+    run_directory: str
+            directory of the run"""
+
+    config = run_configuration(base_config, parameters)
+    run_directory = os.path.join(output_directory, run_hash(config)[:16])
+    os.makedirs(run_directory, exist_ok=True)
+    for section, options in PATH_OPTIONS.items():
+        for option in options:
+            if config.has_option(section, option):
+                filename = os.path.basename(config.get(section, option))
+                config.set(section, option, os.path.join(run_directory, filename))
+    with open(os.path.join(run_directory, 'simulation_configuration.txt'), 'w') as f:
+        config.write(f)
+    return run_directory
+
+
+def run_simulation(run_directory, parameters):
+    """This function runs the simulation with the configuration file stored in the run directory, and
+    marks the run as complete by writing the swept parameters in the run_info.json file, together with the
+    number of performed steps, the final time and the convergence criterion that stopped the run early (if any).
+    It is executed in the worker processes of the sweep.
+
+    Parameters:
+    run_directory: str
+            directory of the run
+    parameters: dict
+            value of each swept parameter
+
+    Returns:
+    run_directory: str
+            directory of the run
+    error: str or None
+            description of the error that stopped the simulation, None if the run completed"""
+
+    config = cp.ConfigParser()
+    config.read(os.path.join(run_directory, 'simulation_configuration.txt'))
+    try:
+        simulation = run_configured_simulation(config, log=None)
+    except Exception as error:
+        return run_directory, repr(error)
+
+    #write completion marker atomically, so that a partially written marker is never found
+    temporary_path = os.path.join(run_directory, RUN_INFO_FILE+'.tmp')
+    with open(temporary_path, 'w') as f:
+        json.dump({'parameters': parameters, 'n_steps': simulation.step, 't': simulation.t,
+                   'stop_reason': simulation.stop_reason}, f, indent=1)
+    os.replace(temporary_path, os.path.join(run_directory, RUN_INFO_FILE))
+    return run_directory, None
+
+
+def run_sweep(base_config, parameter_grid, output_directory, max_workers=None):
+    """This function runs in parallel, on a pool of at most max_workers processes, a simulation for each combination
+    of the swept parameter values. Runs whose directory already holds complete results are skipped.
+
+    Parameters:
+    base_config: configparser.ConfigParser
+            base simulation configuration
+    parameter_grid: dict
+            list of values of each swept parameter
+    output_directory: str
+            directory hosting the directories of all the runs
+    max_workers: int or None
+            maximum number of worker processes (default: number of CPUs)
+
+    Returns:
+    results: dict
+            for each run directory, 'skipped' if it was already complete, 'completed', or the error that stopped it"""
+
+    if max_workers is not None and max_workers < 1:
+        raise ValueError('The number of workers must be >= 1')
+
+    results = {}
+    pending = {}
+    for parameters in expand_parameter_grid(parameter_grid):
+        run_directory = prepare_run(base_config, parameters, output_directory)
+        if is_complete(run_directory):
+            results[run_directory] = 'skipped'
+        else:
+            pending[run_directory] = parameters
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(run_simulation, run_directory, parameters) for run_directory, parameters in pending.items()]
+            for future in futures:
+                run_directory, error = future.result()
+                results[run_directory] = 'completed' if error is None else error
+    return results
+
+
+if __name__ == '__main__':
+    parser = ap.ArgumentParser(description='Run a parameter sweep of Cahn-Hilliard simulations on a process pool')
+    parser.add_argument('config_file', help='base simulation configuration file, e.g. simulation_configuration.txt')
+    parser.add_argument('--output', default='./Sweep', help='directory hosting the results of the runs')
+    parser.add_argument('--workers', type=int, default=None, help='maximum number of parallel simulations')
+    for name in SWEEP_PARAMETERS:
+        value_type = int if name in ('N', 'Nx', 'Ny', 'seed') else float
+        parser.add_argument('--'+name, type=value_type, nargs='+', help='values of '+name+' to be swept')
+    args = parser.parse_args()
+
+    base_config = cp.ConfigParser()
+    base_config.read(args.config_file)
+    parameter_grid = {name: getattr(args, name) for name in SWEEP_PARAMETERS if getattr(args, name) is not None}
+
+    results = run_sweep(base_config, parameter_grid, args.output, args.workers)
+    for run_directory, status in sorted(results.items()):
+        print(run_directory, status)
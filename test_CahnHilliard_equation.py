@@ -1,8 +1,8 @@
 import numpy as np
 from create_initial_config import create_initial_config
-from chemical_potential_free_energy import chemical_potential
+from chemical_potential_free_energy import chemical_potential, free_energy
 from concentration_laplacian import concentration_laplacian
-from CahnHilliard_equation import Cahn_Hilliard_equation_integration
+from CahnHilliard_equation import Cahn_Hilliard_equation_integration, Cahn_Hilliard_spectral_integration, select_integrator, INTEGRATORS
 from hypothesis import given, settings
 import hypothesis.strategies as st
 import pytest as pt
@@ -95,3 +95,179 @@ def test_CahnHilliard_integration_return_physical_output_configuration():
     updated_c = Cahn_Hilliard_equation_integration(c, A, k, dx, dy, M, dt)
     updated_c_validity = np.logical_and(updated_c>=0, updated_c<=1)
     assert updated_c_validity.all()
+
+
+def test_spectral_integration_returns_initial_config_if_equilibrium_one():
+    """this function tests that if the initial concentration is uniform, 
+    Cahn_Hilliard_spectral_integration() returns the initial configuration
+    
+    GIVEN: a 4-by-4 concentration grid with all values equal to 0.3, and A=1,M=1, k=1, dx=1, dy=1, dt=10
+    WHEN: they are provided as input parameters to Cahn_Hilliard_spectral_integration(),
+    THEN: function returns a 4-by-4, 2D array with all elements equal to initial values (tolerance 1e-12)"""
+
+    c = np.full((4,4), 0.3)
+    updated_c = Cahn_Hilliard_spectral_integration(c, 1., 1., 1., 1., 1., 10.)
+    assert np.shape(updated_c) == (4,4)
+    assert np.allclose(updated_c, c, rtol=0, atol=1e-12)
+
+
+def test_spectral_integration_matches_explicit_one_for_small_dt():
+    """this function tests that for a small time step the semi-implicit spectral scheme and the explicit one
+    integrate the same discretized equation
+    
+    GIVEN: a random 16-by-16 concentration grid, A=1, M=1, k=0.5, dx=dy=1, dt=1e-4
+    WHEN: it is evolved for 10 steps with Cahn_Hilliard_spectral_integration() and Cahn_Hilliard_equation_integration()
+    THEN: the two configurations differ less than 1e-5"""
+
+    np.random.seed(1)
+    c_explicit = create_initial_config(16, 0.5, 0.1)
+    c_spectral = c_explicit.copy()
+    for i in range(10):
+        c_explicit = Cahn_Hilliard_equation_integration(c_explicit, 1., 0.5, 1., 1., 1., 1e-4)
+        c_spectral = Cahn_Hilliard_spectral_integration(c_spectral, 1., 0.5, 1., 1., 1., 1e-4)
+    assert np.allclose(c_explicit, c_spectral, rtol=0, atol=1e-5)
+
+
+def test_spectral_integration_is_stable_for_large_dt():
+    """this function tests that the spectral scheme stays stable for a time step 100 times larger
+    than the one of the default configuration, for which the explicit scheme diverges
+    
+    GIVEN: a random 32-by-32 concentration grid, A=1, M=1, k=0.5, dx=dy=1, dt=1
+    WHEN: it is evolved for 200 steps with Cahn_Hilliard_spectral_integration()
+    THEN: the configuration is finite, physical, phase separated, and its average concentration is conserved
+          up to the clipping of out-of-bound values (tolerance 0.02)"""
+
+    np.random.seed(1)
+    c = create_initial_config(32, 0.5, 0.02)
+    average_c = np.mean(c)
+    for i in range(200):
+        c = Cahn_Hilliard_spectral_integration(c, 1., 0.5, 1., 1., 1., 1.)
+    assert np.all(np.isfinite(c))
+    assert np.logical_and(c>=0, c<=1).all()
+    assert np.isclose(np.mean(c), average_c, rtol=0, atol=0.02)
+    #spinodal decomposition took place
+    assert np.std(c) > 0.1
+
+
+def test_select_integrator_fails_for_unknown_name():
+    """this function tests that select_integrator() raises an error for an unknown integration scheme
+    
+    GIVEN: an invalid integrator name
+    WHEN: it is provided to select_integrator()
+    THEN: function raises ValueError"""
+
+    assert select_integrator('spectral') is Cahn_Hilliard_spectral_integration
+    with pt.raises(ValueError):
+        select_integrator('runge_kutta')
+
+
+@pt.mark.parametrize('integrator', sorted(INTEGRATORS))
+def test_integration_with_precomputed_chemical_potential(integrator):
+    """this function tests that giving the chemical potential of c to the integrators does not change the result
+
+    GIVEN: a random 16-by-16 grid and its chemical potential
+    WHEN: a step of each integrator is performed with and without the precomputed chemical potential
+    THEN: the two updated grids are identical"""
+    np.random.seed(1)
+    c = create_initial_config(16, 0.5, 0.02)
+    integrate = INTEGRATORS[integrator]
+    c_updated = integrate(c.copy(), 1., 0.5, 1., 1., 1., 0.01)
+    c_updated_reusing = integrate(c.copy(), 1., 0.5, 1., 1., 1., 0.01, chemical_potential(c, 1.))
+    assert np.array_equal(c_updated, c_updated_reusing)
+
+
+@pt.mark.parametrize('integrator', sorted(INTEGRATORS))
+def test_integrators_keep_float32_precision(integrator):
+    """this function tests that the integrators do not silently upcast a float32 grid to float64,
+    even with numpy float64 parameters and a batch with a parameter array per microstructure
+
+    GIVEN: a float32 batch of 2 grids, A as a float64 array of shape (2, 1, 1) and dt as a numpy float64
+    WHEN: a time step is performed
+    THEN: the updated grid is float32"""
+    np.random.seed(1)
+    c = np.stack([create_initial_config(8, 0.5, 0.02, np.float32) for b in range(2)])
+    A = np.array([1., 2.]).reshape((2, 1, 1))
+    c_updated = select_integrator(integrator)(c.copy(), A, 0.5, 1., 1., 1., np.float64(0.01))
+    assert c_updated.dtype == np.float32
+    assert chemical_potential(c, A).dtype == np.float32
+
+
+@pt.mark.parametrize('integrator, dt, dc_bound, free_energy_bound',
+                     [('explicit', 0.01, 2e-5, 1e-6), ('explicit_inplace', 0.01, 2e-5, 1e-6), ('spectral', 0.1, 5e-4, 1e-5)])
+def test_float32_drift_from_float64_is_bounded(integrator, dt, dc_bound, free_energy_bound):
+    """this function tests that the rounding errors of float32 integration stay small on a reference run
+
+    GIVEN: the same seeded 32-by-32 grid, in float64 and in float32, with the default material parameters
+    WHEN: both are evolved for 500 steps
+    THEN: the grids differ by less than dc_bound and the free energies by less than free_energy_bound (relative)"""
+    integrate = select_integrator(integrator)
+    np.random.seed(1)
+    c_64 = create_initial_config(32, 0.5, 0.02)
+    c_32 = c_64.astype(np.float32)
+    for step in range(500):
+        c_64 = integrate(c_64, 1., 0.5, 1., 1., 1., dt)
+        c_32 = integrate(c_32, 1., 0.5, 1., 1., 1., dt)
+    assert c_32.dtype == np.float32
+    assert np.max(np.abs(c_32 - c_64)) < dc_bound
+    F_64, F_32 = free_energy(c_64, 1., 0.5, 1., 1.), free_energy(c_32, 1., 0.5, 1., 1.)
+    assert abs(F_32 - F_64) < free_energy_bound*abs(F_64)
+
+
+@pt.mark.parametrize('integrator', sorted(INTEGRATORS))
+def test_3D_integration_of_layered_grid_matches_2D_integration(integrator):
+    """this function tests that the 3D integrators reduce to the 2D ones for a grid constant along z
+
+    GIVEN: a random 2D grid, repeated in 4 xy planes of a 3D grid
+    WHEN: a time step is performed on the 3D grid (dz given) and on the 2D grid
+    THEN: each plane of the updated 3D grid is equal (to rounding) to the updated 2D grid"""
+    integrate = select_integrator(integrator)
+    np.random.seed(1)
+    c = create_initial_config(8, 0.5, 0.1)[:, :6]
+    c_layers = np.stack([c]*4)
+    c_updated = integrate(c.copy(), 1., 0.5, 1., 1.2, 1., 0.01)
+    c_layers_updated = integrate(c_layers, 1., 0.5, 1., 1.2, 1., 0.01, dz=0.8)
+    assert c_layers_updated.shape == (4, 8, 6)
+    for plane in c_layers_updated:
+        assert np.allclose(plane, c_updated, rtol=0., atol=1e-12)
+
+
+@pt.mark.parametrize('dz', [None, 0.8])
+def test_neumann_integrators_conserve_mass_and_agree(dz):
+    """this function tests the integrators with neumann (zero flux) boundary conditions, in 2D and 3D
+
+    GIVEN: a random 8-by-6 grid (repeated in 3 xy planes for dz=0.8)
+    WHEN: a time step is performed by each integrator with neumann boundary conditions, and by the spectral one
+          without gradient term (k=0)
+    THEN: the average concentration is conserved, the in place integrator gives the result of the explicit one,
+          and for k=0, where the semi-implicit scheme is explicit, the spectral integrator does too"""
+    np.random.seed(1)
+    c = create_initial_config(8, 0.5, 0.1)[:, :6]
+    if dz is not None:
+        c = np.stack([c, c[::-1], c])
+    results = {name: select_integrator(name)(c.copy(), 1., 0.5, 1., 1.2, 1., 0.01, dz=dz, boundary='neumann')
+               for name in INTEGRATORS}
+    for c_updated in results.values():
+        assert np.isclose(c_updated.mean(), c.mean(), rtol=0., atol=1e-14)
+    assert np.allclose(results['explicit_inplace'], results['explicit'], rtol=0., atol=1e-13)
+    assert np.allclose(Cahn_Hilliard_spectral_integration(c, 1., 0., 1., 1.2, 1., 0.01, dz=dz, boundary='neumann'),
+                       Cahn_Hilliard_equation_integration(c, 1., 0., 1., 1.2, 1., 0.01, dz=dz, boundary='neumann'),
+                       rtol=0., atol=1e-13)
+
+
+def test_neumann_spectral_integration_is_stable_for_large_time_steps():
+    """this function tests that the cosine transform spectral integrator keeps the large stable time steps
+    of the periodic one
+
+    GIVEN: a seeded 32-by-32 grid with neumann boundary conditions and dt=0.3, 10 times the explicit stability limit
+    WHEN: it is evolved for 100 steps with the spectral integrator
+    THEN: the free energy never increases and the average concentration is conserved"""
+    np.random.seed(1)
+    c = create_initial_config(32, 0.5, 0.02)
+    average_c = c.mean()
+    F = free_energy(c, 1., 0.5, 1., 1., boundary='neumann')
+    for step in range(100):
+        c = Cahn_Hilliard_spectral_integration(c, 1., 0.5, 1., 1., 1., 0.3, boundary='neumann')
+        F_updated = free_energy(c, 1., 0.5, 1., 1., boundary='neumann')
+        assert F_updated <= F + 1e-12*abs(F)
+        F = F_updated
+    assert np.isclose(c.mean(), average_c, rtol=0., atol=1e-12)
@@ -0,0 +1,61 @@
+import numpy as np
+from active_set import ActiveSetStepper
+from CahnHilliard_equation import Cahn_Hilliard_equation_integration, Cahn_Hilliard_inplace_integration
+import pytest as pt
+
+@pt.mark.parametrize('shape, dz, boundary', [((37, 29), None, 'periodic'), ((37, 29), None, 'neumann'),
+                                             ((10, 9, 11), 0.8, 'periodic')])
+def test_active_set_with_zero_tolerance_is_bit_for_bit_equal_to_full_steps(shape, dz, boundary):
+    """this function tests that the tiles updated by the active set steps get exactly the values of a full step
+
+    GIVEN: a random grid, whose sizes are not multiples of the tile size 8, and tolerance 0. (all the changing tiles
+           are active)
+    WHEN: it is evolved for 12 steps, with a full sweep every 5 steps, and by Cahn_Hilliard_equation_integration()
+    THEN: the two grids are exactly equal"""
+    np.random.seed(1)
+    c = 0.5 + 0.1*(0.5-np.random.rand(*shape))
+    stepper = ActiveSetStepper(Cahn_Hilliard_equation_integration, shape, 1., 0.5, 1., 1.2, 1., 0.01, tile_size=8,
+                               tolerance=0., full_sweep_every=5, dz=dz, boundary=boundary)
+    c_active, c_full = c.copy(), c
+    for step in range(12):
+        c_active = stepper.step(c_active)
+        c_full = Cahn_Hilliard_equation_integration(c_full, 1., 0.5, 1., 1.2, 1., 0.01, dz=dz, boundary=boundary)
+    assert np.array_equal(c_active, c_full)
+
+def test_active_set_skips_quiescent_tiles():
+    """this function tests the active set integration of a sparse microstructure
+
+    GIVEN: a 64-by-64 grid with concentration 0. everywhere except a noisy 8-by-8 square, tiles of 8 subcells
+    WHEN: it is evolved for 20 steps with the in place integrator for the full sweeps, and by full steps
+    THEN: after the first step only the tiles around the square are active, the tiles far from it are never changed,
+          and the grid is equal to the fully integrated one"""
+    np.random.seed(1)
+    c = np.zeros((64, 64))
+    c[28:36, 28:36] = 0.5 + 0.1*(0.5-np.random.rand(8, 8))
+    stepper = ActiveSetStepper(Cahn_Hilliard_inplace_integration, c.shape, 1., 0.5, 1., 1., 1., 0.01, tile_size=8,
+                               tolerance=1e-10, full_sweep_every=50)
+    assert stepper.active_fraction == 1.
+    c_active, c_full = c.copy(), c
+    for step in range(20):
+        c_active = stepper.step(c_active)
+        c_full = Cahn_Hilliard_equation_integration(c_full, 1., 0.5, 1., 1., 1., 0.01)
+        assert stepper.active_fraction <= 16/64
+    assert np.all(c_active[:16] == 0.) and np.all(c_active[:, 48:] == 0.)
+    assert np.allclose(c_active, c_full, rtol=0., atol=1e-9)
+
+def test_active_set_fails_with_incorrect_parameters():
+    """this function tests that ActiveSetStepper raises an error for invalid parameters
+
+    GIVEN: tile size 0, negative tolerance, a batch of grids, a grid of shape different from the stepper one
+    WHEN: they are provided to ActiveSetStepper
+    THEN: ValueError is raised"""
+    integrator = Cahn_Hilliard_equation_integration
+    with pt.raises(ValueError):
+        ActiveSetStepper(integrator, (16, 16), 1., 0.5, 1., 1., 1., 0.01, tile_size=0)
+    with pt.raises(ValueError):
+        ActiveSetStepper(integrator, (16, 16), 1., 0.5, 1., 1., 1., 0.01, tolerance=-1.)
+    with pt.raises(ValueError):
+        ActiveSetStepper(integrator, (2, 16, 16), 1., 0.5, 1., 1., 1., 0.01)
+    stepper = ActiveSetStepper(integrator, (16, 16), 1., 0.5, 1., 1., 1., 0.01)
+    with pt.raises(ValueError):
+        stepper.step(np.full((16, 12), 0.5))
@@ -0,0 +1,87 @@
+import numpy as np
+from adaptive_stepping import AdaptiveTimeStepper
+from CahnHilliard_equation import Cahn_Hilliard_equation_integration, INTEGRATORS
+from chemical_potential_free_energy import free_energy
+from create_initial_config import create_initial_config
+from hypothesis import given, settings
+import hypothesis.strategies as st
+import pytest as pt
+
+def initial_grid(N=16, seed=1):
+    """This function returns a seeded random concentration grid around c=0.5"""
+    np.random.seed(seed)
+    return create_initial_config(N, 0.5, 0.05)
+
+@pt.mark.parametrize('integrator', sorted(INTEGRATORS))
+def test_adaptive_steps_decrease_free_energy(integrator):
+    """this function tests that the free energy never increases along the accepted adaptive steps
+
+    GIVEN: a random grid and an adaptive stepper around each of the available integrators
+    WHEN: 50 adaptive steps are performed
+    THEN: the free energy after each step is not larger than before it"""
+    c = initial_grid()
+    stepper = AdaptiveTimeStepper(INTEGRATORS[integrator], 1., 0.5, 1., 1., 1., 0.01, 0.001, 1., 1e-3)
+    F = free_energy(c, 1., 0.5, 1., 1.)
+    for i in range(50):
+        c, dt_taken = stepper.step(c)
+        F_updated = free_energy(c, 1., 0.5, 1., 1.)
+        assert F_updated <= F + 1e-12*abs(F)
+        F = F_updated
+
+@settings(deadline=None, max_examples=20)
+@given(dt_min=st.floats(1e-4, 1e-2), dt_max=st.floats(1e-2, 1.), tolerance=st.floats(1e-5, 1e-2))
+def test_adaptive_time_step_within_bounds(dt_min, dt_max, tolerance):
+    """this function tests that the time steps taken are always within the bounds set by the user
+
+    GIVEN: a random grid and random time step bounds and tolerance
+    WHEN: 20 adaptive steps are performed
+    THEN: all the time steps taken are in [dt_min, dt_max]"""
+    c = initial_grid(8)
+    stepper = AdaptiveTimeStepper(Cahn_Hilliard_equation_integration, 1., 0.5, 1., 1., 1., 0.01, dt_min, dt_max, tolerance)
+    for i in range(20):
+        c, dt_taken = stepper.step(c)
+        assert dt_min <= dt_taken <= dt_max
+        assert dt_min <= stepper.dt <= dt_max
+
+def test_adaptive_time_step_grows_during_coarsening():
+    """this function tests that the time step grows when the dynamics slows down
+
+    GIVEN: a random grid, integrated with a fixed small step until domains are formed
+    WHEN: adaptive steps are performed starting from dt_min
+    THEN: the time step reaches values larger than the initial one, with fewer steps than the fixed dt integration"""
+    c = initial_grid()
+    for i in range(2000):
+        c = Cahn_Hilliard_equation_integration(c, 1., 0.5, 1., 1., 1., 0.01)
+    stepper = AdaptiveTimeStepper(Cahn_Hilliard_equation_integration, 1., 0.5, 1., 1., 1., 0.01, 0.01, 1., 1e-3)
+    t = 0.
+    n_steps = 0
+    while t < 10.:
+        c, dt_taken = stepper.step(c, 10.-t)
+        t += dt_taken
+        n_steps += 1
+    assert stepper.dt > 0.01
+    assert n_steps < 1000
+
+def test_adaptive_step_does_not_exceed_limit():
+    """this function tests that the time step of a single step is limited by dt_limit
+
+    GIVEN: an adaptive stepper with initial dt=0.01
+    WHEN: a step is performed with dt_limit=0.004
+    THEN: the time step taken is 0.004, and the stored dt is not increased"""
+    stepper = AdaptiveTimeStepper(Cahn_Hilliard_equation_integration, 1., 0.5, 1., 1., 1., 0.01, 0.001, 1., 1.)
+    c, dt_taken = stepper.step(initial_grid(8), 0.004)
+    assert dt_taken == 0.004
+    assert stepper.dt == 0.01
+
+def test_adaptive_stepper_rejects_invalid_parameters():
+    """this function tests that invalid bounds and tolerance raise an error
+
+    GIVEN: dt_min=0, dt_min > dt_max, and a negative tolerance
+    WHEN: they are provided to AdaptiveTimeStepper
+    THEN: ValueError is raised"""
+    with pt.raises(ValueError):
+        AdaptiveTimeStepper(Cahn_Hilliard_equation_integration, 1., 0.5, 1., 1., 1., 0.01, 0., 1., 1e-3)
+    with pt.raises(ValueError):
+        AdaptiveTimeStepper(Cahn_Hilliard_equation_integration, 1., 0.5, 1., 1., 1., 0.01, 0.1, 0.01, 1e-3)
+    with pt.raises(ValueError):
+        AdaptiveTimeStepper(Cahn_Hilliard_equation_integration, 1., 0.5, 1., 1., 1., 0.01, 0.001, 1., -1e-3)
@@ -0,0 +1,58 @@
+import numpy as np
+from benchmarks import BENCHMARKS, run_benchmarks, compare_results, time_function
+import pytest as pt
+
+def test_run_benchmarks_covers_all_benchmarks_sizes_and_dtypes():
+    """this function tests that run_benchmarks() returns one positive timing for each benchmark, size and dtype
+
+    GIVEN: two small grid sizes and both float precisions
+    WHEN: all the benchmarks are run with a single short measurement
+    THEN: there is one result with positive best time for each combination"""
+    results = run_benchmarks([8, 16], ['float32', 'float64'], repeat=1, min_time=0.)
+    assert len(results) == len(BENCHMARKS)*2*2
+    keys = {(result['name'], result['N'], result['dtype']) for result in results}
+    assert len(keys) == len(results)
+    assert all(result['best'] > 0. for result in results)
+
+def test_run_benchmarks_skips_text_format_on_large_grids():
+    """this function tests that the text format benchmarks are not run above their largest grid size
+
+    GIVEN: a grid size larger than the largest one of the text format benchmarks
+    WHEN: the text writer benchmark is run on it
+    THEN: no result is returned"""
+    setup, max_size = BENCHMARKS['write_snapshots_text']
+    assert run_benchmarks([2*max_size], ['float64'], ['write_snapshots_text'], repeat=1, min_time=0.) == []
+
+def test_run_benchmarks_rejects_unknown_names():
+    """this function tests that run_benchmarks() raises an error for a benchmark name that does not exist
+
+    GIVEN: the benchmark name 'wrong'
+    WHEN: it is provided to run_benchmarks()
+    THEN: ValueError is raised"""
+    with pt.raises(ValueError):
+        run_benchmarks([8], ['float64'], ['wrong'])
+
+def test_time_function_reaches_min_time():
+    """this function tests that time_function() calls the function enough times to last at least min_time
+
+    GIVEN: a function doing almost nothing and min_time=0.01 s
+    WHEN: it is timed with 3 repetitions
+    THEN: number of calls times the best time is at least min_time, and there are 3 repetitions"""
+    timing = time_function(lambda: None, repeat=3, min_time=0.01)
+    assert timing['number']*timing['median'] >= 0.005
+    assert timing['repeat'] == 3
+    assert timing['best'] <= timing['median']
+
+def test_compare_results_classifies_changes():
+    """this function tests the classification of the benchmark time changes with respect to a baseline
+
+    GIVEN: a baseline of 3 benchmarks with 1 s each, and results of 2 s, 1.05 s, 0.5 s, plus a benchmark
+           missing in the baseline
+    WHEN: they are compared with threshold 0.1
+    THEN: the status is 'slower', 'unchanged' and 'faster', and the missing benchmark is not compared"""
+    baseline = [{'name': name, 'N': 64, 'dtype': 'float64', 'best': 1.} for name in ('a', 'b', 'c')]
+    results = [{'name': name, 'N': 64, 'dtype': 'float64', 'best': best} for name, best in (('a', 2.), ('b', 1.05), ('c', 0.5))]
+    results.append({'name': 'd', 'N': 64, 'dtype': 'float64', 'best': 1.})
+    comparison = compare_results(results, baseline, 0.1)
+    assert [entry['status'] for entry in comparison] == ['slower', 'unchanged', 'faster']
+    assert np.isclose(comparison[0]['ratio'], 2.)
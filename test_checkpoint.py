@@ -0,0 +1,101 @@
+import numpy as np
+import configparser as cp
+from checkpoint import config_hash, save_checkpoint, load_checkpoint
+import pytest as pt
+
+def make_config(N, image_path):
+    """This function returns a minimal configuration with the given N and image path"""
+    config = cp.ConfigParser()
+    config.read_dict({'microstructure_settings': {'N': str(N), 'A': '1.'},
+                      'image_paths': {'final_c_grid_pic': image_path}})
+    return config
+
+def test_checkpoint_restores_grid_time_step_and_random_state(tmp_path):
+    """this function tests that load_checkpoint() returns the saved concentration grid, time and step,
+    and restores the state of the random number generator
+
+    GIVEN: a random grid, t=1.5, step=150, and the random generator state after the grid creation
+    WHEN: they are saved with save_checkpoint(), more random numbers are drawn, and the checkpoint is loaded
+    THEN: grid, time, step are equal to the saved ones, and the next random numbers are the same 
+          that were drawn after saving"""
+    path = str(tmp_path/'checkpoint.npz')
+    np.random.seed(1)
+    c = np.random.rand(5, 5)
+    save_checkpoint(path, c, 1.5, 150, 'abc')
+    expected_random_numbers = np.random.rand(3)
+    c_loaded, t, step = load_checkpoint(path, 'abc')
+    assert np.array_equal(c_loaded, c)
+    assert t == 1.5
+    assert step == 150
+    assert np.array_equal(np.random.rand(3), expected_random_numbers)
+
+def test_checkpoint_fails_with_different_configuration(tmp_path):
+    """this function tests that load_checkpoint() raises an error if the configuration hash does not match
+
+    GIVEN: a checkpoint saved with the hash of a configuration with N=10
+    WHEN: it is loaded with the hash of a configuration with N=20
+    THEN: function raises ValueError"""
+    path = str(tmp_path/'checkpoint.npz')
+    save_checkpoint(path, np.zeros((2, 2)), 0., 0, config_hash(make_config(10, 'a.jpg')))
+    with pt.raises(ValueError):
+        load_checkpoint(path, config_hash(make_config(20, 'a.jpg')))
+
+def test_config_hash_ignores_image_paths():
+    """this function tests that config_hash() only depends on the settings affecting the simulated data
+
+    GIVEN: configurations differing only in the image paths, or in N
+    WHEN: they are provided to config_hash()
+    THEN: the hashes are equal in the first case and different in the second"""
+    assert config_hash(make_config(10, 'a.jpg')) == config_hash(make_config(10, 'b.jpg'))
+    assert config_hash(make_config(10, 'a.jpg')) != config_hash(make_config(20, 'a.jpg'))
+
+@pt.mark.parametrize('section, key, value', [('time_settings', 'n_iterations', '10000'),
+                                             ('time_settings', 't_end', '100.'),
+                                             ('time_settings', 'snapshot_every', '10'),
+                                             ('checkpoint', 'checkpoint_every', '500'),
+                                             ('data_paths', 'c_config_datasave', './Other/configurations.npy')])
+def test_config_hash_allows_extending_and_moving_the_run(section, key, value):
+    """this function tests that config_hash() does not depend on the length, cadence and paths of the run
+
+    GIVEN: a configuration, and the same configuration with a different number of iterations, t_end,
+           snapshot cadence, checkpoint cadence or data path
+    WHEN: they are provided to config_hash()
+    THEN: the hashes are equal, while they differ if dt or the seed is changed"""
+    config = make_config(10, 'a.jpg')
+    config.read_dict({'time_settings': {'dt': '0.01', 'n_iterations': '5000'}, 'simulation_seed': {'seed': '1'}})
+    changed = make_config(10, 'a.jpg')
+    changed.read_dict(config)
+    changed.read_dict({section: {key: value}})
+    assert config_hash(changed) == config_hash(config)
+    changed.set('time_settings', 'dt', '0.02')
+    assert config_hash(changed) != config_hash(config)
+    changed.set('time_settings', 'dt', '0.01')
+    changed.set('simulation_seed', 'seed', '2')
+    assert config_hash(changed) != config_hash(config)
+
+@pt.mark.parametrize('key, value', [('enabled', 'False'), ('tile_size', '16'), ('tolerance', '1e-5'),
+                                    ('full_sweep_every', '10')])
+def test_config_hash_depends_on_active_set_settings(key, value):
+    """this function tests that config_hash() depends on the active set settings, which change the trajectory
+
+    GIVEN: a configuration with active set integration, and the same configuration with a different
+           enabled, tile_size, tolerance or full_sweep_every
+    WHEN: they are provided to config_hash()
+    THEN: the hashes are different"""
+    config = make_config(10, 'a.jpg')
+    config.read_dict({'active_set': {'enabled': 'True', 'tile_size': '32', 'tolerance': '1e-7', 'full_sweep_every': '50'}})
+    changed = make_config(10, 'a.jpg')
+    changed.read_dict(config)
+    changed.set('active_set', key, value)
+    assert config_hash(changed) != config_hash(config)
+
+def test_checkpoint_stores_extra_values(tmp_path):
+    """this function tests that load_checkpoint() returns the extra values saved with the checkpoint
+
+    GIVEN: a checkpoint saved with extra={'dt': 0.25}
+    WHEN: it is loaded with return_extra=True
+    THEN: the returned extra values hold dt=0.25"""
+    path = str(tmp_path/'checkpoint.npz')
+    save_checkpoint(path, np.zeros((2, 2)), 0., 0, 'abc', extra={'dt': 0.25})
+    c, t, step, extra = load_checkpoint(path, 'abc', return_extra=True)
+    assert extra == {'dt': 0.25}
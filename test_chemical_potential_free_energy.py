@@ -1,6 +1,7 @@
 import numpy as np
 from create_initial_config import create_initial_config
-from chemical_potential_free_energy import free_energy, chemical_potential, average_chemical_potential_and_concentration
+import chemical_potential_free_energy
+from chemical_potential_free_energy import free_energy, chemical_potential, average_chemical_potential_and_concentration, fused_diagnostics
 from hypothesis import given
 import hypothesis.strategies as st
 import pytest as pt
@@ -110,13 +111,126 @@ def test_average_chemical_potential_and_concentration_returns_expected_value():
                      [4.,2.]]
     c_grid = [[0.1, 0.3],
               [0.3, 0.1]]
-    N = 2
 
     expected_average_chem_value = 3.
     expecte_c_value = 0.2
-    computed_average_chem_value, computed_c_value = average_chemical_potential_and_concentration(c_grid, chem_pot_grid, N)
+    computed_average_chem_value, computed_c_value = average_chemical_potential_and_concentration(c_grid, chem_pot_grid)
     assert np.allclose(expected_average_chem_value, computed_average_chem_value, rtol=1e-8)
     assert np.allclose(expecte_c_value, computed_c_value, rtol=1e-8)
 
-    
 
+def test_average_chemical_potential_and_concentration_of_rectangular_and_3D_grids():
+    """this function tests the averages of rectangular 2D grids and of 3D grids
+
+    GIVEN: a 3-by-5 grid, a batch of two 3-by-5 grids and a 2-by-3-by-4 grid, with known averages
+    WHEN: they are provided to average_chemical_potential_and_concentration() (with n_axes=3 for the 3D grid)
+    THEN: the averages over all the subcells of each grid are returned"""
+    c = np.arange(15.).reshape(3, 5)
+    average_chem_pot, average_c = average_chemical_potential_and_concentration(c, 2*c)
+    assert np.isclose(average_c, 7.) and np.isclose(average_chem_pot, 14.)
+    average_chem_pot, average_c = average_chemical_potential_and_concentration(np.stack((c, c+1)), np.stack((c, c)))
+    assert np.allclose(average_c, [7., 8.]) and np.allclose(average_chem_pot, [7., 7.])
+    c = np.arange(24.).reshape(2, 3, 4)
+    average_chem_pot, average_c = average_chemical_potential_and_concentration(c, -c, n_axes=3)
+    assert np.isclose(average_c, 11.5) and np.isclose(average_chem_pot, -11.5)
+
+
+@given(N=st.integers(min_value=2, max_value=40), A=st.floats(min_value=0., max_value=10.), k=st.floats(min_value=0., max_value=10.),
+       dx=st.floats(min_value=0.1, max_value=10.), dy=st.floats(min_value=0.1, max_value=10.))
+def test_fused_diagnostics_equal_separate_functions(N, A, k, dx, dy):
+    """this function tests that fused_diagnostics() returns the same quantities computed by the separate functions
+
+    GIVEN: a random N-by-N concentration grid and valid A, k, dx, dy parameters
+    WHEN: they are provided to fused_diagnostics()
+    THEN: average concentration and chemical potential are equal to the ones of average_chemical_potential_and_concentration(),
+          the sum of the free energy terms is equal to free_energy(), and the chemical potential grid
+          is identical to chemical_potential()"""
+    np.random.seed(1)
+    c = create_initial_config(N, 0.5, 0.02)
+    average_c, average_chem_pot, F_homogeneous, F_gradient, chem_potential_grid = fused_diagnostics(c, A, k, dx, dy)
+    expected_chem_pot, expected_c = average_chemical_potential_and_concentration(c, chemical_potential(c, A))
+    assert np.isclose(average_c, expected_c)
+    assert np.isclose(average_chem_pot, expected_chem_pot, rtol=1e-9, atol=1e-12)
+    assert np.isclose(F_homogeneous + F_gradient, free_energy(c, A, k, dx, dy), rtol=1e-9, atol=1e-12)
+    assert np.array_equal(chem_potential_grid, chemical_potential(c, A))
+    assert isinstance(F_gradient, float)
+
+
+def test_fused_diagnostics_of_batch():
+    """this function tests that fused_diagnostics() computes the quantities of each microstructure of a batch
+
+    GIVEN: a batch of 3 random 8-by-8 grids with different A and k values
+    WHEN: the batch is provided to fused_diagnostics()
+    THEN: the quantities of each microstructure are equal to the ones computed on the single grid"""
+    np.random.seed(1)
+    c = np.random.rand(3, 8, 8)
+    A = np.array([0.5, 1., 2.]).reshape((-1, 1, 1))
+    k = np.array([0.1, 0.5, 1.]).reshape((-1, 1, 1))
+    batch_results = fused_diagnostics(c, A, k, 1., 1.)
+    for b in range(3):
+        single_results = fused_diagnostics(c[b], A[b, 0, 0], k[b, 0, 0], 1., 1.)
+        for batch_value, single_value in zip(batch_results[:4], single_results[:4]):
+            assert np.isclose(batch_value[b], single_value)
+
+
+def test_3D_free_energy_and_fused_diagnostics_agree():
+    """this function tests the free energy of 3D microstructures, for a single grid and a batch
+
+    GIVEN: a random 4-by-5-by-6 grid, and a batch of two grids with A given as an array of shape (2, 1, 1, 1)
+    WHEN: the free energy is computed with free_energy() and fused_diagnostics(), with dz given
+    THEN: the two agree, the batch values are the ones of the single grids, and the homogeneous term
+          is the sum of A*c^2*(1-c)^2 times the subcell volume"""
+    np.random.seed(1)
+    c = np.random.rand(4, 5, 6)
+    dx, dy, dz = 1., 1.2, 0.8
+    average_c, average_chem_pot, F_homogeneous, F_gradient, mu = fused_diagnostics(c, 1., 0.5, dx, dy, dz)
+    assert np.isclose(F_homogeneous + F_gradient, free_energy(c, 1., 0.5, dx, dy, dz))
+    assert np.isclose(F_homogeneous, dx*dy*dz*np.sum(c**2*(1-c)**2))
+    assert np.isclose(average_c, c.mean())
+    batch = np.stack([c, c[::-1, ::-1]])
+    A = np.array([1., 2.]).reshape((2, 1, 1, 1))
+    F_batch = free_energy(batch, A, 0.5, dx, dy, dz)
+    assert np.allclose(F_batch, [free_energy(c, 1., 0.5, dx, dy, dz), free_energy(c[::-1, ::-1], 2., 0.5, dx, dy, dz)])
+    assert np.allclose(np.sum(fused_diagnostics(batch, A, 0.5, dx, dy, dz)[2:4], axis=0), F_batch)
+
+
+def test_neumann_free_energy_has_no_edge_differences():
+    """this function tests the gradient term of the free energy with neumann boundary conditions
+
+    GIVEN: a 4-by-6 grid increasing linearly along x by 0.1 per subcell, and a random 4-by-5-by-6 grid
+    WHEN: the free energy is computed with neumann boundary conditions by free_energy() and fused_diagnostics()
+    THEN: the gradient term of the ramp only counts the 5 differences inside each row (while the periodic one also
+          counts the jump between the edges), and the two functions agree on the random 3D grid"""
+    c = np.broadcast_to(0.1*np.arange(6), (4, 6))
+    F_gradient = fused_diagnostics(c, 0., 0.5, 1., 1., boundary='neumann')[3]
+    assert np.isclose(F_gradient, 0.5*4*5*0.1**2)
+    assert np.isclose(free_energy(c, 0., 0.5, 1., 1., boundary='neumann'), F_gradient)
+    assert np.isclose(free_energy(c, 0., 0.5, 1., 1.), F_gradient + 0.5*4*0.5**2)
+    np.random.seed(1)
+    c = np.random.rand(4, 5, 6)
+    diagnostics = fused_diagnostics(c, 1., 0.5, 1., 1.2, 0.8, 'neumann')
+    assert np.isclose(diagnostics[2] + diagnostics[3], free_energy(c, 1., 0.5, 1., 1.2, 0.8, 'neumann'))
+    with pt.raises(ValueError):
+        free_energy(c, 1., 0.5, 1., 1.2, 0.8, 'dirichlet')
+
+
+@pt.mark.parametrize('block_elements', [1, 10, 2**16])
+@pt.mark.parametrize('shape, dz, boundary', [((9, 7), None, 'periodic'), ((9, 7), None, 'neumann'),
+                                             ((2, 5, 4, 6), 0.7, 'periodic')])
+def test_fused_diagnostics_does_not_depend_on_blocks(block_elements, shape, dz, boundary, monkeypatch):
+    """this function tests that the quantities computed by fused_diagnostics() do not depend on the blocks of rows
+
+    GIVEN: a random grid (a batch of two 3D grids), blocks of 1, 10 or 2**16 elements and a preallocated output
+    WHEN: it is provided to fused_diagnostics()
+    THEN: the quantities are equal to the ones of the separate functions, and the chemical potential is
+          written in the output array"""
+    monkeypatch.setattr(chemical_potential_free_energy, 'DIAGNOSTICS_BLOCK_ELEMENTS', block_elements)
+    c = np.random.default_rng(1).random(shape)
+    out = np.empty_like(c)
+    average_c, average_chem_pot, F_homogeneous, F_gradient, chem_potential_grid = \
+        fused_diagnostics(c, 1.3, 0.4, 1.1, 0.9, dz, boundary, out=out)
+    n_axes = 2 if dz is None else 3
+    expected_chem_pot, expected_c = average_chemical_potential_and_concentration(c, chemical_potential(c, 1.3), n_axes)
+    assert chem_potential_grid is out and np.array_equal(out, chemical_potential(c, 1.3))
+    assert np.allclose(average_c, expected_c) and np.allclose(average_chem_pot, expected_chem_pot)
+    assert np.allclose(F_homogeneous + F_gradient, free_energy(c, 1.3, 0.4, 1.1, 0.9, dz, boundary), rtol=1e-12)
@@ -54,4 +54,43 @@ def test_concentration_laplacian_returns_correct_values():
                            [3, 0, -3],
                            [-6, -9, -12]])
     c_laplacian = concentration_laplacian(c0, dx,dy)
-    assert np.array_equal(c_laplacian, c_laplacian_expected)
\ No newline at end of file
+    assert np.array_equal(c_laplacian, c_laplacian_expected)
+
+
+def test_3D_laplacian_matches_periodic_second_differences():
+    """this function tests the laplacian of a 3D microstructure
+
+    GIVEN: a random 5-by-6-by-7 grid with different subcell dimensions along x, y and z
+    WHEN: its laplacian is computed with dz given
+    THEN: it is equal to the sum of the periodic second differences along the three axes,
+          and a grid constant along z has, in each xy plane, the laplacian of the 2D grid"""
+    np.random.seed(1)
+    c = np.random.rand(5, 6, 7)
+    dx, dy, dz = 1., 1.2, 0.8
+    expected = sum((np.roll(c, 1, axis) + np.roll(c, -1, axis) - 2*c)/(d*d) for axis, d in [(2, dx), (1, dy), (0, dz)])
+    assert np.allclose(concentration_laplacian(c, dx, dy, dz), expected)
+    c_layers = np.broadcast_to(c[0], (4, 6, 7))
+    assert np.allclose(concentration_laplacian(c_layers, dx, dy, dz)[2], concentration_laplacian(c[0], dx, dy))
+    with pt.raises(ValueError):
+        concentration_laplacian(c, dx, dy, -1.)
+
+
+def test_neumann_laplacian_mirrors_the_edges():
+    """this function tests the laplacian with neumann (zero flux) boundary conditions
+
+    GIVEN: a random 5-by-6-by-7 grid with different subcell dimensions along x, y and z
+    WHEN: its laplacian is computed with neumann boundary conditions, and with an unknown boundary condition
+    THEN: it is equal to the periodic laplacian of the grid extended with its mirror image along each axis,
+          its sum vanishes (no flux through the edges), and ValueError is raised for the unknown boundary"""
+    np.random.seed(1)
+    c = np.random.rand(5, 6, 7)
+    dx, dy, dz = 1., 1.2, 0.8
+    mirrored = c
+    for axis in range(3):
+        mirrored = np.concatenate((mirrored, np.flip(mirrored, axis)), axis=axis)
+    expected = concentration_laplacian(mirrored, dx, dy, dz)[:5, :6, :7]
+    c_laplacian = concentration_laplacian(c, dx, dy, dz, 'neumann')
+    assert np.allclose(c_laplacian, expected)
+    assert np.isclose(np.sum(c_laplacian), 0.)
+    with pt.raises(ValueError):
+        concentration_laplacian(c, dx, dy, dz, 'dirichlet')
@@ -0,0 +1,75 @@
+import numpy as np
+from convergence import ConvergenceMonitor, CRITERIA
+import pytest as pt
+
+def diagnostics(free_energy, chem_potential=0.):
+    """This function returns the diagnostics used by the ConvergenceMonitor"""
+    return {'free_energy': free_energy, 'average_chemical_potential': chem_potential}
+
+def test_criterion_needs_patience_consecutive_checks():
+    """this function tests that a criterion stops the simulation only after patience consecutive checks
+    below its tolerance, and that a check above tolerance resets the count
+
+    GIVEN: a monitor of the free energy with tolerance 1e-3 per step, patience 3 and a check every 2 steps
+    WHEN: the free energy changes by 1e-4 (below), 1e-2 (above), then by 1e-4 at each check
+    THEN: the stop reason 'free_energy' is returned only at the third consecutive check below tolerance"""
+    monitor = ConvergenceMonitor(2, {'free_energy': 1e-3}, 3)
+    c = np.zeros((4, 4))
+    free_energies = [1., 1.0002, 1.0202, 1.0204, 1.0206, 1.0208]
+    reasons = [monitor.update(2*i, c, diagnostics(F)) for i, F in enumerate(free_energies)]
+    assert reasons == [None, None, None, None, None, 'free_energy']
+    assert monitor.measures['free_energy'] < 1e-3
+
+def test_max_dc_and_chem_potential_criteria():
+    """this function tests the criteria on the concentration change and on the average chemical potential
+
+    GIVEN: monitors of max |dc| (tolerance 0.01) and of the chemical potential (tolerance 0.1), patience 1
+    WHEN: the grid changes by 0.05 in one subcell in 10 steps, and the chemical potential by 2 in 10 steps
+    THEN: max |dc| per step is 0.005 and stops the first monitor, the chemical potential change per step is 0.2
+          and does not stop the second monitor"""
+    monitor = ConvergenceMonitor(10, {'max_dc': 0.01, 'chem_potential': 0.1}, 1)
+    c = np.zeros((4, 4))
+    assert monitor.update(0, c, diagnostics(1., 0.)) is None
+    c_updated = c.copy()
+    c_updated[1, 2] = 0.05
+    assert monitor.update(10, c_updated, diagnostics(1., 2.)) == 'max_dc'
+    assert monitor.measures['max_dc'] == pt.approx(0.005)
+    assert monitor.measures['chem_potential'] == pt.approx(0.2)
+
+def test_batch_needs_all_replicas_converged():
+    """this function tests that, for a batch of microstructures, the largest measure is compared with the tolerance
+
+    GIVEN: a batch of two free energies, the first constant and the second changing by 10%
+    WHEN: the monitor of the free energy checks them
+    THEN: the simulation is not stopped"""
+    monitor = ConvergenceMonitor(1, {'free_energy': 1e-3}, 1)
+    c = np.zeros((2, 4, 4))
+    monitor.update(0, c, diagnostics(np.array([1., 1.])))
+    assert monitor.update(1, c, diagnostics(np.array([1., 1.1]))) is None
+
+def test_monitor_state_can_be_restored():
+    """this function tests that a monitor restored from the state of another one takes the same decisions
+
+    GIVEN: a monitor with patience 2 that saw one check below tolerance
+    WHEN: its state is restored in a new monitor, and the same check is given to both
+    THEN: both stop the simulation"""
+    monitors = [ConvergenceMonitor(1, {'max_dc': 1e-3}, 2) for i in range(2)]
+    c = np.zeros((3, 3))
+    monitors[0].update(0, c, diagnostics(1.))
+    monitors[0].update(1, c, diagnostics(1.))
+    monitors[1].restore(monitors[0].state())
+    assert [monitor.update(2, c, diagnostics(1.)) for monitor in monitors] == ['max_dc', 'max_dc']
+
+def test_invalid_settings_are_rejected():
+    """this function tests the validation of the monitor settings
+
+    GIVEN: check_every 0, a negative tolerance, a patience 0
+    WHEN: the monitors are created
+    THEN: ValueError is raised, and a monitor without positive tolerances is disabled"""
+    with pt.raises(ValueError):
+        ConvergenceMonitor(0, {'max_dc': 1e-3})
+    with pt.raises(ValueError):
+        ConvergenceMonitor(1, {'max_dc': -1.})
+    with pt.raises(ValueError):
+        ConvergenceMonitor(1, {'max_dc': 1e-3}, {'max_dc': 0})
+    assert not ConvergenceMonitor(1, {name: 0. for name in CRITERIA}).enabled
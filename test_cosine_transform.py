@@ -0,0 +1,38 @@
+import numpy as np
+from cosine_transform import dctn, idctn
+import pytest as pt
+
+@pt.mark.parametrize('dtype', [np.float64, np.float32])
+def test_dctn_matches_cosine_sums_and_idctn_inverts_it(dtype):
+    """this function tests the type II cosine transform and its inverse
+
+    GIVEN: a random array of shape (3, 5, 6) of the given precision
+    WHEN: it is transformed over its last two axes with dctn(), and transformed back with idctn()
+    THEN: the transform is the sum 2*sum_j a[j]*cos(pi*m*(2j+1)/(2n)) along each axis, both keep the precision
+          of the input, and the inverse transform gives back the input array"""
+    np.random.seed(1)
+    a = np.random.rand(3, 5, 6).astype(dtype)
+
+    def cosines(n):
+        j = np.arange(n)
+        return 2*np.cos(np.pi*j[:, None]*(2*j+1)/(2*n))
+
+    expected = np.einsum('mi,bij,nj->bmn', cosines(5), a.astype(np.float64), cosines(6))
+    a_hat = dctn(a, axes=(-2, -1))
+    tolerance = 1e-12 if dtype == np.float64 else 1e-4
+    assert a_hat.dtype == dtype
+    assert np.allclose(a_hat, expected, rtol=0., atol=tolerance)
+    a_back = idctn(a_hat, axes=(-2, -1))
+    assert a_back.dtype == dtype
+    assert np.allclose(a_back, a, rtol=0., atol=tolerance)
+
+def test_dctn_of_constant_array_has_only_the_zero_mode():
+    """this function tests that the cosine transform of a constant array is concentrated in the zero wave number
+
+    GIVEN: a 4-by-7 array of ones
+    WHEN: it is transformed with dctn()
+    THEN: the zero mode is 4*Nx*Ny and all the other modes are 0"""
+    a_hat = dctn(np.ones((4, 7)), axes=(0, 1))
+    assert np.isclose(a_hat[0, 0], 4*4*7)
+    a_hat[0, 0] = 0.
+    assert np.allclose(a_hat, 0.)
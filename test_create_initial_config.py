@@ -1,5 +1,6 @@
 import numpy as np
-from create_initial_config import create_initial_config
+from create_initial_config import create_initial_config, read_grid_shape
+import configparser as cp
 from hypothesis import given
 import hypothesis.strategies as st
 import pytest as pt
@@ -101,4 +102,73 @@ def test_initStat_is_physical_configuration():
     np.random.seed(1)
     initState = create_initial_config(N, c_0, c_noise)
     initState_validity = np.logical_and(initState>=0, initState<=1)
-    assert initState.all()
\ No newline at end of file
+    assert initState.all()
+
+
+def test_initState_has_the_chosen_precision():
+    """This function tests that create_initial_config() returns the grid in the chosen floating point type,
+    with the same random values of the double precision grid
+
+       GIVEN: fixed N, c_0, c_noise values and the same seed
+       WHEN: the grid is created in float64 and in float32, and with an integer dtype
+       THEN: the float32 grid is the float64 one rounded to float32, and ValueError is raised for the integer dtype"""
+    np.random.seed(1)
+    initState_64 = create_initial_config(10, 0.5, 0.02)
+    np.random.seed(1)
+    initState_32 = create_initial_config(10, 0.5, 0.02, np.float32)
+    assert initState_64.dtype == np.float64
+    assert initState_32.dtype == np.float32
+    assert np.array_equal(initState_32, initState_64.astype(np.float32))
+    with pt.raises(ValueError):
+        create_initial_config(10, 0.5, 0.02, np.int64)
+
+
+def test_3D_initState_has_N_cubed_subcells():
+    """This function tests the initial configuration of a 3D supercell
+
+       GIVEN: fixed N, c_0, c_noise values
+       WHEN: a 3D supercell is created, and a supercell with 4 dimensions is requested
+       THEN: the grid has shape (N, N, N) and values within c_noise/2 of c_0, and ValueError is raised for 4 dimensions"""
+    np.random.seed(1)
+    initState = create_initial_config(6, 0.5, 0.02, dimensions=3)
+    assert initState.shape == (6, 6, 6)
+    assert np.all(np.abs(initState-0.5) <= 0.01)
+    with pt.raises(ValueError):
+        create_initial_config(6, 0.5, 0.02, dimensions=4)
+
+
+def test_rectangular_initState_has_the_given_shape():
+    """This function tests the initial configuration of a rectangular supercell, such as a thin film
+
+       GIVEN: fixed c_0, c_noise values, the shape (Ny, Nx) = (4, 12) and the same seed
+       WHEN: a rectangular supercell is created, and supercells of shapes (1, 12) and (4, 12.) are requested
+       THEN: the grid has shape (4, 12) and holds the random values of a square supercell with the same
+             number of subcells, ValueError is raised for a side of 1 and TypeError for a non integer side"""
+    np.random.seed(1)
+    initState = create_initial_config((4, 12), 0.5, 0.02)
+    np.random.seed(1)
+    square_initState = create_initial_config(12, 0.5, 0.02)
+    assert initState.shape == (4, 12)
+    assert np.array_equal(initState.ravel(), square_initState.ravel()[:48])
+    with pt.raises(ValueError):
+        create_initial_config((1, 12), 0.5, 0.02)
+    with pt.raises(TypeError):
+        create_initial_config((4, 12.), 0.5, 0.02)
+
+
+def test_read_grid_shape_without_N():
+    """This function tests the grid shape read from the microstructure settings
+
+       GIVEN: a 2D configuration with only Nx and Ny, a 3D one with Nx, Ny and N, and a 2D one with only Nx
+       WHEN: they are provided to read_grid_shape()
+       THEN: the shapes (Ny, Nx) and (Nz, Ny, Nx) are returned, with Nz = N, and ValueError is raised for the missing Ny"""
+    config = cp.ConfigParser()
+    config.read_dict({'microstructure_settings': {'Nx': '10', 'Ny': '6', 'dx': '1.', 'dy': '1.'}})
+    assert read_grid_shape(config) == (6, 10)
+    config.set('microstructure_settings', 'dz', '1.')
+    config.set('microstructure_settings', 'N', '4')
+    assert read_grid_shape(config) == (4, 6, 10)
+    config = cp.ConfigParser()
+    config.read_dict({'microstructure_settings': {'Nx': '10'}})
+    with pt.raises(ValueError):
+        read_grid_shape(config)
@@ -0,0 +1,77 @@
+import numpy as np
+import configparser as cp
+from ensemble import read_ensemble_settings, per_replica, create_ensemble_initial_config, replica_datasave_path
+from create_initial_config import create_initial_config
+from CahnHilliard_equation import INTEGRATORS
+from chemical_potential_free_energy import free_energy
+import pytest as pt
+
+BASE_VALUES = {'c0': 0.5, 'c_noise': 0.02, 'A': 1., 'M': 1., 'grad_coeff': 0.5, 'seed': 10}
+
+def make_config(ensemble_settings):
+    """This function returns a configuration holding only the given [ensemble] section"""
+    config = cp.ConfigParser()
+    config.read_dict({'ensemble': ensemble_settings})
+    return config
+
+def test_read_ensemble_settings_expands_parameters_per_replica():
+    """this function tests that read_ensemble_settings() returns one value per replica for each parameter
+
+    GIVEN: an [ensemble] section with 3 replicas, 3 values of c0, 1 value of A, no seeds
+    WHEN: it is provided to read_ensemble_settings()
+    THEN: c0 holds the 3 values, A is repeated, the other parameters take the base values 
+          and seeds are base seed + replica index"""
+    n_replicas, values = read_ensemble_settings(make_config({'n_replicas': '3', 'c0': '0.4, 0.5, 0.6', 'A': '2.'}), BASE_VALUES)
+    assert n_replicas == 3
+    assert np.array_equal(values['c0'], [0.4, 0.5, 0.6])
+    assert np.array_equal(values['A'], [2., 2., 2.])
+    assert np.array_equal(values['M'], [1., 1., 1.])
+    assert np.array_equal(values['seed'], [10, 11, 12])
+
+def test_read_ensemble_settings_fails_for_wrong_number_of_values():
+    """this function tests that read_ensemble_settings() raises an error if a list does not have 1 or n_replicas values
+
+    GIVEN: an [ensemble] section with 3 replicas and 2 values of c0
+    WHEN: it is provided to read_ensemble_settings()
+    THEN: function raises ValueError"""
+    with pt.raises(ValueError):
+        read_ensemble_settings(make_config({'n_replicas': '3', 'c0': '0.4, 0.5'}), BASE_VALUES)
+
+@pt.mark.parametrize('integrator', sorted(INTEGRATORS))
+def test_batch_integration_matches_single_replica_integration(integrator):
+    """this function tests that integrating a batch of replicas gives the same result as integrating
+    each replica separately, with per-replica parameters
+
+    GIVEN: 3 replicas with different c0, A, M, k and seeds, generated by create_ensemble_initial_config()
+    WHEN: they are integrated for 5 steps as a (3, N, N) batch and one by one
+    THEN: the initial grids are the ones of create_initial_config() with the replica seed, 
+          and batch and single results (grids and free energies) agree within 1e-12"""
+    N = 12
+    c0 = np.array([0.4, 0.5, 0.6])
+    c_noise = np.array([0.02, 0.05, 0.1])
+    A = np.array([1., 2., 0.5])
+    M = np.array([1., 0.5, 2.])
+    k = np.array([0.5, 1., 0.25])
+    seeds = np.array([1, 2, 3])
+    c_batch = create_ensemble_initial_config(N, c0, c_noise, seeds)
+    integrate = INTEGRATORS[integrator]
+    for b in range(3):
+        np.random.seed(seeds[b])
+        assert np.array_equal(c_batch[b], create_initial_config(N, c0[b], c_noise[b]))
+    c_single = c_batch.copy()
+    for i in range(5):
+        c_batch = integrate(c_batch, per_replica(A), per_replica(k), 1., 1., per_replica(M), 0.01)
+        for b in range(3):
+            c_single[b] = integrate(c_single[b], A[b], k[b], 1., 1., M[b], 0.01)
+    assert np.allclose(c_batch, c_single, rtol=0, atol=1e-12)
+    F_batch = free_energy(c_batch, per_replica(A), per_replica(k), 1., 1.)
+    assert np.shape(F_batch) == (3,)
+    assert np.allclose(F_batch, [free_energy(c_single[b], A[b], k[b], 1., 1.) for b in range(3)], rtol=1e-12)
+
+def test_replica_datasave_path_inserts_replica_index():
+    """this function tests that replica_datasave_path() returns a different file for each replica
+
+    GIVEN: the path ./Data/average_parameters.txt and replica 2
+    WHEN: they are provided to replica_datasave_path()
+    THEN: function returns ./Data/average_parameters_r2.txt"""
+    assert replica_datasave_path('./Data/average_parameters.txt', 2) == './Data/average_parameters_r2.txt'
@@ -0,0 +1,148 @@
+import numpy as np
+import configparser as cp
+import initial_conditions
+from initial_conditions import (generate_initial_config, add_nuclei, load_initial_config, open_initial_config_memmap,
+                                configured_initial_config, replica_seed_sequences, NOISE_MODELS)
+from snapshot_io import open_snapshot_writer
+from hypothesis import given, settings
+import hypothesis.strategies as st
+import pytest as pt
+
+@pt.mark.parametrize('noise', NOISE_MODELS)
+@pt.mark.parametrize('dtype', [np.float64, np.float32])
+def test_generated_grid_does_not_depend_on_tiling_or_memory_map(noise, dtype, tmp_path, monkeypatch):
+    """this function tests that the generated grid only depends on the seed and on the tiles, and not on the output array
+
+    GIVEN: a 24-by-20 grid, the same seed, tiles of 3 rows
+    WHEN: the grid is generated twice in memory and once in a memory map
+    THEN: the three grids are equal, have the requested dtype and their values are in [0,1]"""
+    monkeypatch.setattr(initial_conditions, 'TILE_ELEMENTS', 60)
+    grids = [generate_initial_config((24, 20), 0.5, 0.1, noise, np.random.SeedSequence(7), dtype) for i in range(2)]
+    memmap = open_initial_config_memmap(tmp_path/'c.npy', (24, 20), dtype)
+    generate_initial_config((24, 20), 0.5, 0.1, noise, np.random.SeedSequence(7), out=memmap)
+    memmap.flush()
+    grids.append(np.load(tmp_path/'c.npy'))
+    for c in grids:
+        assert c.dtype == dtype
+        assert np.array_equal(c, grids[0])
+        assert np.all((c >= 0.) & (c <= 1.))
+
+@given(c_0=st.floats(0.3, 0.7), c_noise=st.floats(0.01, 0.05), seed=st.integers(0, 2**32-1))
+@settings(deadline=None, max_examples=20)
+def test_generated_noise_has_the_requested_statistics(c_0, c_noise, seed):
+    """this function tests the average and the fluctuation of the noise models
+
+    GIVEN: a 64-by-64 grid with valid c_0, c_noise and seed
+    WHEN: it is generated with the uniform, gaussian and correlated (correlation length 4.) noise
+    THEN: the uniform values are in [c_0 - c_noise/2, c_0 + c_noise/2], the gaussian and correlated grids have
+          average about c_0, and the correlated grid has standard deviation c_noise and correlated neighbours"""
+    seed_sequence = np.random.SeedSequence(seed)
+    c = generate_initial_config((64, 64), c_0, c_noise, 'uniform', seed_sequence)
+    assert np.all((c >= c_0 - c_noise/2 - 1e-12) & (c <= c_0 + c_noise/2 + 1e-12))
+    c = generate_initial_config((64, 64), c_0, c_noise, 'gaussian', seed_sequence)
+    assert abs(c.mean() - c_0) < 0.1*c_noise
+    c = generate_initial_config((64, 64), c_0, c_noise, 'correlated', seed_sequence, correlation_length=4.)
+    assert np.isclose(c.mean(), c_0) and np.isclose(c.std(), c_noise)
+    assert np.corrcoef(c[:, :-1].ravel(), c[:, 1:].ravel())[0, 1] > 0.9
+
+def test_replicas_get_independent_streams():
+    """this function tests the seed sequences of the replicas
+
+    GIVEN: a seed and 3 replicas, or explicit seeds per replica
+    WHEN: their seed sequences are computed by replica_seed_sequences() and grids are generated from them
+    THEN: the grids of the replicas are different, equal for the same seed, and explicit seeds are used as given"""
+    grids = [generate_initial_config((8, 8), 0.5, 0.1, 'uniform', s) for s in replica_seed_sequences(1, 3)]
+    assert not np.array_equal(grids[0], grids[1]) and not np.array_equal(grids[1], grids[2])
+    again = generate_initial_config((8, 8), 0.5, 0.1, 'uniform', replica_seed_sequences(1, 3)[1])
+    assert np.array_equal(grids[1], again)
+    explicit = replica_seed_sequences(1, 2, np.array([5, 5]))
+    assert explicit[0].entropy == explicit[1].entropy == 5
+
+def test_add_nuclei_places_periodic_discs():
+    """this function tests the nuclei added to a grid
+
+    GIVEN: a 3D 12-by-12-by-12 grid of zeros, and a 2D 20-by-20 grid of zeros
+    WHEN: one nucleus of radius 1. and concentration 0.9 is added to the 3D grid, and 3 nuclei of radius 2. to the 2D one
+    THEN: the 3D nucleus has the 7 subcells of a sphere of radius 1., and the 2D nuclei cover at most 3 discs of 13 subcells"""
+    c = np.zeros((12, 12, 12))
+    add_nuclei(c, 1, 1., 0.9, np.random.default_rng(2), (1., 1., 1.))
+    assert np.sum(c == 0.9) == 7 and np.sum(c == 0.) == 12**3-7
+    c = np.zeros((20, 20))
+    add_nuclei(c, 3, 2., 1., np.random.default_rng(2), (1., 1.))
+    assert 13 <= c.sum() <= 39
+    with pt.raises(ValueError):
+        add_nuclei(c, 1, 0., 1., np.random.default_rng(2), (1., 1.))
+    with pt.raises(ValueError):
+        add_nuclei(c, 1, 1., 1.5, np.random.default_rng(2), (1., 1.))
+
+def test_load_initial_config_from_files(tmp_path):
+    """this function tests the initial grids loaded from files
+
+    GIVEN: a .npy file of a 6-by-5 grid and a text snapshot file with two frames
+    WHEN: the grids are loaded, also for an ensemble of 2 replicas, and with a wrong shape
+    THEN: the stored grid and the requested frame are returned, copied to each replica, and ValueError is raised
+          for the wrong shape"""
+    c = np.random.default_rng(0).random((6, 5))
+    np.save(tmp_path/'c.npy', c)
+    assert np.array_equal(load_initial_config(str(tmp_path/'c.npy'), (6, 5)), c)
+    replicas = load_initial_config(str(tmp_path/'c.npy'), (2, 6, 5))
+    assert np.array_equal(replicas[0], c) and np.array_equal(replicas[1], c)
+    with open_snapshot_writer(str(tmp_path/'c.txt'), 'text', (6, 5), 2) as writer:
+        writer.write(0., c)
+        writer.write(1., 1.-c)
+    assert np.allclose(load_initial_config(str(tmp_path/'c.txt'), (6, 5), 'text', 0), c)
+    assert np.allclose(load_initial_config(str(tmp_path/'c.txt'), (6, 5), 'text'), 1.-c)
+    with pt.raises(ValueError):
+        load_initial_config(str(tmp_path/'c.npy'), (5, 6))
+
+def test_generate_initial_config_fails_with_incorrect_parameters():
+    """this function tests that generate_initial_config() raises an error for invalid parameters
+
+    GIVEN: a 1D shape, c_0 > 1, an unknown noise model, uniform noise giving negative concentrations,
+           a zero correlation length, a wrong output shape
+    WHEN: they are provided to generate_initial_config()
+    THEN: ValueError is raised"""
+    with pt.raises(ValueError):
+        generate_initial_config((16,), 0.5, 0.1)
+    with pt.raises(ValueError):
+        generate_initial_config((8, 8), 1.5, 0.1)
+    with pt.raises(ValueError):
+        generate_initial_config((8, 8), 0.5, 0.1, 'pink')
+    with pt.raises(ValueError):
+        generate_initial_config((8, 8), 0.05, 0.2)
+    with pt.raises(ValueError):
+        generate_initial_config((8, 8), 0.5, 0.1, 'correlated', correlation_length=0.)
+    with pt.raises(ValueError):
+        generate_initial_config((8, 8), 0.5, 0.1, out=np.empty((8, 9)))
+
+def test_configured_initial_config_follows_the_initial_conditions_section(tmp_path):
+    """this function tests the initial grids built from the initial_conditions section of a configuration
+
+    GIVEN: configurations of an ensemble of 2 replicas of 8-by-10 grids with gaussian noise, written to a memory map,
+           then with 2 nuclei of concentration 1., and loading a grid from a .npy file
+    WHEN: they are provided to configured_initial_config()
+    THEN: the grids are the ones of generate_initial_config() for each replica, stored in the memory map file,
+          the nuclei set some subcells to 1., and the loaded grid is copied to each replica"""
+    config = cp.ConfigParser()
+    config.read_dict({'initial_conditions': {'noise': 'gaussian', 'memmap_path': str(tmp_path/'initial.npy')}})
+    seed_sequences = replica_seed_sequences(1, 2)
+    arguments = ((8, 10), np.array([0.4, 0.6]), np.array([0.02, 0.02]), seed_sequences, np.float64, (1., 1.))
+    c = configured_initial_config(config, *arguments, ensemble=True)
+    assert np.array_equal(np.load(tmp_path/'initial.npy'), c)
+    #copied, since the next grids are written to the same memory map file
+    c = np.array(c)
+    assert np.shape(c) == (2, 8, 10)
+    for b in range(2):
+        expected = generate_initial_config((8, 10), [0.4, 0.6][b], 0.02, 'gaussian', replica_seed_sequences(1, 2)[b])
+        assert np.array_equal(c[b], expected)
+
+    config.set('initial_conditions', 'n_nuclei', '2')
+    c_nuclei = configured_initial_config(config, *arguments, ensemble=True)
+    assert np.all(np.any(c_nuclei == 1., axis=(1, 2)))
+    assert np.array_equal(c_nuclei[c_nuclei != 1.], c[c_nuclei != 1.])
+
+    np.save(tmp_path/'c.npy', c[0])
+    config = cp.ConfigParser()
+    config.read_dict({'initial_conditions': {'path': str(tmp_path/'c.npy')}})
+    c_loaded = configured_initial_config(config, *arguments, ensemble=True)
+    assert np.array_equal(c_loaded[0], c[0]) and np.array_equal(c_loaded[1], c[0])
@@ -0,0 +1,38 @@
+import numpy as np
+from output_schedule import linear_output_steps, log_output_steps, output_steps
+from hypothesis import given
+import hypothesis.strategies as st
+import pytest as pt
+
+@given(n_iterations=st.integers(min_value=0, max_value=10000), every=st.integers(min_value=1, max_value=500))
+def test_linear_output_steps_include_first_and_last_step(n_iterations, every):
+    """this function tests that linear_output_steps() returns increasing steps spaced by `every`,
+    always including the initial and the final step
+
+    GIVEN: random n_iterations and cadence every
+    WHEN: they are provided to linear_output_steps()
+    THEN: the first step is 0, the last is n_iterations, and steps (except the last) are multiples of every"""
+    steps = linear_output_steps(n_iterations, every)
+    assert steps[0] == 0
+    assert steps[-1] == n_iterations
+    assert np.all(np.diff(steps) > 0)
+    assert np.all(steps[:-1] % every == 0)
+
+def test_log_output_steps_are_logarithmically_spaced():
+    """this function tests that log_output_steps() returns the expected steps
+
+    GIVEN: n_iterations = 1000, n_points = 4
+    WHEN: they are provided to log_output_steps()
+    THEN: function returns steps 0, 1, 10, 100, 1000"""
+    assert np.array_equal(log_output_steps(1000, 4), [0, 1, 10, 100, 1000])
+
+def test_output_steps_fails_for_invalid_parameters():
+    """this function tests that output_steps() raises an error for invalid cadence or schedule
+
+    GIVEN: cadence 0, unknown schedule name
+    WHEN: they are provided to output_steps()
+    THEN: function raises ValueError"""
+    with pt.raises(ValueError):
+        output_steps(100, 0)
+    with pt.raises(ValueError):
+        output_steps(100, 1, 'quadratic')
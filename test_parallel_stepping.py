@@ -0,0 +1,124 @@
+import numpy as np
+from parallel_stepping import ParallelStepEngine, _row_runs
+from CahnHilliard_equation import Cahn_Hilliard_equation_integration
+from stencil_workspace import Cahn_Hilliard_inplace_integration
+from concentration_laplacian import boundary_indices
+import pytest as pt
+
+@pt.mark.parametrize('dtype', [np.float64, np.float32])
+@pt.mark.parametrize('n_workers', [1, 3])
+def test_parallel_integration_is_bit_for_bit_equal_to_serial_one(n_workers, dtype):
+    """this function tests that ParallelStepEngine gives exactly the same result as the serial integration,
+    also when the strips have different number of rows
+
+    GIVEN: a random 11-by-7 concentration grid (in double or single precision), dx=1, dy=1.2, and 1 or 3 workers
+    WHEN: it is evolved for 6 steps (in two calls) by ParallelStepEngine and by Cahn_Hilliard_equation_integration()
+    THEN: the two grids are exactly equal, with the precision of the initial grid"""
+    np.random.seed(1)
+    c = (0.5 + 0.1*(0.5-np.random.rand(11, 7))).astype(dtype)
+    c_serial = c
+    for i in range(6):
+        c_serial = Cahn_Hilliard_equation_integration(c_serial, 1., 0.5, 1., 1.2, 1., 0.01)
+    with ParallelStepEngine(c, 1., 0.5, 1., 1.2, 1., 0.01, n_workers=n_workers) as engine:
+        engine.step(4)
+        c_parallel = engine.step(2)
+    assert c_parallel.dtype == dtype
+    assert np.array_equal(c_parallel, c_serial)
+
+def test_parallel_3D_integration_is_bit_for_bit_equal_to_serial_one():
+    """this function tests that ParallelStepEngine splits a 3D grid in slabs along z giving the serial result
+
+    GIVEN: a random 9-by-6-by-7 grid, dz=0.9, and 3 workers
+    WHEN: it is evolved for 3 steps by ParallelStepEngine and by Cahn_Hilliard_equation_integration()
+    THEN: the two grids are exactly equal"""
+    np.random.seed(1)
+    c = 0.5 + 0.1*(0.5-np.random.rand(9, 6, 7))
+    c_serial = c
+    for i in range(3):
+        c_serial = Cahn_Hilliard_equation_integration(c_serial, 1., 0.5, 1., 1.2, 1., 0.01, dz=0.9)
+    with ParallelStepEngine(c, 1., 0.5, 1., 1.2, 1., 0.01, n_workers=3, dz=0.9) as engine:
+        c_parallel = engine.step(3)
+    assert np.array_equal(c_parallel, c_serial)
+
+@pt.mark.parametrize('dz, shape', [(None, (11, 7)), (0.9, (9, 6, 7))])
+def test_parallel_neumann_integration_is_bit_for_bit_equal_to_serial_one(dz, shape):
+    """this function tests the parallel integration with neumann boundary conditions, whose halos are the
+    mirrored rows at the edges of the grid
+
+    GIVEN: a random 11-by-7 grid (9-by-6-by-7 grid with dz=0.9), neumann boundary conditions and 3 workers
+    WHEN: it is evolved for 3 steps by ParallelStepEngine and by Cahn_Hilliard_equation_integration()
+    THEN: the two grids are exactly equal"""
+    np.random.seed(1)
+    c = 0.5 + 0.1*(0.5-np.random.rand(*shape))
+    c_serial = c
+    for i in range(3):
+        c_serial = Cahn_Hilliard_equation_integration(c_serial, 1., 0.5, 1., 1.2, 1., 0.01, dz=dz, boundary='neumann')
+    with ParallelStepEngine(c, 1., 0.5, 1., 1.2, 1., 0.01, n_workers=3, dz=dz, boundary='neumann') as engine:
+        c_parallel = engine.step(3)
+    assert np.array_equal(c_parallel, c_serial)
+
+@pt.mark.parametrize('boundary', ['periodic', 'neumann'])
+def test_parallel_inplace_integration_is_bit_for_bit_equal_to_serial_one(boundary):
+    """this function tests the parallel integration with the operations of the in place integrator
+
+    GIVEN: a random 13-by-6 grid, periodic or neumann boundary conditions and 4 workers
+    WHEN: it is evolved for 5 steps by ParallelStepEngine with inplace=True and by Cahn_Hilliard_inplace_integration()
+    THEN: the two grids are exactly equal"""
+    np.random.seed(1)
+    c = 0.5 + 0.1*(0.5-np.random.rand(13, 6))
+    c_serial = c.copy()
+    for i in range(5):
+        Cahn_Hilliard_inplace_integration(c_serial, 1., 0.5, 1., 1.2, 1., 0.01, boundary=boundary)
+    with ParallelStepEngine(c, 1., 0.5, 1., 1.2, 1., 0.01, n_workers=4, boundary=boundary, inplace=True) as engine:
+        c_parallel = engine.step(5)
+    assert np.array_equal(c_parallel, c_serial)
+
+@pt.mark.parametrize('boundary', ['periodic', 'neumann'])
+@pt.mark.parametrize('n, r0, r1', [(5, 0, 5), (5, 0, 2), (11, 3, 7), (11, 9, 11), (3, 1, 2)])
+def test_row_runs_gather_the_rows_of_a_strip_with_basic_slices(n, r0, r1, boundary):
+    """this function tests the slices copying the rows of a strip plus its 2-rows halos
+
+    GIVEN: a grid of n rows, the strip of rows [r0, r1) and the boundary conditions
+    WHEN: the block of the strip is filled with the slices of _row_runs()
+    THEN: the block holds the rows of the grid given by boundary_indices()"""
+    rows = boundary_indices(np.arange(r0-2, r1+2), n, boundary)
+    grid = np.arange(n*3.).reshape(n, 3)
+    block = np.empty((len(rows), 3))
+    for block_rows, grid_rows in _row_runs(rows):
+        block[block_rows] = grid[grid_rows]
+    assert np.array_equal(block, grid[rows])
+
+def test_parallel_engine_fails_with_incorrect_parameters():
+    """this function tests that ParallelStepEngine raises an error for invalid parameters
+
+    GIVEN: negative dt, a batch of grids, 0 workers
+    WHEN: they are provided to ParallelStepEngine
+    THEN: ValueError is raised"""
+    c = np.full((4, 4), 0.5)
+    with pt.raises(ValueError):
+        ParallelStepEngine(c, 1., 0.5, 1., 1., 1., -0.01, n_workers=2)
+    with pt.raises(ValueError):
+        ParallelStepEngine(np.full((2, 4, 4), 0.5), 1., 0.5, 1., 1., 1., 0.01, n_workers=2)
+    with pt.raises(ValueError):
+        ParallelStepEngine(c, 1., 0.5, 1., 1., 1., 0.01, n_workers=0)
+
+def test_parallel_engine_fails_when_a_worker_dies():
+    """this function tests that the parallel integration is aborted, instead of waiting forever,
+    when a worker process dies during the run
+
+    GIVEN: a parallel engine with 2 workers, after a first step
+    WHEN: worker 0 is terminated and more steps are requested
+    THEN: step() raises RuntimeError naming worker 0, and the engine is closed"""
+    np.random.seed(1)
+    c = np.random.rand(12, 12)
+    engine = ParallelStepEngine(c, 1., 0.5, 1., 1., 1., 0.01, n_workers=2)
+    try:
+        engine.step()
+        engine._workers[0].terminate()
+        engine._workers[0].join()
+        with pt.raises(RuntimeError, match='worker 0'):
+            engine.step(5)
+        with pt.raises(RuntimeError):
+            engine.step()
+    finally:
+        engine.close()
@@ -0,0 +1,82 @@
+import numpy as np
+import json
+import time
+from profiling import PhaseProfiler
+
+def test_profiler_records_cumulative_and_per_step_times():
+    """this function tests that the time of each phase is accumulated and stored for each step
+
+    GIVEN: a profiler, and 3 steps in which phase 'a' sleeps 1 ms, and phase 'b' sleeps 2 ms only in the last step
+    WHEN: the steps are closed with end_step()
+    THEN: 'a' has 3 calls and 3 per-step times of at least 1 ms, 'b' has per-step times 0, 0 and at least 2 ms,
+          and the cumulative time is the sum of the per-step ones"""
+    profiler = PhaseProfiler()
+    profiler.start()
+    for step in range(3):
+        with profiler.phase('a'):
+            time.sleep(0.001)
+        if step == 2:
+            with profiler.phase('b'):
+                time.sleep(0.002)
+        profiler.end_step()
+    profiler.stop()
+    assert profiler.n_steps == 3
+    assert profiler.calls == {'a': 3, 'b': 1}
+    assert all(step_time >= 0.001 for step_time in profiler.step_times['a'])
+    assert profiler.step_times['b'][:2] == [0., 0.] and profiler.step_times['b'][2] >= 0.002
+    assert np.isclose(profiler.cumulative['a'], sum(profiler.step_times['a']))
+
+def test_profiler_calls_hooks_at_phase_boundaries():
+    """this function tests that the hooks are called at the start and end of each phase
+
+    GIVEN: a profiler with a hook storing the received events
+    WHEN: phase 'a' is executed, containing phase 'b'
+    THEN: the hook received start a, start b, end b, end a"""
+    events = []
+    profiler = PhaseProfiler()
+    profiler.add_hook(lambda event, name: events.append((event, name)))
+    with profiler.phase('a'):
+        with profiler.phase('b'):
+            pass
+    assert events == [('start', 'a'), ('start', 'b'), ('end', 'b'), ('end', 'a')]
+
+def test_disabled_profiler_records_nothing():
+    """this function tests that a disabled profiler does not record anything nor call the hooks
+
+    GIVEN: a disabled profiler with a hook
+    WHEN: a phase is executed, bytes are added and a step is closed
+    THEN: no phase, step or byte is recorded, and the hook is not called"""
+    events = []
+    profiler = PhaseProfiler(enabled=False)
+    profiler.add_hook(lambda event, name: events.append((event, name)))
+    profiler.start()
+    with profiler.phase('a'):
+        pass
+    profiler.add_bytes('snapshots', 10)
+    profiler.end_step()
+    assert profiler.cumulative == {} and profiler.n_steps == 0 and profiler.bytes_written == {}
+    assert events == []
+
+def test_profiler_report(tmp_path):
+    """this function tests the JSON report of the profiler
+
+    GIVEN: a profiler with 2 steps of phase 'a', 10 bytes of snapshots and 5 bytes of averages
+    WHEN: the report is written with write_report() and read back
+    THEN: it holds 2 steps, a positive number of steps per second, 15 total bytes, and phase 'a' with 2 calls"""
+    path = str(tmp_path/'report.json')
+    profiler = PhaseProfiler()
+    profiler.start()
+    for step in range(2):
+        with profiler.phase('a'):
+            time.sleep(0.001)
+        profiler.end_step()
+    profiler.stop()
+    profiler.add_bytes('snapshots', 10)
+    profiler.add_bytes('averages', 5)
+    profiler.write_report(path)
+    with open(path) as f:
+        report = json.load(f)
+    assert report['n_steps'] == 2
+    assert report['steps_per_second'] > 0.
+    assert report['bytes_written']['total'] == 15
+    assert report['phases']['a']['calls'] == 2
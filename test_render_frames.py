@@ -0,0 +1,65 @@
+import numpy as np
+import os
+from hypothesis import given
+import hypothesis.strategies as st
+from snapshot_io import open_snapshot_writer
+from render_frames import downsample_grid, frame_indices, render_frames, assemble_animation
+import pytest as pt
+
+@given(factor=st.integers(1, 6), Ny=st.integers(6, 20), Nx=st.integers(6, 20))
+def test_downsample_grid_averages_blocks(factor, Ny, Nx):
+    """this function tests that downsample_grid() averages whole blocks of subcells
+
+    GIVEN: a random Ny-by-Nx grid and a downsampling factor
+    WHEN: it is downsampled
+    THEN: the shape is (Ny//factor, Nx//factor), the first pixel is the mean of the first block,
+          and the mean of the pixels is the mean of the cropped grid"""
+    np.random.seed(0)
+    c = np.random.rand(Ny, Nx)
+    downsampled = downsample_grid(c, factor)
+    assert downsampled.shape == (Ny//factor, Nx//factor)
+    assert np.isclose(downsampled[0, 0], c[:factor, :factor].mean())
+    assert np.isclose(downsampled.mean(), c[:(Ny//factor)*factor, :(Nx//factor)*factor].mean())
+
+def test_frame_indices_and_downsampling_reject_invalid_values():
+    """this function tests the frame indices shown in the animation and the validation of the rendering options
+
+    GIVEN: 12 stored frames
+    WHEN: the indices are computed with stride 5, and stride or downsampling factor 0 are given
+    THEN: frames 0, 5, 10 are shown, and ValueError is raised for the invalid values"""
+    assert frame_indices(12, 5) == [0, 5, 10]
+    with pt.raises(ValueError):
+        frame_indices(12, 0)
+    with pt.raises(ValueError):
+        downsample_grid(np.zeros((4, 4)), 0)
+
+def test_unknown_animation_format_is_rejected(tmp_path):
+    """this function tests that assemble_animation() accepts only .gif and .mp4 animations
+
+    GIVEN: an animation path with extension .avi
+    WHEN: the frames are assembled
+    THEN: ValueError is raised"""
+    with pt.raises(ValueError):
+        assemble_animation([str(tmp_path/'frame_000000.png')], str(tmp_path/'animation.avi'))
+
+@pt.mark.parametrize('n_workers', [1, 2])
+def test_render_frames_writes_one_image_per_shown_frame(tmp_path, n_workers):
+    """this function tests that the frames rendered on a process pool are the ones shown by the animation,
+    and that they are assembled in a GIF with one image per frame
+
+    GIVEN: 11 stored 16-by-16 grids
+    WHEN: they are rendered with stride 5 and downsampling 2 on n_workers processes, and assembled in a GIF
+    THEN: 3 images are written, and the GIF has 3 frames"""
+    pt.importorskip('matplotlib')
+    Image = pt.importorskip('PIL.Image')
+    path = str(tmp_path/'configurations.npy')
+    np.random.seed(1)
+    with open_snapshot_writer(path, 'binary', (16, 16), 11) as writer:
+        for i in range(11):
+            writer.write(0.1*i, np.random.rand(16, 16))
+    frame_paths = render_frames(path, 'binary', str(tmp_path/'frames'), stride=5, downsample=2, n_workers=n_workers)
+    assert len(frame_paths) == 3
+    assert all(os.path.exists(frame_path) for frame_path in frame_paths)
+    assemble_animation(frame_paths, str(tmp_path/'animation.gif'))
+    with Image.open(str(tmp_path/'animation.gif')) as animation:
+        assert animation.n_frames == 3
@@ -0,0 +1,449 @@
+import numpy as np
+import configparser as cp
+import os
+from simulation_api import Simulation, RingBufferSink, CallbackSink, run_configured_simulation
+from structure_factor import StructureFactorAnalyzer
+from CahnHilliard_equation import Cahn_Hilliard_equation_integration
+from chemical_potential_free_energy import free_energy
+from create_initial_config import create_initial_config
+from snapshot_io import load_snapshots
+from hypothesis import given, settings
+import hypothesis.strategies as st
+import pytest as pt
+
+def make_simulation(n_iterations=10, N=8, **options):
+    """This function returns a simulation of a seeded random N-by-N grid with the default parameters"""
+    np.random.seed(1)
+    c = create_initial_config(N, 0.5, 0.02)
+    return Simulation(c, 1., 0.5, 1., 1., 1., 0.01, n_iterations, **options)
+
+def make_config(tmp_path):
+    """This function returns the default configuration file with a small grid, few time steps and outputs in tmp_path"""
+    config = cp.ConfigParser()
+    config.read(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'simulation_configuration.txt'))
+    config.set('microstructure_settings', 'N', '6')
+    config.set('time_settings', 'n_iterations', '20')
+    config.set('checkpoint', 'checkpoint_every', '10')
+    config.set('data_paths', 'c_config_datasave', str(tmp_path/'configurations.npy'))
+    config.set('data_paths', 'aver_quantities_datasave', str(tmp_path/'average_parameters.txt'))
+    config.set('data_paths', 'structure_factor_datasave', str(tmp_path/'structure_factor.txt'))
+    config.set('checkpoint', 'checkpoint_path', str(tmp_path/'checkpoint.npz'))
+    return config
+
+def test_run_yields_states_of_the_explicit_integration():
+    """this function tests that run() yields the same grids obtained calling the integrator step by step
+
+    GIVEN: a simulation of 10 steps of an 8-by-8 grid
+    WHEN: all its states are requested with run(every=1)
+    THEN: 11 states are yielded, with times t0+i*dt and grids equal to the ones of Cahn_Hilliard_equation_integration()"""
+    simulation = make_simulation()
+    c = simulation.c.copy()
+    states = [(t, c_t.copy(), diagnostics) for t, c_t, diagnostics in simulation.run(every=1)]
+    assert len(states) == 11
+    for i, (t, c_t, diagnostics) in enumerate(states):
+        assert np.isclose(t, 0.01*i)
+        assert np.array_equal(c_t, c)
+        assert np.isclose(diagnostics['free_energy'], free_energy(c, 1., 0.5, 1., 1.))
+        c = Cahn_Hilliard_equation_integration(c, 1., 0.5, 1., 1., 1., 0.01)
+
+@given(n_iterations=st.integers(min_value=1, max_value=30), every=st.integers(min_value=1, max_value=10))
+@settings(deadline=None, max_examples=20)
+def test_run_yields_at_chosen_cadence(n_iterations, every):
+    """this function tests the cadence of the states yielded by run()
+
+    GIVEN: a simulation of n_iterations steps
+    WHEN: the states are requested every few steps
+    THEN: the steps multiple of every and the final step are yielded"""
+    simulation = make_simulation(n_iterations, N=4)
+    steps = [int(round(t/0.01)) for t, c, diagnostics in simulation.run(every=every, with_diagnostics=False)]
+    assert steps == sorted(set(range(0, n_iterations+1, every)) | {n_iterations})
+
+def test_sinks_receive_states_at_their_steps():
+    """this function tests that the sinks receive the initial state, the states at their steps and the final state,
+    and that the ring buffer keeps copies of the last states
+
+    GIVEN: a simulation of 10 steps, a callback sink at steps 3 and 6, and a ring buffer sink of capacity 3 at each step
+    WHEN: the simulation is run to the end
+    THEN: the callback received steps 0, 3, 6, 10, the ring buffer holds steps 8, 9, 10, 
+          and its last grid is equal to the final grid but is not the same array"""
+    simulation = make_simulation()
+    received = []
+    simulation.add_sink(CallbackSink(lambda state: received.append(state.step)), steps=[3, 6])
+    ring_buffer = RingBufferSink(3, needs_diagnostics=True)
+    simulation.add_sink(ring_buffer)
+    simulation.run_to_end()
+    assert received == [0, 3, 6, 10]
+    assert [state.step for state in ring_buffer.states] == [8, 9, 10]
+    assert np.array_equal(ring_buffer.states[-1].c, simulation.c)
+    assert ring_buffer.states[-1].c is not simulation.c
+    assert ring_buffer.states[-1].diagnostics is not None
+
+def test_simulation_stops_at_t_end():
+    """this function tests that the simulation stops at t_end
+
+    GIVEN: a simulation of 100 steps with dt=0.01 and t_end=0.5
+    WHEN: it is run to the end
+    THEN: it stopped after 50 steps"""
+    simulation = make_simulation(100, t_end=0.5)
+    simulation.run_to_end()
+    assert simulation.step == 50
+    assert simulation.finished
+
+def test_default_configuration_performs_all_the_fixed_steps(tmp_path):
+    """this function tests that the default configuration file does not cut a fixed-step simulation at t_end
+
+    GIVEN: the default configuration file, with adaptive = False, dt = 1 and 200 steps
+    WHEN: the simulation is run to the end
+    THEN: all the 200 steps are performed"""
+    config = make_config(tmp_path)
+    config.set('time_settings', 'n_iterations', '200')
+    config.set('time_settings', 'dt', '1.')
+    simulation = Simulation.from_config(config)
+    simulation.run_to_end()
+    assert simulation.t_end == np.inf and simulation.step == 200
+
+def test_simulation_rejects_parallel_integration_with_other_integrators():
+    """this function tests that the parallel integration can only be chosen with the explicit integrator
+
+    GIVEN: the spectral integrator and 2 workers
+    WHEN: they are provided to Simulation
+    THEN: ValueError is raised"""
+    with pt.raises(ValueError):
+        make_simulation(integrator='spectral', n_workers=2)
+    with pt.raises(ValueError):
+        make_simulation(adaptive=True, n_workers=2)
+    with pt.raises(ValueError):
+        RingBufferSink(0)
+
+def test_run_configured_simulation_writes_outputs_and_restarts(tmp_path):
+    """this function tests that run_configured_simulation() writes all the outputs of the configuration,
+    and that restarting from the checkpoint reproduces them
+
+    GIVEN: a configuration of a 6-by-6 grid, 20 steps and a checkpoint every 10 steps
+    WHEN: the simulation is run, and then restarted from its final checkpoint
+    THEN: 21 snapshots and 21+1 lines of average quantities are written, and the restart does not change them"""
+    config = make_config(tmp_path)
+    simulation = run_configured_simulation(config, log=None)
+    times, frames = load_snapshots(str(tmp_path/'configurations.npy'), 'binary')
+    assert np.shape(frames) == (21, 6, 6)
+    assert np.array_equal(frames[-1], simulation.c)
+    with open(tmp_path/'average_parameters.txt') as f:
+        lines = f.readlines()
+    assert len(lines) == 22
+
+    run_configured_simulation(config, restart=str(tmp_path/'checkpoint.npz'), log=None)
+    with open(tmp_path/'average_parameters.txt') as f:
+        assert f.readlines() == lines
+
+@pt.mark.parametrize('output_format', ['binary', 'text', 'compressed'])
+def test_restarted_simulation_can_be_extended(tmp_path, output_format):
+    """this function tests that a simulation restarted from its final checkpoint with a larger n_iterations
+    continues the run, growing the grids file
+
+    GIVEN: a configuration of 20 steps with a checkpoint every 10 steps, and an output format
+    WHEN: the simulation is run, and restarted from its final checkpoint with n_iterations = 40
+    THEN: the stored grids and average quantities are the same of an uninterrupted run of 40 steps"""
+    config = make_config(tmp_path)
+    config.set('data_paths', 'output_format', output_format)
+    run_configured_simulation(config, log=None)
+    config.set('time_settings', 'n_iterations', '40')
+    run_configured_simulation(config, restart=str(tmp_path/'checkpoint.npz'), log=None)
+    times, frames = load_snapshots(str(tmp_path/'configurations.npy'), output_format)
+    with open(tmp_path/'average_parameters.txt') as f:
+        lines = f.readlines()
+
+    reference_path = tmp_path/'reference'
+    reference_path.mkdir()
+    reference_config = make_config(reference_path)
+    reference_config.set('data_paths', 'output_format', output_format)
+    reference_config.set('time_settings', 'n_iterations', '40')
+    run_configured_simulation(reference_config, log=None)
+    expected_times, expected_frames = load_snapshots(str(reference_path/'configurations.npy'), output_format)
+    assert len(times) == 41
+    assert np.array_equal(times, expected_times)
+    assert np.array_equal(np.array(frames[:]), np.array(expected_frames[:]))
+    with open(reference_path/'average_parameters.txt') as f:
+        assert f.readlines() == lines
+
+@pt.mark.parametrize('output_format', ['binary', 'text', 'compressed'])
+def test_restarted_simulation_can_change_the_output_cadence(tmp_path, output_format):
+    """this function tests that the outputs written before the checkpoint are kept when a simulation
+    is restarted with a different output cadence
+
+    GIVEN: a simulation of 10 steps saving grids and average quantities at each step, with a checkpoint at step 10
+    WHEN: it is restarted from the checkpoint with n_iterations = 20, snapshot_every = 5 and diagnostics_every = 5
+    THEN: the 11 grids and rows of average quantities of the first run are kept, followed by the ones of steps 15 and 20"""
+    config = make_config(tmp_path)
+    config.set('data_paths', 'output_format', output_format)
+    config.set('time_settings', 'n_iterations', '10')
+    run_configured_simulation(config, log=None)
+    times, frames = load_snapshots(str(tmp_path/'configurations.npy'), output_format)
+    frames = np.array(frames[:])
+    with open(tmp_path/'average_parameters.txt') as f:
+        lines = f.readlines()
+
+    config.set('time_settings', 'n_iterations', '20')
+    config.set('time_settings', 'snapshot_every', '5')
+    config.set('time_settings', 'diagnostics_every', '5')
+    run_configured_simulation(config, restart=str(tmp_path/'checkpoint.npz'), log=None)
+    times_restarted, frames_restarted = load_snapshots(str(tmp_path/'configurations.npy'), output_format)
+    assert np.allclose(times_restarted, np.append(times, [0.15, 0.2]))
+    assert np.array_equal(np.array(frames_restarted[:11]), frames)
+    with open(tmp_path/'average_parameters.txt') as f:
+        lines_restarted = f.readlines()
+    assert lines_restarted[:12] == lines
+    assert [float(line.split()[0]) for line in lines_restarted[12:]] == pt.approx([0.15, 0.2])
+
+@pt.mark.parametrize('output_format', ['binary', 'text', 'compressed'])
+@pt.mark.parametrize('integrator, adaptive', [('explicit', 'False'), ('explicit_inplace', 'False'), ('spectral', 'True')])
+def test_float32_simulation_keeps_its_precision(tmp_path, output_format, integrator, adaptive):
+    """this function tests that a simulation configured with dtype float32 keeps the float32 precision
+    in the integration, in the stored grids and in the grids loaded for the plots
+
+    GIVEN: a configuration with dtype float32, an integrator (with adaptive time stepping for the spectral one)
+           and an output format
+    WHEN: the simulation is run and its grids are loaded with load_snapshots()
+    THEN: the final grid is float32, the time is a python float, and the last stored grid is the final one"""
+    config = make_config(tmp_path)
+    config.set('time_settings', 'dtype', 'float32')
+    config.set('time_settings', 'integrator', integrator)
+    config.set('time_settings', 'adaptive', adaptive)
+    config.set('data_paths', 'output_format', output_format)
+    simulation = run_configured_simulation(config, log=None)
+    assert simulation.c.dtype == np.float32
+    assert isinstance(simulation.t, float)
+    times, frames = load_snapshots(str(tmp_path/'configurations.npy'), output_format, np.float32)
+    assert frames[-1].dtype == np.float32
+    if output_format == 'compressed':
+        assert np.max(np.abs(frames[-1] - simulation.c)) <= 1e-4
+    else:
+        assert np.array_equal(frames[-1], simulation.c)
+
+@pt.mark.parametrize('ensemble', ['False', 'True'])
+def test_3D_simulation_runs_and_restarts(tmp_path, ensemble):
+    """this function tests a 3D simulation (dz given) configured from file, alone and as an ensemble
+
+    GIVEN: a configuration of a 6-by-6-by-6 grid with dz, 20 steps, structure factor analysis and a checkpoint every 10 steps
+    WHEN: the simulation is run, and then restarted from its final checkpoint
+    THEN: the stored grids are 3D and the last one is the final grid, the free energy is the 3D one,
+          and the restart does not change the average quantities"""
+    config = make_config(tmp_path)
+    config.set('microstructure_settings', 'dz', '0.8')
+    config.set('ensemble', 'enabled', ensemble)
+    config.set('ensemble', 'n_replicas', '2')
+    config.set('ensemble', 'c0', '0.45, 0.5')
+    config.set('structure_factor', 'enabled', 'True')
+    simulation = run_configured_simulation(config, log=None)
+    grid_shape = (2, 6, 6, 6) if ensemble == 'True' else (6, 6, 6)
+    assert simulation.c.shape == grid_shape
+    times, frames = load_snapshots(str(tmp_path/'configurations.npy'), 'binary')
+    assert np.shape(frames) == (21,)+grid_shape
+    assert np.array_equal(frames[-1], simulation.c)
+    averages_path = tmp_path/('average_parameters_r1.txt' if ensemble == 'True' else 'average_parameters.txt')
+    with open(averages_path) as f:
+        lines = f.readlines()
+    grid = simulation.c[1] if ensemble == 'True' else simulation.c
+    assert np.isclose(float(lines[-1].split()[3]), free_energy(grid, 1., 0.5, 1., 1., 0.8))
+
+    run_configured_simulation(config, restart=str(tmp_path/'checkpoint.npz'), log=None)
+    with open(averages_path) as f:
+        assert f.readlines() == lines
+
+@pt.mark.parametrize('output_format', ['binary', 'text', 'compressed'])
+@pt.mark.parametrize('integrator', ['explicit', 'explicit_inplace', 'spectral'])
+def test_rectangular_simulation_runs_and_stores_its_grids(tmp_path, output_format, integrator):
+    """this function tests a simulation of a rectangular grid (Nx different from Ny) configured from file
+
+    GIVEN: a configuration with Nx = 8 and Ny = 5 (and without N), an integrator and an output format
+    WHEN: the simulation is run and its grids are loaded with load_snapshots()
+    THEN: the grid has shape (Ny, Nx), the stored grids have the same shape and the last one is the final grid,
+          and the final free energy is the one of the final grid"""
+    config = make_config(tmp_path)
+    config.remove_option('microstructure_settings', 'N')
+    config.set('microstructure_settings', 'Nx', '8')
+    config.set('microstructure_settings', 'Ny', '5')
+    config.set('time_settings', 'integrator', integrator)
+    config.set('data_paths', 'output_format', output_format)
+    simulation = run_configured_simulation(config, log=None)
+    assert simulation.c.shape == (5, 8)
+    times, frames = load_snapshots(str(tmp_path/'configurations.npy'), output_format)
+    assert np.shape(frames[-1]) == (5, 8)
+    if output_format == 'compressed':
+        assert np.max(np.abs(frames[-1] - simulation.c)) <= 1e-4
+    else:
+        assert np.array_equal(frames[-1], simulation.c)
+    with open(tmp_path/'average_parameters.txt') as f:
+        lines = f.readlines()
+    assert np.isclose(float(lines[-1].split()[3]), free_energy(simulation.c, 1., 0.5, 1., 1.))
+
+@pt.mark.parametrize('integrator, adaptive, n_workers', [('explicit', 'False', '0'), ('explicit', 'False', '2'),
+                                                        ('explicit_inplace', 'False', '0'), ('spectral', 'True', '0')])
+def test_neumann_simulation_conserves_mass(tmp_path, integrator, adaptive, n_workers):
+    """this function tests a simulation of a walled domain, configured with neumann boundary conditions
+
+    GIVEN: a configuration with boundary = neumann and an integrator (with adaptive time stepping for the spectral
+           one, with 2 workers for the explicit one)
+    WHEN: the simulation is run
+    THEN: the average concentration is conserved, and the final free energy is the neumann one of the final grid"""
+    config = make_config(tmp_path)
+    config.set('microstructure_settings', 'boundary', 'neumann')
+    config.set('time_settings', 'integrator', integrator)
+    config.set('time_settings', 'adaptive', adaptive)
+    config.set('parallel', 'n_workers', n_workers)
+    simulation = run_configured_simulation(config, log=None)
+    with open(tmp_path/'average_parameters.txt') as f:
+        lines = f.readlines()
+    assert np.isclose(float(lines[-1].split()[1]), float(lines[1].split()[1]), rtol=0., atol=1e-12)
+    assert np.isclose(float(lines[-1].split()[3]), free_energy(simulation.c, 1., 0.5, 1., 1., boundary='neumann'))
+
+def test_active_set_simulation_stores_active_fraction_and_restarts(tmp_path):
+    """this function tests a simulation configured with active set integration
+
+    GIVEN: a configuration with the active set enabled, tiles of 4 subcells, tolerance 0. and a full sweep every 5 steps,
+           and the same configuration with the active set disabled, or with the spectral integrator
+    WHEN: the simulations are run, and the active set one is restarted from its last checkpoint
+    THEN: the average quantities file has the ActiveFraction column, the final grid is the one of the full integration,
+          the restart does not change the average quantities, and ValueError is raised for the spectral integrator"""
+    config = make_config(tmp_path)
+    config.set('microstructure_settings', 'N', '10')
+    config.set('active_set', 'enabled', 'True')
+    config.set('active_set', 'tile_size', '4')
+    config.set('active_set', 'tolerance', '0.')
+    config.set('active_set', 'full_sweep_every', '5')
+    simulation = run_configured_simulation(config, log=None)
+    with open(tmp_path/'average_parameters.txt') as f:
+        lines = f.readlines()
+    assert lines[0].split()[-1] == 'ActiveFraction'
+    assert 0. < float(lines[-1].split()[4]) <= 1.
+    assert np.loadtxt(tmp_path/'average_parameters.txt', skiprows=1, usecols=(0, 1, 2, 3)).shape == (21, 4)
+
+    run_configured_simulation(config, restart=str(tmp_path/'checkpoint.npz'), log=None)
+    with open(tmp_path/'average_parameters.txt') as f:
+        assert f.readlines() == lines
+
+    config.set('active_set', 'enabled', 'False')
+    full_simulation = run_configured_simulation(config, log=None)
+    assert np.array_equal(simulation.c, full_simulation.c)
+    config.set('active_set', 'enabled', 'True')
+    config.set('time_settings', 'integrator', 'spectral')
+    with pt.raises(ValueError):
+        run_configured_simulation(config, log=None)
+
+def test_run_configured_simulation_writes_structure_factor(tmp_path):
+    """this function tests that the structure factor file is written at the cadence of the average quantities,
+    with the analysis of the grids, and that restarting from the checkpoint reproduces it
+
+    GIVEN: a configuration of a 6-by-6 grid, 20 steps, with the structure factor analysis enabled
+    WHEN: the simulation is run, and then restarted from its final checkpoint
+    THEN: the file has a header and 21 lines, whose times are the ones of the average quantities, the last line
+          holds the analysis of the final grid, and the restart does not change the file"""
+    config = make_config(tmp_path)
+    config.set('structure_factor', 'enabled', 'True')
+    simulation = run_configured_simulation(config, log=None)
+    data = np.loadtxt(tmp_path/'structure_factor.txt', skiprows=1)
+    averages = np.loadtxt(tmp_path/'average_parameters.txt', skiprows=1)
+    assert data.shape[0] == 21
+    assert np.array_equal(data[:, 0], averages[:, 0])
+    analysis = StructureFactorAnalyzer((6, 6), 1., 1.).analyze(simulation.c)
+    assert np.allclose(data[-1, 1:4], [analysis['first_moment'], analysis['domain_length'], analysis['interface_area']])
+    assert np.allclose(data[-1, 4:], analysis['S'])
+    with open(tmp_path/'structure_factor.txt') as f:
+        lines = f.readlines()
+
+    run_configured_simulation(config, restart=str(tmp_path/'checkpoint.npz'), log=None)
+    with open(tmp_path/'structure_factor.txt') as f:
+        assert f.readlines() == lines
+
+def test_converged_simulation_stops_early_and_restarts(tmp_path):
+    """this function tests that a simulation whose grid stops changing ends before n_iterations, recording why,
+    with the final state saved, and that restarting from a checkpoint taken before the stop reproduces it
+
+    GIVEN: a configuration of a 6-by-6 grid with c0 = 0.1 (outside the spinodal region, so that the noise decays),
+           200 steps, a checkpoint every 20 steps and the max |dc| criterion
+    WHEN: the simulation is run, and then restarted from the checkpoint taken before the stop
+    THEN: it stops before 200 steps with reason 'max_dc', the last snapshot is the final grid,
+          and the restart writes the same outputs"""
+    config = make_config(tmp_path)
+    config.set('microstructure_settings', 'c0', '0.1')
+    config.set('time_settings', 'n_iterations', '200')
+    config.set('checkpoint', 'checkpoint_every', '20')
+    config.set('time_settings', 'convergence_check_every', '5')
+    config.set('time_settings', 'max_dc_tol', '1e-4')
+    config.set('time_settings', 'convergence_patience', '2')
+    simulation = run_configured_simulation(config, log=None)
+    assert simulation.stop_reason == 'max_dc'
+    assert 20 < simulation.step < 200 and simulation.step % 5 == 0
+    times, frames = load_snapshots(str(tmp_path/'configurations.npy'), 'binary')
+    assert len(times) == simulation.step + 1
+    assert np.array_equal(frames[-1], simulation.c)
+    frames = np.array(frames)
+    with open(tmp_path/'average_parameters.txt') as f:
+        lines = f.readlines()
+
+    #the checkpoint file holds the last checkpoint before the stop
+    run_configured_simulation(config, restart=str(tmp_path/'checkpoint.npz'), log=None)
+    times_restarted, frames_restarted = load_snapshots(str(tmp_path/'configurations.npy'), 'binary')
+    assert np.array_equal(frames_restarted, frames)
+    with open(tmp_path/'average_parameters.txt') as f:
+        assert f.readlines() == lines
+
+def test_configured_initial_conditions_use_independent_streams(tmp_path):
+    """this function tests the simulations whose initial grids are generated with the initial_conditions section
+
+    GIVEN: a configuration with gaussian noise, 2 nuclei and the initial grid memory mapped to a file, for a single
+           simulation and for an ensemble of 2 replicas, and a configuration loading the initial grid from that file
+    WHEN: the simulations are built from the configurations
+    THEN: the initial grid is stored in the file, is the same for the same seed, the replicas start from different
+          grids with the nuclei, and the loaded grid is the stored one"""
+    config = make_config(tmp_path)
+    config.set('microstructure_settings', 'N', '16')
+    config.set('initial_conditions', 'noise', 'gaussian')
+    config.set('initial_conditions', 'n_nuclei', '2')
+    config.set('initial_conditions', 'nucleus_concentration', '0.95')
+    config.set('initial_conditions', 'memmap_path', str(tmp_path/'c0.npy'))
+    simulation = Simulation.from_config(config)
+    assert np.sum(simulation.c == 0.95) >= 13
+    assert np.array_equal(np.load(tmp_path/'c0.npy'), simulation.c)
+    assert np.array_equal(Simulation.from_config(config).c, simulation.c)
+
+    config.set('initial_conditions', 'memmap_path', str(tmp_path/'c0_ensemble.npy'))
+    config.set('ensemble', 'enabled', 'True')
+    config.set('ensemble', 'n_replicas', '2')
+    config.set('ensemble', 'c0', '0.5')
+    ensemble = Simulation.from_config(config)
+    assert ensemble.c.shape == (2, 16, 16)
+    assert not np.array_equal(ensemble.c[0], ensemble.c[1])
+    assert np.sum(ensemble.c[1] == 0.95) >= 13
+
+    config.remove_section('initial_conditions')
+    config.add_section('initial_conditions')
+    config.set('initial_conditions', 'path', str(tmp_path/'c0.npy'))
+    loaded = Simulation.from_config(config)
+    assert np.array_equal(loaded.c[0], simulation.c) and np.array_equal(loaded.c[1], simulation.c)
+
+@pt.mark.parametrize('integrator', ['explicit', 'explicit_inplace'])
+def test_parallel_simulation_batches_steps_between_outputs(tmp_path, integrator):
+    """this function tests that the parallel integration performs the steps between two outputs in a single request
+
+    GIVEN: a configuration with snapshots every 7 steps, average quantities every 3 steps, checkpoints every 10 steps
+           and 2 workers, and the same configuration with serial integration
+    WHEN: the simulations are run
+    THEN: the stored grids and average quantities are equal, and the final grid is the same"""
+    config = make_config(tmp_path)
+    config.set('microstructure_settings', 'N', '9')
+    config.set('time_settings', 'integrator', integrator)
+    config.set('time_settings', 'snapshot_every', '7')
+    config.set('time_settings', 'diagnostics_every', '3')
+    config.set('parallel', 'n_workers', '2')
+    parallel = run_configured_simulation(config, log=None)
+    times, frames = load_snapshots(str(tmp_path/'configurations.npy'), 'binary')
+    parallel_frames = np.array(frames)
+    with open(tmp_path/'average_parameters.txt') as f:
+        parallel_lines = f.readlines()
+    config.set('parallel', 'n_workers', '0')
+    serial = run_configured_simulation(config, log=None)
+    times, frames = load_snapshots(str(tmp_path/'configurations.npy'), 'binary')
+    with open(tmp_path/'average_parameters.txt') as f:
+        assert f.readlines() == parallel_lines
+    assert np.array_equal(np.array(frames), parallel_frames)
+    assert np.array_equal(parallel.c, serial.c) and parallel.step == serial.step == 20
@@ -0,0 +1,365 @@
+import numpy as np
+import os
+import threading
+import time
+from snapshot_io import open_snapshot_writer, load_snapshots, times_datasave_path, AsyncSnapshotWriter, BinarySnapshotWriter
+from snapshot_io import CompressedSnapshotReader, TextSnapshotReader, quantization_levels
+import tracemalloc
+import pytest as pt
+
+def test_binary_snapshots_are_read_back_identical(tmp_path):
+    """this function tests that the concentration grids and time values stored in binary format
+    are read back by load_snapshots() without any loss, and that only the written frames are returned
+
+    GIVEN: three random 4-by-5 grids, written with a binary writer preallocated for 10 frames
+    WHEN: they are read with load_snapshots()
+    THEN: times and frames are equal to the written ones, and frames is a memory map"""
+    path = str(tmp_path/'configurations.npy')
+    np.random.seed(1)
+    grids = np.random.rand(3, 4, 5)
+    with open_snapshot_writer(path, 'binary', (4, 5), 10) as writer:
+        for i in range(3):
+            writer.write(0.1*i, grids[i])
+    times, frames = load_snapshots(path, 'binary')
+    assert os.path.exists(times_datasave_path(path))
+    assert np.array_equal(times, [0., 0.1, 0.2])
+    assert np.array_equal(frames, grids)
+    assert isinstance(frames, np.memmap)
+
+def test_binary_snapshots_are_readable_before_the_writer_is_closed(tmp_path):
+    """this function tests that the binary snapshots can be read back while the writer is still open,
+    e.g. after the simulation crashed
+
+    GIVEN: 20 random 3-by-4 grids, written with a binary writer rewriting the time values every 8 snapshots
+    WHEN: they are read with load_snapshots() before closing the writer, and again after a flush()
+    THEN: the first 16 grids are read back before the flush, and all the 20 grids after it"""
+    path = str(tmp_path/'configurations.npy')
+    np.random.seed(1)
+    grids = np.random.rand(20, 3, 4)
+    writer = BinarySnapshotWriter(path, (3, 4), 30, times_every=8)
+    for i in range(20):
+        writer.write(0.1*i, grids[i])
+    times, frames = load_snapshots(path, 'binary')
+    assert len(times) == 16 and np.array_equal(frames, grids[:16])
+    writer.flush()
+    times, frames = load_snapshots(path, 'binary')
+    assert len(times) == 20 and np.array_equal(frames, grids)
+    writer.close()
+
+def test_binary_snapshots_can_be_stored_as_float32(tmp_path):
+    """this function tests that the binary writer stores the grids with the requested precision
+
+    GIVEN: a random 6-by-6 grid
+    WHEN: it is written with a binary writer with dtype float32
+    THEN: the loaded frames have dtype float32 and are equal to the grid within float32 precision"""
+    path = str(tmp_path/'configurations.npy')
+    np.random.seed(1)
+    grid = np.random.rand(6, 6)
+    with open_snapshot_writer(path, 'binary', (6, 6), 1, np.float32) as writer:
+        writer.write(0., grid)
+    times, frames = load_snapshots(path, 'binary')
+    assert frames.dtype == np.float32
+    assert np.allclose(frames[0], grid, rtol=1e-7)
+
+def test_text_snapshots_keep_original_format(tmp_path):
+    """this function tests that the text writer produces the original file layout 
+    (header with column names, one line per snapshot) and that load_snapshots() reads it back
+
+    GIVEN: two 2-by-2 grids
+    WHEN: they are written with a text writer and read with load_snapshots()
+    THEN: the file has the expected lines and the loaded grids are equal to the written ones"""
+    path = str(tmp_path/'configurations.txt')
+    grids = np.array([[[0.1, 0.2], [0.3, 0.4]], [[0.5, 0.6], [0.7, 0.8]]])
+    with open_snapshot_writer(path, 'text', (2, 2), 2) as writer:
+        writer.write(0., grids[0])
+        writer.write(0.01, grids[1])
+    with open(path) as f:
+        lines = f.readlines()
+    assert lines[0] == "Time c_0_0 c_0_1 c_1_0 c_1_1 \n"
+    assert lines[1] == "0.0 0.1 0.2 0.3 0.4 \n"
+    times, frames = load_snapshots(path, 'text')
+    assert np.array_equal(times, [0., 0.01])
+    assert np.array_equal(frames, grids)
+
+def test_snapshot_writer_fails_for_invalid_format_or_too_many_frames(tmp_path):
+    """this function tests that an error is raised for an unknown output format, 
+    or if more frames than the preallocated ones are written
+
+    GIVEN: an invalid format name, a binary writer preallocated for 1 frame
+    WHEN: the writer is opened, two frames are written
+    THEN: ValueError is raised"""
+    with pt.raises(ValueError):
+        open_snapshot_writer(str(tmp_path/'c.npy'), 'hdf5', (2, 2), 1)
+    with open_snapshot_writer(str(tmp_path/'c.npy'), 'binary', (2, 2), 1) as writer:
+        writer.write(0., np.zeros((2, 2)))
+        with pt.raises(ValueError):
+            writer.write(1., np.zeros((2, 2)))
+
+@pt.mark.parametrize('output_format', ['binary', 'text', 'compressed'])
+def test_resumed_writer_discards_frames_after_checkpoint(tmp_path, output_format):
+    """this function tests that a writer reopened with resume_frames keeps only the first frames
+    and appends the new ones after them, as needed when restarting from a checkpoint
+
+    GIVEN: a file with 4 frames, of which only the first 2 were written before the checkpoint
+    WHEN: it is reopened with resume_frames=2 and 2 new frames are written
+    THEN: the file holds the 2 original frames followed by the 2 new ones"""
+    path = str(tmp_path/'configurations')
+    with open_snapshot_writer(path, output_format, (2, 2), 4) as writer:
+        for i in range(4):
+            writer.write(float(i), np.full((2, 2), 0.1*i))
+    with open_snapshot_writer(path, output_format, (2, 2), 4, resume_frames=2) as writer:
+        for i in range(2, 4):
+            writer.write(float(i), np.full((2, 2), 0.5+0.1*i))
+    times, frames = load_snapshots(path, output_format)
+    assert np.array_equal(times, [0., 1., 2., 3.])
+    assert np.allclose(frames[:, 0, 0], [0., 0.1, 0.7, 0.8])
+
+class SlowWriter:
+    """This class is a snapshot writer storing the received grids in a list after a delay, or raising an error
+    at the write number fail_at, used to test AsyncSnapshotWriter"""
+
+    def __init__(self, delay=0., fail_at=None):
+        self.delay = delay
+        self.fail_at = fail_at
+        self.frames = []
+        self.bytes_written = 0
+        self.closed = False
+        self.release = threading.Event()
+        self.release.set()
+
+    def write(self, t, c):
+        self.release.wait()
+        time.sleep(self.delay)
+        if len(self.frames) == self.fail_at:
+            raise OSError('disk full')
+        self.frames.append((t, c.copy()))
+        self.bytes_written += c.nbytes
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+@pt.mark.parametrize('output_format', ['binary', 'text'])
+def test_async_writer_produces_same_file_as_synchronous_writer(tmp_path, output_format):
+    """this function tests that writing through the background thread gives the same file as the direct writer,
+    even if the grid passed to write() is modified in place right after the call
+
+    GIVEN: a grid updated in place 20 times
+    WHEN: each update is written with a synchronous writer and with an asynchronous one with a queue of 2 grids
+    THEN: the two files are byte-for-byte identical and the bytes written are the same"""
+    contents = []
+    bytes_written = []
+    for async_queue in (0, 2):
+        path = str(tmp_path/('configurations'+str(async_queue)))
+        c = np.zeros((3, 4))
+        with open_snapshot_writer(path, output_format, (3, 4), 20, async_queue=async_queue) as writer:
+            for i in range(20):
+                c += 0.1*i
+                writer.write(0.01*i, c)
+        bytes_written.append(writer.bytes_written)
+        with open(path, 'rb') as f:
+            contents.append(f.read())
+    assert isinstance(writer, AsyncSnapshotWriter)
+    assert contents[0] == contents[1]
+    assert bytes_written[0] == bytes_written[1]
+
+def test_async_writer_blocks_when_queue_is_full():
+    """this function tests the backpressure of the asynchronous writer: when the writer thread cannot keep up,
+    write() waits instead of queuing more grids, and flush() returns only when all the grids are written
+
+    GIVEN: a writer thread stalled before writing, with a queue of 2 grids
+    WHEN: grids are written from another thread, then the writer thread is released and the writer flushed
+    THEN: write() blocks after the queued grids and the buffers being written, and finally all the grids
+    are written in order"""
+    inner = SlowWriter()
+    inner.release.clear()
+    writer = AsyncSnapshotWriter(inner, max_queue=2)
+    n_written = []
+    def produce():
+        for i in range(6):
+            writer.write(float(i), np.full((2, 2), float(i)))
+            n_written.append(i)
+    producer = threading.Thread(target=produce)
+    producer.start()
+    time.sleep(0.2)
+    #one grid taken by the stalled writer thread, 2 in the queue, then write() blocks waiting for a free buffer
+    assert len(n_written) == 3
+    inner.release.set()
+    producer.join()
+    writer.flush()
+    assert [t for t, c in inner.frames] == [0., 1., 2., 3., 4., 5.]
+    assert all(np.all(c == t) for t, c in inner.frames)
+    writer.close()
+    assert inner.closed
+
+def test_async_writer_error_aborts_the_run():
+    """this function tests that an error raised in the writer thread is raised again in the computing thread
+
+    GIVEN: a writer failing at its second write
+    WHEN: three grids are written, the writer is flushed and closed
+    THEN: flush() and close() raise RuntimeError caused by the original error, the writer is closed anyway,
+    and the grids following the error are not written"""
+    inner = SlowWriter(fail_at=1)
+    inner.release.clear()
+    writer = AsyncSnapshotWriter(inner, max_queue=3)
+    for i in range(3):
+        writer.write(float(i), np.zeros((2, 2)))
+    inner.release.set()
+    with pt.raises(RuntimeError) as error:
+        writer.flush()
+    assert isinstance(error.value.__cause__, OSError)
+    with pt.raises(RuntimeError):
+        writer.close()
+    assert inner.closed
+    assert len(inner.frames) == 1
+
+@pt.mark.parametrize('tolerance', [1e-2, 1e-3, 1e-4, 1e-5])
+@pt.mark.parametrize('delta', [True, False])
+@pt.mark.parametrize('compression', ['zlib', 'lzma', 'none'])
+def test_compressed_snapshots_respect_tolerance(tmp_path, tolerance, delta, compression):
+    """this function tests that the grids stored in compressed format are read back within the quantization
+    tolerance, for every combination of encoding options, and that the values 0 and 1 are stored exactly
+
+    GIVEN: 11 random grids in [0, 1] (including 0 and 1), written in chunks of 4 frames
+    WHEN: they are read back with load_snapshots()
+    THEN: the number of frames and times are right, and the error is at most the tolerance"""
+    path = str(tmp_path/'configurations.chz')
+    np.random.seed(1)
+    grids = np.random.rand(11, 5, 6)
+    grids[:, 0, 0] = 0.
+    grids[:, 0, 1] = 1.
+    options = {'tolerance': tolerance, 'delta': delta, 'compression': compression, 'chunk_frames': 4}
+    with open_snapshot_writer(path, 'compressed', (5, 6), 11, compressed_options=options) as writer:
+        for i in range(11):
+            writer.write(0.1*i, grids[i])
+    times, frames = load_snapshots(path, 'compressed')
+    assert np.allclose(times, 0.1*np.arange(11))
+    assert len(frames) == 11 and frames.shape == (11, 5, 6)
+    assert np.max(np.abs(frames[:] - grids)) <= tolerance
+    assert np.all(frames[:][:, 0, :2] == [0., 1.])
+
+def test_quantization_levels_use_smallest_integer_type():
+    """this function tests the number of quantization levels and the integer type chosen for a tolerance
+
+    GIVEN: tolerances of 0.01, 0.002, 1e-4, 1e-6 and 0
+    WHEN: quantization_levels() is called
+    THEN: the levels give an error of at most the tolerance, uint8 is used down to 0.002, uint16 below it,
+    and ValueError is raised for tolerances that cannot be stored in 16 bits or are not positive"""
+    for tolerance, itemsize in [(0.01, 1), (0.002, 1), (1e-4, 2)]:
+        levels, dtype = quantization_levels(tolerance)
+        assert 0.5/(levels-1) <= tolerance
+        assert dtype.itemsize == itemsize
+    for tolerance in [1e-6, 0.]:
+        with pt.raises(ValueError):
+            quantization_levels(tolerance)
+
+def test_compressed_reader_decodes_only_requested_chunks(tmp_path):
+    """this function tests the lazy access of CompressedSnapshotReader: only the chunk of the requested frame
+    is decoded, negative indices and slices work, and [:, index] selects part of each frame (e.g. a replica)
+
+    GIVEN: 10 ensembles of 2 grids of 3-by-3 cells, written in chunks of 3 frames
+    WHEN: single frames, a slice and a replica are read
+    THEN: they are equal to the written grids within the tolerance, and reading frame 4 decodes only chunk 1"""
+    path = str(tmp_path/'configurations.chz')
+    np.random.seed(2)
+    grids = np.random.rand(10, 2, 3, 3)
+    options = {'tolerance': 1e-4, 'chunk_frames': 3}
+    with open_snapshot_writer(path, 'compressed', (2, 3, 3), 10, compressed_options=options) as writer:
+        for i in range(10):
+            writer.write(float(i), grids[i])
+    frames = CompressedSnapshotReader(path)
+    assert len(frames) == 10
+    assert np.allclose(frames[4], grids[4], atol=1e-4)
+    assert frames._cached_chunk == 1
+    assert np.allclose(frames[-1], grids[-1], atol=1e-4)
+    assert np.allclose(frames[2:7:2], grids[2:7:2], atol=1e-4)
+    replica = frames[:, 1]
+    assert replica.shape == (10, 3, 3)
+    assert np.allclose(replica[5], grids[5, 1], atol=1e-4)
+    with pt.raises(IndexError):
+        frames[10]
+
+def test_compressed_format_shrinks_phase_separated_grids(tmp_path):
+    """this function tests that the compressed format stores a slowly evolving phase separated microstructure
+    in much less space than the float64 binary format
+
+    GIVEN: 32 grids of 64-by-64 cells with two phases close to 0 and 1 and a slowly moving interface
+    WHEN: they are written in binary and compressed format (default options)
+    THEN: the compressed file is at least 10 times smaller than the binary one"""
+    x = np.arange(64)
+    sizes = {}
+    for output_format in ('binary', 'compressed'):
+        path = str(tmp_path/('configurations.'+output_format))
+        with open_snapshot_writer(path, output_format, (64, 64), 32) as writer:
+            for i in range(32):
+                profile = 0.5 + 0.49*np.tanh((np.abs(x - 32) - 10 - 0.1*i)/2.)
+                writer.write(float(i), np.add.outer(profile, profile)/2.)
+        sizes[output_format] = os.path.getsize(path)
+    assert sizes['compressed']*10 < sizes['binary']
+
+def test_text_reader_reads_single_lines(tmp_path):
+    """this function tests that TextSnapshotReader indexes the lines of a text file and reads frames on demand,
+    ignoring a last line truncated by an interrupted write
+
+    GIVEN: a text file with 5 random 3-by-3 grids, followed by part of a sixth line
+    WHEN: it is opened with TextSnapshotReader
+    THEN: there are 5 frames, times and single frames, slices and rows of the frames are equal to the written ones"""
+    path = str(tmp_path/'configurations.txt')
+    np.random.seed(3)
+    grids = np.random.rand(5, 3, 3)
+    with open_snapshot_writer(path, 'text', (3, 3), 5) as writer:
+        for i in range(5):
+            writer.write(0.5*i, grids[i])
+    with open(path, 'a') as f:
+        f.write('2.5 0.1 0.2')
+    frames = TextSnapshotReader(path)
+    assert len(frames) == 5 and frames.shape == (5, 3, 3)
+    assert np.array_equal(frames.times, 0.5*np.arange(5))
+    assert np.array_equal(frames[3], grids[3])
+    assert np.array_equal(frames[-1], grids[4])
+    assert np.array_equal(frames[1:4], grids[1:4])
+    assert np.array_equal(frames[:, 2][0], grids[0, 2])
+
+@pt.mark.parametrize('output_format', ['binary', 'text', 'compressed'])
+def test_streaming_frames_use_bounded_memory(tmp_path, output_format):
+    """this function tests that reading one frame every 5, as done by the animation of plots.py,
+    needs memory for a few frames (or a chunk of frames) only, whatever the number of stored frames
+
+    GIVEN: a file with 400 grids of 32-by-32 cells
+    WHEN: it is opened with load_snapshots() and one frame every 5 is read, while tracing memory allocations
+    THEN: the peak memory allocated is less than 40 frames (a tenth of the data)"""
+    path = str(tmp_path/'configurations')
+    np.random.seed(4)
+    grid = np.random.rand(32, 32)
+    with open_snapshot_writer(path, output_format, (32, 32), 400) as writer:
+        for i in range(400):
+            writer.write(0.01*i, grid)
+    tracemalloc.start()
+    times, frames = load_snapshots(path, output_format)
+    total = 0.
+    for i in range(0, len(times), 5):
+        total += float(frames[i].sum())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert np.isclose(total, 80*grid.sum(), rtol=1e-3)
+    assert peak < 40*grid.nbytes
+
+@pt.mark.parametrize('output_format', ['binary', 'text', 'compressed'])
+def test_3D_and_rectangular_snapshots_are_read_back(tmp_path, output_format):
+    """this function tests that grids of any shape are stored and read back with their shape
+
+    GIVEN: 3 random 3-by-4-by-5 grids (a 3D microstructure)
+    WHEN: they are written in each format and read with load_snapshots()
+    THEN: the frames have shape (3, 3, 4, 5) and the values of the written grids"""
+    path = str(tmp_path/'configurations.npy')
+    np.random.seed(1)
+    grids = np.random.rand(3, 3, 4, 5)
+    with open_snapshot_writer(path, output_format, (3, 4, 5), 3) as writer:
+        for i, grid in enumerate(grids):
+            writer.write(0.1*i, grid)
+    times, frames = load_snapshots(path, output_format)
+    assert np.shape(frames) == (3, 3, 4, 5)
+    assert np.allclose(frames[:], grids, rtol=0., atol=1e-4)
+    assert np.allclose(frames[:, 1][2], grids[2, 1], rtol=0., atol=1e-4)
@@ -0,0 +1,113 @@
+import numpy as np
+from create_initial_config import create_initial_config
+from CahnHilliard_equation import Cahn_Hilliard_equation_integration
+from stencil_workspace import CahnHilliardWorkspace, Cahn_Hilliard_inplace_integration, _workspace
+from hypothesis import given, settings
+import hypothesis.strategies as st
+import pytest as pt
+
+@settings(deadline=None, max_examples=30)
+@given(Nx=st.integers(min_value=2, max_value=40), Ny=st.integers(min_value=2, max_value=40),
+       dx=st.floats(min_value=0.5, max_value=2.), dy=st.floats(min_value=0.5, max_value=2.),
+       block_size=st.integers(min_value=1, max_value=2000))
+def test_workspace_step_matches_Cahn_Hilliard_equation_integration(Nx, Ny, dx, dy, block_size):
+    """this function tests that the in place step of CahnHilliardWorkspace, computed on blocks of the flat
+    padded grid, gives the same result as Cahn_Hilliard_equation_integration()
+
+    GIVEN: a random Ny-by-Nx concentration grid (square or rectangular), random dx, dy, block_size,
+           A=1, k=0.5, M=1, dt=0.01
+    WHEN: they are provided to CahnHilliardWorkspace.step() and to Cahn_Hilliard_equation_integration()
+    THEN: the two updated grids are equal within 1e-12"""
+    np.random.seed(1)
+    c = 0.5 + 0.2*(0.5-np.random.rand(Ny, Nx))
+    c_expected = Cahn_Hilliard_equation_integration(c, 1., 0.5, dx, dy, 1., 0.01)
+    workspace = CahnHilliardWorkspace((Ny, Nx), dx, dy, block_size=block_size)
+    c_computed = workspace.step(c, 1., 0.5, 1., 0.01)
+    assert np.allclose(c_computed, c_expected, rtol=0, atol=1e-12)
+
+@pt.mark.parametrize('shape, boundary', [((5, 17), 'periodic'), ((17, 5), 'periodic'), ((2, 9), 'periodic'),
+                                         ((6, 11), 'neumann'), ((3, 12, 7), 'periodic')])
+def test_rectangular_inplace_integration_matches_explicit_scheme(shape, boundary):
+    """this function tests the in place integration of rectangular grids
+
+    GIVEN: random grids with Ny different from Nx (and a 2D batch of 3 such grids), periodic or neumann boundaries
+    WHEN: they are evolved for 5 steps with Cahn_Hilliard_inplace_integration() and Cahn_Hilliard_equation_integration()
+    THEN: the two grids are equal within 1e-12"""
+    np.random.seed(1)
+    c = 0.5 + 0.2*(0.5-np.random.rand(*shape))
+    c_expected = c.copy()
+    for i in range(5):
+        c = Cahn_Hilliard_inplace_integration(c, 1., 0.5, 1., 1.3, 1., 0.01, boundary=boundary)
+        c_expected = Cahn_Hilliard_equation_integration(c_expected, 1., 0.5, 1., 1.3, 1., 0.01, boundary=boundary)
+    assert np.allclose(c, c_expected, rtol=0, atol=1e-12)
+
+def test_inplace_integration_updates_input_array():
+    """this function tests that Cahn_Hilliard_inplace_integration() updates the input array in place
+    and reuses the same workspace for following calls
+    
+    GIVEN: a 10-by-10 concentration grid
+    WHEN: it is evolved for 5 steps with Cahn_Hilliard_inplace_integration() and Cahn_Hilliard_equation_integration()
+    THEN: the returned array is the input one, and its values are equal to the ones of the explicit scheme within 1e-12"""
+    np.random.seed(1)
+    c = create_initial_config(10, 0.5, 0.1)
+    c_expected = c.copy()
+    for i in range(5):
+        c_returned = Cahn_Hilliard_inplace_integration(c, 1., 0.5, 1., 1., 1., 0.01)
+        c_expected = Cahn_Hilliard_equation_integration(c_expected, 1., 0.5, 1., 1., 1., 0.01)
+    assert c_returned is c
+    assert np.allclose(c, c_expected, rtol=0, atol=1e-12)
+
+def test_inplace_integration_keeps_a_bounded_number_of_workspaces():
+    """this function tests that the workspaces of Cahn_Hilliard_inplace_integration() are reused and released
+
+    GIVEN: 12 grids of different shapes, and the first one again
+    WHEN: they are evolved by one step with Cahn_Hilliard_inplace_integration()
+    THEN: at most 8 workspaces are kept, and the workspace of the same grid is reused"""
+    _workspace.cache_clear()
+    for N in range(4, 16):
+        Cahn_Hilliard_inplace_integration(np.full((N, N), 0.5), 1., 0.5, 1., 1., 1., 0.01)
+    assert _workspace.cache_info().currsize == 8
+    Cahn_Hilliard_inplace_integration(np.full((15, 15), 0.5), 1., 0.5, 1., 1., 1., 0.01)
+    assert _workspace.cache_info().hits == 1
+
+def test_workspace_fails_with_incorrect_parameters():
+    """this function tests that CahnHilliardWorkspace raises an error for invalid parameters
+    
+    GIVEN: negative dx, a grid of shape different from the workspace one, negative M
+    WHEN: they are provided to CahnHilliardWorkspace
+    THEN: ValueError is raised"""
+    with pt.raises(ValueError):
+        CahnHilliardWorkspace((10, 10), -1., 1.)
+    workspace = CahnHilliardWorkspace((10, 10), 1., 1.)
+    with pt.raises(ValueError):
+        workspace.step(np.full((10, 12), 0.5), 1., 0.5, 1., 0.01)
+    with pt.raises(ValueError):
+        workspace.step(np.full((10, 10), 0.5), 1., 0.5, -1., 0.01)
+
+@pt.mark.parametrize('block_size', [1, 100, 100000])
+def test_3D_workspace_step_matches_Cahn_Hilliard_equation_integration(block_size):
+    """this function tests the in place integration of 3D microstructures (7-point laplacians)
+
+    GIVEN: a random 6-by-5-by-7 grid with different subcell dimensions, and a batch of two such grids
+    WHEN: a step is performed with a 3D workspace, processing blocks of block_size elements
+    THEN: the result is equal (to rounding) to Cahn_Hilliard_equation_integration() with dz"""
+    np.random.seed(1)
+    c = 0.5 + 0.1*(0.5-np.random.rand(6, 5, 7))
+    for grid in (c, np.stack([c, c[::-1]])):
+        expected = Cahn_Hilliard_equation_integration(grid, 1., 0.5, 1., 1.2, 1., 0.01, dz=0.8)
+        workspace = CahnHilliardWorkspace(grid.shape, 1., 1.2, block_size=block_size, dz=0.8)
+        assert np.allclose(workspace.step(grid.copy(), 1., 0.5, 1., 0.01), expected, rtol=0., atol=1e-13)
+
+@pt.mark.parametrize('block_size', [1, 100000])
+def test_neumann_workspace_step_matches_Cahn_Hilliard_equation_integration(block_size):
+    """this function tests the in place integration with neumann boundary conditions (mirrored halos)
+
+    GIVEN: a random 7-by-9 grid and a random 6-by-5-by-7 grid, with different subcell dimensions
+    WHEN: a step is performed with neumann workspaces, processing blocks of block_size elements
+    THEN: the result is equal (to rounding) to Cahn_Hilliard_equation_integration() with neumann boundary conditions"""
+    np.random.seed(1)
+    for shape, dz in (((7, 9), None), ((6, 5, 7), 0.8)):
+        c = 0.5 + 0.1*(0.5-np.random.rand(*shape))
+        expected = Cahn_Hilliard_equation_integration(c, 1., 0.5, 1., 1.2, 1., 0.01, dz=dz, boundary='neumann')
+        workspace = CahnHilliardWorkspace(shape, 1., 1.2, block_size=block_size, dz=dz, boundary='neumann')
+        assert np.allclose(workspace.step(c.copy(), 1., 0.5, 1., 0.01), expected, rtol=0., atol=1e-13)
@@ -0,0 +1,88 @@
+import numpy as np
+from hypothesis import given, settings
+import hypothesis.strategies as st
+from structure_factor import StructureFactorAnalyzer
+import pytest as pt
+
+@given(period=st.sampled_from([4, 8, 16, 32]), dx=st.floats(0.1, 2.))
+def test_lamellar_microstructure_has_its_period_as_domain_length(period, dx):
+    """this function tests the analysis of a lamellar microstructure with a single Fourier mode
+
+    GIVEN: a 64-by-64 grid c = 0.5 + 0.4*cos(2*pi*x/L), x = j*dx, with period L = period*dx
+    WHEN: it is analyzed
+    THEN: S(k) is zero except at k = 2*pi/L, the first moment is 2*pi/L, the domain length is L,
+          and the interface area is twice the number of periods times the side of the grid"""
+    N = 64
+    x = np.arange(N)*dx
+    L = period*dx
+    c = np.tile(0.5 + 0.4*np.cos(2.*np.pi*x/L), (N, 1))
+    analyzer = StructureFactorAnalyzer(c.shape, dx, dx)
+    analysis = analyzer.analyze(c)
+    peak = np.argmax(analysis['S'])
+    assert np.isclose(analyzer.k[peak], 2.*np.pi/L)
+    assert np.allclose(np.delete(analysis['S'], peak), 0., atol=1e-10)
+    assert np.isclose(analysis['first_moment'], 2.*np.pi/L)
+    assert np.isclose(analysis['domain_length'], L)
+    assert np.isclose(analysis['interface_area'], 2.*(N//period)*N*dx)
+
+@given(Ny=st.integers(4, 20), Nx=st.integers(4, 20))
+@settings(deadline=None)
+def test_structure_factor_satisfies_parseval(Ny, Nx):
+    """this function tests that the radial average keeps the total power of the fluctuations (Parseval's theorem)
+
+    GIVEN: a random Ny-by-Nx grid
+    WHEN: its structure factor is computed
+    THEN: the sum over the bins of S(k) times the number of wave vectors of the bin is the sum of the squared
+          fluctuations of the concentration"""
+    np.random.seed(0)
+    c = np.random.rand(Ny, Nx)
+    analyzer = StructureFactorAnalyzer(c.shape, 1., 1.)
+    S = analyzer.structure_factor(c)
+    assert np.isclose((S*analyzer._counts).sum(), ((c - c.mean())**2).sum())
+
+def test_batch_analysis_matches_single_grids():
+    """this function tests that a batch of microstructures is analyzed as each of its grids
+
+    GIVEN: a batch of 3 random 16-by-16 grids, the last one homogeneous
+    WHEN: the batch and each grid are analyzed
+    THEN: the results are the same, and the homogeneous grid has first moment 0, infinite domain length
+          and no interfaces"""
+    np.random.seed(1)
+    c = np.random.rand(3, 16, 16)
+    c[2] = 0.5
+    batch_analysis = StructureFactorAnalyzer(c.shape, 1., 1.).analyze(c)
+    for b in range(3):
+        analysis = StructureFactorAnalyzer(c[b].shape, 1., 1.).analyze(c[b])
+        assert np.allclose(batch_analysis['S'][b], analysis['S'])
+        for name in ('first_moment', 'domain_length', 'interface_area'):
+            assert batch_analysis[name][b] == pt.approx(analysis[name])
+    assert batch_analysis['first_moment'][2] == 0.
+    assert np.isinf(batch_analysis['domain_length'][2])
+    assert batch_analysis['interface_area'][2] == 0.
+
+def test_header_lists_wave_numbers():
+    """this function tests the first line of the structure factor files
+
+    GIVEN: an analyzer of a 8-by-8 grid
+    WHEN: the header is built
+    THEN: it starts with Time FirstMoment DomainLength InterfaceArea, followed by a column per wave number"""
+    analyzer = StructureFactorAnalyzer((8, 8), 1., 1.)
+    columns = analyzer.header().split()
+    assert columns[:4] == ["Time", "FirstMoment", "DomainLength", "InterfaceArea"]
+    assert len(columns) == 4 + len(analyzer.k)
+
+def test_3D_lamellar_microstructure_has_its_period_as_domain_length():
+    """this function tests the analysis of a 3D lamellar microstructure, with lamellae normal to z
+
+    GIVEN: a 16-by-8-by-8 grid c = 0.5 + 0.4*cos(2*pi*z/L), with period L = 8*dz
+    WHEN: it is analyzed with dz given
+    THEN: the domain length is L and the interface area is twice the number of periods times the xy area"""
+    dz = 0.5
+    z = np.arange(16)*dz
+    c = (0.5 + 0.4*np.cos(2.*np.pi*z/(8*dz)))[:, None, None]*np.ones((16, 8, 8))
+    analyzer = StructureFactorAnalyzer(c.shape, 1., 1., dz)
+    analysis = analyzer.analyze(c)
+    assert np.isclose(analysis['domain_length'], 8*dz)
+    assert np.isclose(analysis['interface_area'], 2.*2*8*8)
+    batch_analysis = analyzer.analyze(np.stack([c, c]))
+    assert np.allclose(batch_analysis['domain_length'], 8*dz)
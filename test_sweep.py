@@ -0,0 +1,82 @@
+import numpy as np
+import configparser as cp
+import os
+from sweep import expand_parameter_grid, run_configuration, run_hash, run_sweep, is_complete, prepare_run
+from snapshot_io import load_snapshots
+import pytest as pt
+
+def make_base_config(tmp_path):
+    """This function returns the default configuration file with a small grid and few time steps"""
+    config = cp.ConfigParser()
+    config.read(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'simulation_configuration.txt'))
+    config.set('microstructure_settings', 'N', '6')
+    config.set('time_settings', 'n_iterations', '5')
+    config.set('checkpoint', 'checkpoint_every', '0')
+    return config
+
+def test_expand_parameter_grid_returns_all_combinations():
+    """this function tests that expand_parameter_grid() returns the cartesian product of the parameter grids
+
+    GIVEN: 2 values of A and 3 values of N
+    WHEN: they are provided to expand_parameter_grid()
+    THEN: function returns 6 different combinations; an unknown parameter raises ValueError"""
+    combinations = expand_parameter_grid({'A': [0.5, 1.], 'N': [16, 32, 64]})
+    assert len(combinations) == 6
+    assert {'A': 1., 'N': 32} in combinations
+    with pt.raises(ValueError):
+        expand_parameter_grid({'dt': [0.1]})
+
+def test_run_hash_depends_on_settings_but_not_on_paths(tmp_path):
+    """this function tests that run_hash() identifies a run by its settings, not by its output paths
+
+    GIVEN: the base configuration with A=1 and different output paths, or with A=2
+    WHEN: run_hash() is computed
+    THEN: hashes are equal in the first case and different in the second"""
+    base_config = make_base_config(tmp_path)
+    config_1 = run_configuration(base_config, {'A': 1.})
+    config_2 = run_configuration(base_config, {'A': 1.})
+    config_2.set('data_paths', 'c_config_datasave', '/elsewhere/c.npy')
+    assert run_hash(config_1) == run_hash(config_2)
+    assert run_hash(config_1) != run_hash(run_configuration(base_config, {'A': 2.}))
+
+def test_run_sweep_runs_simulations_and_skips_completed_ones(tmp_path):
+    """this function tests that run_sweep() runs a simulation for each combination in its own directory,
+    and that a second sweep skips the runs that are already complete
+
+    GIVEN: a base configuration with a 6-by-6 grid and 5 steps, 2 values of c0 and 2 seeds, 2 workers
+    WHEN: run_sweep() is called two times
+    THEN: the first call completes 4 runs, each with its snapshot file, the second one skips all of them"""
+    base_config = make_base_config(tmp_path)
+    parameter_grid = {'c0': [0.4, 0.5], 'seed': [1, 2]}
+    results = run_sweep(base_config, parameter_grid, str(tmp_path/'Sweep'), max_workers=2)
+    assert len(results) == 4
+    assert all(status == 'completed' for status in results.values())
+    for run_directory in results:
+        assert is_complete(run_directory)
+        times, frames = load_snapshots(os.path.join(run_directory, 'configurations.npy'), 'binary')
+        assert np.shape(frames) == (6, 6, 6)
+    results = run_sweep(base_config, parameter_grid, str(tmp_path/'Sweep'), max_workers=2)
+    assert all(status == 'skipped' for status in results.values())
+
+def test_prepare_run_moves_output_paths_inside_each_run(tmp_path):
+    """this function tests that prepare_run() moves all the output files of a run, including the memory mapped
+    initial grid, inside the directory of the run, so that concurrent runs never write the same file
+
+    GIVEN: a base configuration with the initial grid memory mapped to ./Data/initial_grid.npy, and 2 values of c0
+    WHEN: the directory of each run is prepared with prepare_run(), and the sweep is run
+    THEN: the configuration of each run stores its grids, checkpoint and memory mapped initial grid
+          inside its own directory, where the memory mapped initial grid is written"""
+    base_config = make_base_config(tmp_path)
+    base_config.set('initial_conditions', 'noise', 'uniform')
+    base_config.set('initial_conditions', 'memmap_path', './Data/initial_grid.npy')
+    run_directories = [prepare_run(base_config, {'c0': c0}, str(tmp_path/'Sweep')) for c0 in (0.4, 0.5)]
+    assert run_directories[0] != run_directories[1]
+    for run_directory in run_directories:
+        config = cp.ConfigParser()
+        config.read(os.path.join(run_directory, 'simulation_configuration.txt'))
+        for section, option in [('initial_conditions', 'memmap_path'), ('data_paths', 'c_config_datasave'),
+                                ('checkpoint', 'checkpoint_path')]:
+            assert os.path.dirname(config.get(section, option)) == run_directory
+    run_sweep(base_config, {'c0': [0.4, 0.5]}, str(tmp_path/'Sweep'), max_workers=2)
+    initial_grids = [np.load(os.path.join(run_directory, 'initial_grid.npy')) for run_directory in run_directories]
+    assert not np.array_equal(initial_grids[0], initial_grids[1])